@@ -34,7 +34,7 @@ import configparser
 import getopt
 import sys
 
-from pycsw.core import admin, config
+from pycsw.core import admin, config, recordcache, replay
 
 CONTEXT = config.StaticContext()
 
@@ -55,21 +55,35 @@ SYNOPSIS
               - load_records
               - export_records
               - rebuild_db_indexes
+              - advise_db_indexes
               - optimize_db
               - refresh_harvested_records
               - gen_sitemap
               - post_xml
+              - replay
               - get_sysprof
               - validate_xml
               - delete_records
 
+    -d    replay: duration (in seconds)
+
     -f    Filepath to pycsw configuration
 
     -h    Usage message
 
+    -j    replay: number of concurrent requests (default is 1)
+
+    -m    replay: weights of request types, e.g. GetRecords=4,GetRecordById=1
+
+    -n    replay: number of requests
+
     -o    path to output file
 
     -p    path to input/output directory or file to read/write metadata records
+          (advise_db_indexes: path to query log)
+          (replay: path to functional test suites or to an access log)
+
+    -q    replay: requests per second (default is as fast as possible)
 
     -r    load records from directory recursively
 
@@ -114,6 +128,11 @@ EXAMPLES
 
         pycsw-admin.py -c rebuild_db_indexes -f default.cfg
 
+        advise_db_indexes: Report unused and missing indexes from the
+        query log (repository.query_log, or -p /path/to/query.log)
+
+        pycsw-admin.py -c advise_db_indexes -f default.cfg
+
     5.) optimize_db: Optimize repository database
 
         pycsw-admin.py -c optimize_db -f default.cfg
@@ -131,6 +150,14 @@ EXAMPLES
 
         pycsw-admin.py -c post_xml -u http://host/csw -x /path/to/request.xml
 
+        replay: Replay the requests of the functional test suites, or of
+        an access log, against a CSW (or in-process, with -f) and report
+        latency percentiles and error rates per request type
+
+        pycsw-admin.py -c replay -u http://host/csw -p tests/functionaltests/suites -j 8 -d 60
+
+        pycsw-admin.py -c replay -f default.cfg -p access.log -j 4 -q 50 -n 1000 -m GetRecords=3,GetRecordById=1 -o results.json
+
     9.) get_sysprof: Get versions of dependencies
 
         pycsw-admin.py -c get_sysprof
@@ -159,13 +186,18 @@ XML = None
 XSD = None
 TIMEOUT = 30
 FORCE_CONFIRM = False
+CONCURRENCY = 1
+RATE = None
+DURATION = None
+COUNT = None
+MIX = None
 
 if len(sys.argv) == 1:
     print(usage())
     sys.exit(1)
 
 try:
-    OPTS, ARGS = getopt.getopt(sys.argv[1:], 'c:f:ho:p:ru:x:s:t:y')
+    OPTS, ARGS = getopt.getopt(sys.argv[1:], 'c:d:f:hj:m:n:o:p:q:ru:x:s:t:y')
 except getopt.GetoptError as err:
     print('\nERROR: %s' % err)
     print(usage())
@@ -195,22 +227,33 @@ for o, a in OPTS:
         sys.exit(3)
     if o == '-y':
         FORCE_CONFIRM = True
+    if o == '-j':
+        CONCURRENCY = int(a)
+    if o == '-q':
+        RATE = float(a)
+    if o == '-d':
+        DURATION = float(a)
+    if o == '-n':
+        COUNT = int(a)
+    if o == '-m':
+        MIX = a
 
 if COMMAND is None:
     print('-c <command> is a required argument')
     sys.exit(4)
 
 if COMMAND not in ['setup_db', 'load_records', 'export_records',
-                   'rebuild_db_indexes', 'optimize_db',
+                   'rebuild_db_indexes', 'advise_db_indexes', 'optimize_db',
                    'refresh_harvested_records', 'gen_sitemap',
-                   'post_xml', 'get_sysprof',
+                   'post_xml', 'replay', 'get_sysprof',
                    'validate_xml', 'delete_records']:
     print('ERROR: invalid command name: %s' % COMMAND)
     sys.exit(5)
 
 if CFG is None and COMMAND not in ['post_xml', 'get_sysprof', 'validate_xml']:
-    print('ERROR: -f <cfg> is a required argument')
-    sys.exit(6)
+    if COMMAND != 'replay' or CSW_URL is None:
+        print('ERROR: -f <cfg> is a required argument')
+        sys.exit(6)
 
 if COMMAND in ['load_records', 'export_records'] and XML_DIRPATH is None:
     print('ERROR: -p </path/to/records> is a required argument')
@@ -220,7 +263,11 @@ if COMMAND == 'gen_sitemap' and OUTPUT_FILE is None:
     print('ERROR: -o </path/to/sitemap.xml> is a required argument')
     sys.exit(8)
 
-if COMMAND not in ['post_xml', 'get_sysprof', 'validate_xml']:
+if COMMAND == 'replay' and XML_DIRPATH is None:
+    print('ERROR: -p </path/to/suites> or -p </path/to/access.log> is a required argument')
+    sys.exit(14)
+
+if CFG is not None and COMMAND not in ['post_xml', 'get_sysprof', 'validate_xml']:
     CP = configparser.ConfigParser()
     with open(CFG) as f:
         CP.read_file(f)
@@ -233,8 +280,19 @@ if COMMAND not in ['post_xml', 'get_sysprof', 'validate_xml']:
         TABLE = CP.get('repository', 'table')
     except configparser.NoOptionError:
         TABLE = 'records'
-
-elif COMMAND not in ['get_sysprof', 'validate_xml']:
+    REPO_FILTER = CP.get('repository', 'filter', fallback=None)
+    if XML_DIRPATH is None and COMMAND == 'advise_db_indexes':
+        XML_DIRPATH = CP.get('repository', 'query_log', fallback=None)
+    if CP.has_option('server', 'iso_parser'):
+        CONTEXT.iso_parser = CP.get('server', 'iso_parser')
+    if CP.has_option('server', 'record_cache_dir'):
+        recordcache.CACHE.cachedir = CP.get('server', 'record_cache_dir')
+
+    if COMMAND == 'advise_db_indexes' and XML_DIRPATH is None:
+        print('ERROR: -p </path/to/query.log> or repository.query_log is required')
+        sys.exit(13)
+
+elif COMMAND not in ['replay', 'get_sysprof', 'validate_xml']:
     if CSW_URL is None:
         print('ERROR: -u <http://host/csw> is a required argument')
         sys.exit(9)
@@ -262,6 +320,8 @@ elif COMMAND == 'export_records':
     admin.export_records(CONTEXT, DATABASE, TABLE, XML_DIRPATH)
 elif COMMAND == 'rebuild_db_indexes':
     admin.rebuild_db_indexes(DATABASE, TABLE)
+elif COMMAND == 'advise_db_indexes':
+    print(admin.advise_db_indexes(DATABASE, TABLE, XML_DIRPATH, REPO_FILTER))
 elif COMMAND == 'optimize_db':
     admin.optimize_db(CONTEXT, DATABASE, TABLE)
 elif COMMAND == 'refresh_harvested_records':
@@ -270,6 +330,16 @@ elif COMMAND == 'gen_sitemap':
     admin.gen_sitemap(CONTEXT, DATABASE, TABLE, URL, OUTPUT_FILE)
 elif COMMAND == 'post_xml':
     print(admin.post_xml(CSW_URL, XML, TIMEOUT))
+elif COMMAND == 'replay':
+    if CSW_URL is not None:
+        TARGET = replay.HttpTarget(CSW_URL, TIMEOUT)
+    else:
+        TARGET = replay.WsgiTarget(CFG)
+    RESULTS = replay.replay(replay.load(XML_DIRPATH), TARGET, CONCURRENCY,
+                            RATE, DURATION, COUNT, replay.get_mix(MIX))
+    print(RESULTS.report())
+    if OUTPUT_FILE is not None:
+        replay.write_results(RESULTS, OUTPUT_FILE)
 elif COMMAND == 'get_sysprof':
     print(admin.get_sysprof())
 elif COMMAND == 'validate_xml':
@@ -30,8 +30,10 @@
 #
 # =================================================================
 
+import json
 import logging
 import os
+import re
 import sys
 from glob import glob
 
@@ -45,8 +47,8 @@ LOGGER = logging.getLogger(__name__)
 
 def setup_db(database, table, home, create_sfsql_tables=True, create_plpythonu_functions=True, postgis_geometry_column='wkb_geometry', extra_columns=[], language='english'):
     """Setup database tables and indexes"""
-    from sqlalchemy import Column, create_engine, Integer, MetaData, \
-        Table, Text
+    from sqlalchemy import BigInteger, Column, create_engine, Float, Index, \
+        Integer, MetaData, Table, Text
     from sqlalchemy.orm import create_session
 
     LOGGER.info('Creating database %s', database)
@@ -193,6 +195,15 @@ def setup_db(database, table, home, create_sfsql_tables=True, create_plpythonu_f
         # distribution
         # links: format "name,description,protocol,url[^,,,[^,,,]]"
         Column('links', Text, index=True),
+
+        # typed copies of the above, for comparisons
+        Column('insert_date_epoch', BigInteger, index=True),
+        Column('time_begin_epoch', BigInteger, index=True),
+        Column('time_end_epoch', BigInteger, index=True),
+        Column('date_epoch', BigInteger, index=True),
+        Column('date_modified_epoch', BigInteger, index=True),
+        Column('denominator_number', Float, index=True),
+        Column('distancevalue_number', Float, index=True),
     )
 
     # add extra columns that may have been passed via extra_columns
@@ -205,6 +216,18 @@ def setup_db(database, table, home, create_sfsql_tables=True, create_plpythonu_f
 
     records.create()
 
+    # one row per value of multi-valued or faceted properties, so that
+    # equality filters and GetDomain counts use an index
+    LOGGER.info('Creating table %s_facets', table_name)
+    facets = Table(
+        '%s_facets' % table_name, mdata,
+        Column('record_id', Text, primary_key=True),
+        Column('facet', Text, primary_key=True),
+        Column('value', Text, primary_key=True),
+        Index('ix_%s_facets_facet_value' % table_name, 'facet', 'value')
+    )
+    facets.create()
+
     conn = dbase.connect()
 
     if create_plpythonu_functions and not create_postgis_geometry:
@@ -308,6 +331,30 @@ FOR EACH ROW EXECUTE PROCEDURE %(table)s_update_geometry();
         conn.execute(create_insert_update_trigger_sql)
         conn.execute(create_spatial_index_sql)
 
+    if dbase.name == 'mysql':
+        if (dbase.dialect.server_version_info or (0,)) < (8, 0, 11):
+            LOGGER.info('MySQL < 8.0.11: Skipping native geometry column creation')
+        else:
+            # create native geometry column within db; a SPATIAL INDEX needs
+            # a NOT NULL column with an SRID, so records without a geometry
+            # get an empty collection
+            LOGGER.info('Creating native MySQL geometry column')
+            create_column_sql = 'ALTER TABLE %s ADD COLUMN %s GEOMETRY NOT NULL SRID 4326' % (table_name, postgis_geometry_column)
+
+            create_trigger_sql = '''
+CREATE TRIGGER %(table)s_%(event)s_geometry BEFORE %(event)s ON %(table)s
+FOR EACH ROW SET NEW.%(geometry)s = ST_GeomFromText(COALESCE(NEW.wkt_geometry, 'GEOMETRYCOLLECTION EMPTY'), 4326, 'axis-order=long-lat')
+    '''
+
+            create_spatial_index_sql = 'CREATE SPATIAL INDEX %(geometry)s_idx ON %(table)s (%(geometry)s)' \
+            % {'table': table_name, 'geometry': postgis_geometry_column}
+
+            conn.execute(create_column_sql)
+            for event in ['INSERT', 'UPDATE']:
+                conn.execute(create_trigger_sql % {'table': table_name, 'event': event,
+                                                   'geometry': postgis_geometry_column})
+            conn.execute(create_spatial_index_sql)
+
 def load_records(context, database, table, xml_dirpath, recursive=False, force_update=False):
     """Load metadata records from directory of files to database"""
     from sqlalchemy.exc import DBAPIError
@@ -472,8 +519,145 @@ def refresh_harvested_records(context, database, table, url):
 
 
 def rebuild_db_indexes(database, table):
-    """Rebuild database indexes"""
-    raise NotImplementedError
+    """Rebuild database indexes and refresh planner statistics"""
+
+    LOGGER.info('Rebuilding indexes of database %s', database)
+    engine = repository.Repository.create_engine(database)
+
+    schema_name, table_name = table.rpartition('.')[::2]
+    tables = [table]
+    if engine.has_table('%s_facets' % table_name, schema=schema_name or None):
+        tables.append('%s_facets' % table)
+
+    connection = engine.connect().execution_options(autocommit=True)
+    try:
+        for name in tables:
+            LOGGER.info('Rebuilding indexes of table %s', name)
+            if engine.name == 'postgresql':
+                connection.execute('REINDEX TABLE %s' % name)
+                connection.execute('ANALYZE %s' % name)
+            elif engine.name == 'mysql':
+                # InnoDB rebuilds the table with its indexes, then analyzes it
+                connection.execute('OPTIMIZE TABLE %s' % name)
+            else:  # SQLite
+                connection.execute('REINDEX %s' % name)
+                connection.execute('ANALYZE %s' % name)
+    finally:
+        connection.close()
+        LOGGER.info('Done')
+
+
+def advise_db_indexes(database, table, query_log, repo_filter=None,
+                      min_queries=2):
+    """Compare the indexes of a table with the queries captured in a query
+    log (see ``repository.query_log``), and report unused indexes, missing
+    indexes and composite or partial indexes worth creating"""
+
+    from sqlalchemy import inspect
+
+    engine = repository.Repository.create_engine(database)
+    schema_name, table_name = table.rpartition('.')[::2]
+    inspector = inspect(engine)
+
+    columns = [column['name'] for column in
+               inspector.get_columns(table_name, schema=schema_name or None)]
+    indexes = [(index['name'], index['column_names']) for index in
+               inspector.get_indexes(table_name, schema=schema_name or None)]
+
+    queries = 0
+    used = {}  # column: number of queries filtering or sorting on it
+    pairs = {}  # (equality column, range or sort column): number of queries
+
+    with open(query_log) as fileobj:
+        for line in fileobj:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            queries += 1
+            equalities, ranges = get_where_columns(entry.get('where'), columns)
+            if entry.get('sortby') in columns:
+                ranges.add(entry['sortby'])
+            for column in equalities | ranges:
+                used[column] = used.get(column, 0) + 1
+            for column in equalities:
+                for second in ranges - equalities:
+                    pairs[(column, second)] = pairs.get((column, second), 0) + 1
+
+    primary_key = inspector.get_pk_constraint(
+        table_name, schema=schema_name or None)['constrained_columns']
+    leading = set(index_columns[0] for name, index_columns in indexes
+                  if index_columns)
+    leading.update(primary_key[:1])
+
+    # columns of repository.filter are part of every query
+    masked = set()
+    if repo_filter is not None:
+        masked = set().union(*get_where_columns(repo_filter, columns))
+
+    unused = sorted((name, index_columns) for name, index_columns in indexes
+                    if index_columns and index_columns[0] not in used and
+                    index_columns[0] not in masked)
+
+    suggestions = []  # (queries, columns)
+    for (column, second), count in pairs.items():
+        if count >= min_queries and not any(
+                index_columns[:2] == [column, second]
+                for name, index_columns in indexes):
+            suggestions.append((count, [column, second]))
+    for column, count in used.items():
+        if count >= min_queries and column not in leading and not any(
+                suggestion[0] == column for count_, suggestion in suggestions):
+            suggestions.append((count, [column]))
+    suggestions.sort(key=lambda suggestion: (-suggestion[0], suggestion[1]))
+
+    # every query is masked by repository.filter, so indexes covering only
+    # the matching rows are smaller and just as useful
+    partial = ''
+    if repo_filter is not None and engine.name in ['postgresql', 'sqlite']:
+        partial = ' WHERE %s' % repo_filter
+
+    report = ['Queries analysed: %d' % queries, '', 'Unused indexes:']
+    for name, index_columns in unused:
+        if engine.name == 'mysql':
+            name = '%s ON %s' % (name, table)
+        elif schema_name:
+            name = '%s.%s' % (schema_name, name)
+        report.append('    DROP INDEX %s;  -- (%s)' %
+                      (name, ', '.join(index_columns)))
+    report.extend(['', 'Suggested indexes:'])
+    for count, index_columns in suggestions:
+        report.append('    CREATE INDEX ix_%s_%s ON %s (%s)%s;  -- %d queries' %
+                      (table_name, '_'.join(index_columns), table,
+                       ', '.join(index_columns), partial, count))
+
+    return '\n'.join(report)
+
+
+def get_where_columns(where, columns):
+    """Return the columns a where clause tests for equality, and those it
+    tests for a range, as sets; pattern matches and function arguments
+    cannot use an index and are left out"""
+
+    equalities = set()
+    ranges = set()
+
+    if not where:
+        return equalities, ranges
+
+    where = re.sub(r"'(?:[^']|'')*'", "''", where)  # drop string literals
+    for column, operator in re.findall(
+            r'(?<![:\w.])(\w+)\s*(<=|>=|<>|!=|=|<|>|'
+            r'between\b|in\b|is\b|like\b|ilike\b|not\b)', where,
+            re.IGNORECASE):
+        if column not in columns:
+            continue
+        operator = operator.lower()
+        if operator in ['=', 'in', 'is']:
+            equalities.add(column)
+        elif operator in ['<', '>', '<=', '>=', 'between']:
+            ranges.add(column)
+
+    return equalities, ranges
 
 
 def optimize_db(context, database, table):
@@ -623,4 +807,5 @@ def delete_records(context, database, table):
     LOGGER.info('Deleting all records')
 
     repo = repository.Repository(database, context, table=table)
-    repo.delete(constraint={'where': '', 'values': []})
+    repo.delete(constraint={'where': '', 'values': []},
+                chunksize=repository.MAX_IN_VALUES)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+
+from pycsw.core.etree import etree
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+# key of the limit and queue timeout of all requests together
+ALL = '*'
+
+# order in which requests waiting for the overall limit are admitted
+PRIORITIES = {
+    'GetCapabilities': 0,
+    'DescribeRecord': 0,
+    'GetRecordById': 0,
+    'GetRepositoryItem': 0,
+    'GetDomain': 1,
+    'GetRecords': 1,
+    'Transaction': 2,
+    'Harvest': 2
+}
+DEFAULT_PRIORITY = 1
+
+# seconds between two attempts to take a slot of the lock directory
+POLL_INTERVAL = 0.01
+
+OAIPMH_VERBS = {
+    'GetRecord': 'GetRecordById',
+    'ListIdentifiers': 'GetRecords',
+    'ListRecords': 'GetRecords'
+}
+
+
+class Ticket(object):
+    ''' admission of a request '''
+
+    def __init__(self, operation, priority):
+        ''' initialize ticket '''
+
+        self.operation = operation
+        self.priority = priority
+        self.keys = []  # limits taken in this process
+        self.files = []  # slots taken in the lock directory
+
+
+class Limiter(object):
+    ''' limits of the number of requests processed at once, per operation
+    and overall, with a queue timeout per operation
+
+    Requests waiting for the overall limit are admitted by priority, cheap
+    operations first.  When directory is set, limits also apply to all the
+    processes sharing it, through locked slot files '''
+
+    def __init__(self):
+        ''' initialize limiter '''
+
+        self.limits = {}
+        self.timeouts = {}
+        self.directory = None
+        self._active = {}
+        self._waiting = []  # tickets, in order of arrival
+        self._condition = threading.Condition()
+
+    @property
+    def enabled(self):
+        ''' whether any limit is set '''
+
+        return bool(self.limits)
+
+    def configure(self, limits, timeouts=None, directory=None):
+        ''' set limits and timeouts, as dicts by operation, or ALL '''
+
+        if directory is not None and fcntl is None:
+            LOGGER.warning('Admission lock directories are not supported on '
+                           'this platform; limits apply per process')
+            directory = None
+
+        with self._condition:
+            self.limits = limits
+            self.timeouts = timeouts or {}
+            self.directory = directory
+            self._condition.notify_all()
+
+    def acquire(self, operation):
+        ''' wait for operation to be admitted, and return its ticket, or
+        None if it could not be admitted within its queue timeout '''
+
+        ticket = Ticket(operation, PRIORITIES.get(operation,
+                                                  DEFAULT_PRIORITY))
+        deadline = time.time() + self.timeouts.get(
+            operation, self.timeouts.get(ALL, 0))
+
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                while not self._can_enter(ticket):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+            for key in [operation, ALL]:
+                if key in self.limits:
+                    self._active[key] = self._active.get(key, 0) + 1
+                    ticket.keys.append(key)
+            directory = self.directory
+
+        if directory is not None:
+            for key in ticket.keys:
+                slot = self._take_slot(directory, key, deadline)
+                if slot is None:
+                    self.release(ticket)
+                    return None
+                ticket.files.append(slot)
+
+        return ticket
+
+    def release(self, ticket):
+        ''' end the admission of a request '''
+
+        for slot in reversed(ticket.files):
+            slot.close()  # releases the lock
+        ticket.files = []
+
+        with self._condition:
+            for key in ticket.keys:
+                self._active[key] -= 1
+            ticket.keys = []
+            self._condition.notify_all()
+
+    def _can_enter(self, ticket):
+        ''' whether a waiting request can be admitted '''
+
+        if not self._is_free(ticket.operation):
+            return False
+        if ALL not in self.limits:
+            return True
+        if self._active.get(ALL, 0) >= self.limits[ALL]:
+            return False
+        # leave the overall limit to cheaper operations that could enter
+        for other in self._waiting:
+            if (other.priority < ticket.priority and
+                    self._is_free(other.operation)):
+                return False
+        return True
+
+    def _is_free(self, operation):
+        ''' whether the limit of an operation is not reached '''
+
+        return (operation not in self.limits or
+                self._active.get(operation, 0) < self.limits[operation])
+
+    def _take_slot(self, directory, key, deadline):
+        ''' lock one of the slot files of a limit, shared by all processes,
+        and return it open, or None once deadline is passed '''
+
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, '%s.%d.lock' % (key.replace(
+            ALL, 'all'), num)) for num in range(self.limits[key])]
+
+        while True:
+            for path in paths:
+                slot = open(path, 'a')
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except (IOError, OSError):
+                    slot.close()
+            if time.time() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+
+def get_limits(value, type_=int):
+    ''' parse a comma delimited list of operation=value pairs '''
+
+    limits = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        try:
+            operation, limit = item.split('=')
+            limits[operation.strip()] = type_(limit)
+        except ValueError:
+            raise RuntimeError('Invalid admission setting: %s' % item)
+    return limits
+
+
+def get_operation(kvp, body=None):
+    ''' return the operation of a request before it is parsed: from the
+    request parameter, the OAI-PMH verb or SRU operation, or the root
+    element of a POST request (inside a SOAP envelope) '''
+
+    kvp = dict((key.lower(), value) for key, value in kvp.items())
+    if kvp.get('mode') == 'oaipmh':
+        return OAIPMH_VERBS.get(kvp.get('verb'), 'GetCapabilities')
+    if kvp.get('mode') == 'sru':
+        if kvp.get('operation') == 'searchRetrieve':
+            return 'GetRecords'
+        return 'GetCapabilities'
+    if 'request' in kvp:
+        return kvp['request']
+
+    if not body:
+        return 'unknown'
+    in_header = False
+    try:
+        for event, element in etree.iterparse(
+                BytesIO(body), events=('start', 'end'),
+                resolve_entities=False, no_network=True):
+            name = etree.QName(element).localname
+            if name == 'Header':  # SOAP header
+                in_header = event == 'start'
+            elif (event == 'start' and not in_header and
+                  name not in ['Envelope', 'Body']):
+                return name
+    except etree.XMLSyntaxError:
+        pass
+    return 'unknown'
+
+
+# process-wide limiter
+LIMITER = Limiter()
@@ -47,6 +47,9 @@ class StaticContext(object):
 
         self.parser = PARSER
 
+        # ISO 19139 parser: precompiled XPaths (xpath) or OWSLib (owslib)
+        self.iso_parser = 'xpath'
+
         self.languages = {
             'en': 'english',
             'fr': 'french',
@@ -55,6 +58,7 @@ class StaticContext(object):
 
         self.response_codes = {
             'OK': '200 OK',
+            'NotModified': '304 Not Modified',
             'NotFound': '404 Not Found',
             'InvalidValue': '400 Invalid property value',
             'OperationParsingFailed': '400 Bad Request',
@@ -65,7 +69,8 @@ class StaticContext(object):
             'VersionNegotiationFailed': '400 Bad Request',
             'InvalidUpdateSequence': '400 Bad Request',
             'OptionNotSupported': '400 Not Implemented',
-            'NoApplicableCode': '400 Internal Server Error'
+            'NoApplicableCode': '400 Internal Server Error',
+            'ServiceUnavailable': '503 Service Unavailable'
         }
 
         self.namespaces = {
@@ -552,6 +557,19 @@ class StaticContext(object):
         }
         self.set_model(prefix)
 
+    def __getstate__(self):
+        """pickle without the XML parser, which cannot be pickled"""
+
+        state = self.__dict__.copy()
+        state.pop('parser', None)
+        return state
+
+    def __setstate__(self, state):
+        """unpickle, restoring the XML parser"""
+
+        self.__dict__.update(state)
+        self.parser = PARSER
+
     def set_model(self, prefix):
         """sets model given request context"""
 
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LOGGER = logging.getLogger(__name__)
+
+USER_AGENT = 'pycsw (https://pycsw.org/)'
+
+
+class HttpClient(object):
+    ''' HTTP client with keep-alive connection pools, retries and caching '''
+
+    def __init__(self, cachedir=None, retries=3, backoff_factor=0.5,
+                 pool_maxsize=10):
+        ''' initialize client '''
+
+        self.cachedir = cachedir
+        self.stats = {}
+        self._lock = threading.Lock()
+
+        # retry on server responses only: harvests are synchronous, and
+        # retrying unreachable hosts would hold the request for seconds
+        retry = Retry(total=retries, connect=0, read=0,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, data=None, headers=None, timeout=30):
+        ''' perform an HTTP request and return the response body '''
+
+        if urlparse(url).scheme not in ['http', 'https']:  # e.g. file://
+            request = Request(url)
+            request.add_header('User-Agent', USER_AGENT)
+            return urlopen(request, timeout=timeout).read()
+
+        host = urlparse(url).netloc
+        headers = dict(headers or {})
+        entry = None
+
+        if method == 'GET' and self.cachedir is not None:
+            entry = self._cache_read(url)
+            if entry is not None:
+                if entry['expires'] > time.time():
+                    LOGGER.debug('Serving %s from HTTP cache', url)
+                    self._count(host, cache_hits=1)
+                    return entry['body']
+                if entry['etag'] is not None:
+                    headers['If-None-Match'] = entry['etag']
+                if entry['last_modified'] is not None:
+                    headers['If-Modified-Since'] = entry['last_modified']
+
+        LOGGER.debug('HTTP %s %s', method, url)
+        response = self.session.request(method, url, data=data,
+                                        headers=headers, timeout=timeout)
+        self._count(host, requests=1, bytes=len(response.content))
+
+        if response.status_code == 304 and entry is not None:
+            LOGGER.debug('%s not modified, serving from HTTP cache', url)
+            self._count(host, cache_hits=1)
+            self._cache_write(url, entry['body'], response.headers, entry)
+            return entry['body']
+
+        response.raise_for_status()
+
+        if method == 'GET' and self.cachedir is not None:
+            self._cache_write(url, response.content, response.headers)
+
+        return response.content
+
+    def get_if_modified(self, url, etag=None, last_modified=None,
+                        timeout=30):
+        ''' conditional GET against validators kept by the caller
+
+        returns a tuple of the response body (None when the resource
+        is not modified) and the response headers
+        '''
+
+        if urlparse(url).scheme not in ['http', 'https']:  # e.g. file://
+            return self.request('GET', url, timeout=timeout), {}
+
+        host = urlparse(url).netloc
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+
+        LOGGER.debug('HTTP GET %s', url)
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        self._count(host, requests=1, bytes=len(response.content))
+
+        if response.status_code == 304:
+            return None, response.headers
+
+        response.raise_for_status()
+        return response.content, response.headers
+
+    def get_stats(self):
+        ''' return a copy of the per-host request counters '''
+
+        with self._lock:
+            return dict((host, dict(counts))
+                        for host, counts in self.stats.items())
+
+    def _count(self, host, **counts):
+        ''' increment per-host counters '''
+
+        with self._lock:
+            stats = self.stats.setdefault(
+                host, {'requests': 0, 'bytes': 0, 'cache_hits': 0})
+            for key, value in counts.items():
+                stats[key] += value
+
+    def _cache_path(self, url):
+        ''' base path of cache files for a URL '''
+
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cachedir, key)
+
+    def _cache_read(self, url):
+        ''' read a cache entry, or None if there is no usable entry '''
+
+        path = self._cache_path(url)
+        try:
+            with open('%s.json' % path) as fh:
+                entry = json.load(fh)
+            with open('%s.body' % path, 'rb') as fh:
+                entry['body'] = fh.read()
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('url') != url:
+            return None
+        return entry
+
+    def _cache_write(self, url, body, headers, previous=None):
+        ''' store a response, honouring Cache-Control and validators '''
+
+        cache_control = _parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in cache_control:
+            return
+
+        entry = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'expires': time.time() + _freshness_lifetime(headers,
+                                                         cache_control)
+        }
+        if previous is not None:  # 304: keep validators not resent
+            for key in ['etag', 'last_modified']:
+                if entry[key] is None:
+                    entry[key] = previous[key]
+
+        if (entry['etag'] is None and entry['last_modified'] is None and
+                entry['expires'] <= time.time()):
+            return  # nothing to revalidate with, not worth keeping
+
+        path = self._cache_path(url)
+        try:
+            os.makedirs(self.cachedir, exist_ok=True)
+            if previous is None:
+                _write_atomic('%s.body' % path, body)
+            _write_atomic('%s.json' % path,
+                          json.dumps(entry).encode('utf-8'))
+        except OSError as err:
+            LOGGER.warning('Could not write HTTP cache entry for %s: %s',
+                           url, err)
+
+
+def _parse_cache_control(value):
+    ''' parse a Cache-Control header into a dict '''
+
+    directives = {}
+    if not value:
+        return directives
+    for directive in value.split(','):
+        name, _, arg = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def _parse_http_date(value):
+    ''' parse an HTTP date into a POSIX timestamp, or None '''
+
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _freshness_lifetime(headers, cache_control):
+    ''' freshness lifetime of a response in seconds (RFC 7234, 4.2.1) '''
+
+    if 'no-cache' in cache_control:
+        return 0
+
+    if cache_control.get('max-age') is not None:
+        try:
+            return max(int(cache_control['max-age']), 0)
+        except ValueError:
+            return 0
+
+    if headers.get('Expires') is not None:
+        date = _parse_http_date(headers.get('Date')) or time.time()
+        expires = _parse_http_date(headers['Expires'])
+        return max(expires - date, 0) if expires is not None else 0
+
+    # no heuristic freshness: harvesting wants changes as soon as the
+    # server reports them, so responses with only validators are
+    # revalidated on every request
+    return 0
+
+
+def _write_atomic(path, content):
+    ''' write a file so concurrent readers never see a partial one '''
+
+    tmppath = '%s.%s.%s.tmp' % (path, os.getpid(), threading.get_ident())
+    with open(tmppath, 'wb') as fh:
+        fh.write(content)
+    os.replace(tmppath, path)
+
+
+# process-wide client, shared so that connections are kept alive
+CLIENT = HttpClient()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+
+import logging
+import os
+import tracemalloc
+
+LOGGER = logging.getLogger(__name__)
+
+MODES = ['rss', 'tracemalloc']
+
+
+class Usage(object):
+    ''' memory used by a request: the growth of the resident set size of
+    the process and, with tracemalloc, the peak of the memory allocated
+    by Python while it ran, over the memory allocated when it started
+
+    Both are process-wide: they are only accurate with one request per
+    process at a time, as with the sync workers of gunicorn '''
+
+    def __init__(self, mode='rss'):
+        ''' initialize usage, from now '''
+
+        if mode not in MODES:
+            raise RuntimeError('Invalid memory tracking mode: %s' % mode)
+
+        self.mode = mode
+        self.rss = get_rss()
+        self.rss_delta = None
+        self.peak = None
+        self._traced = None
+        self._stopped = False
+
+        if mode == 'tracemalloc':
+            if not tracemalloc.is_tracing():
+                LOGGER.info('Starting to trace memory allocations')
+                tracemalloc.start()
+            if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                self._traced = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            else:
+                LOGGER.debug('Peak memory tracking needs Python 3.9+')
+
+    def stop(self):
+        ''' record the memory used until now, once '''
+
+        if self._stopped:
+            return
+        self._stopped = True
+
+        rss = get_rss()
+        if rss is not None and self.rss is not None:
+            self.rss_delta = rss - self.rss
+        self.rss = rss
+
+        if self._traced is not None:
+            self.peak = max(0, tracemalloc.get_traced_memory()[1] -
+                            self._traced)
+
+    def to_dict(self):
+        ''' return the memory used, for logging '''
+
+        return {'rss_bytes': self.rss, 'rss_delta_bytes': self.rss_delta,
+                'peak_bytes': self.peak}
+
+
+def get_rss():
+    ''' return the resident set size of this process, in bytes, where the
+    platform reports it (Linux), else None '''
+
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -31,7 +31,14 @@
 #
 # =================================================================
 
+from collections import deque
+import copy
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
 import uuid
 from urllib.parse import urlparse
 
@@ -41,10 +48,108 @@ from shapely.wkt import loads
 from shapely.geometry import MultiPolygon
 
 from pycsw.core.etree import etree
-from pycsw.core import util
+from pycsw.core import httpclient, util
 
 LOGGER = logging.getLogger(__name__)
 
+# number of attempts to fetch a page of records from a remote CSW
+CSW_HARVEST_RETRIES = 3
+
+# target duration (in seconds) of a remote CSW GetRecords page request;
+# the page size grows when requests are faster and shrinks when slower
+CSW_HARVEST_PAGE_LATENCY = 5
+
+
+class HarvestCheckpoint(object):
+    ''' Position of the next record to harvest from a remote catalogue '''
+
+    def __init__(self, directory, source):
+        ''' Initialize checkpoint, loading any previous position '''
+
+        self.source = source
+        self.filename = os.path.join(directory, '%s.json' %
+                                     hashlib.sha1(source.encode('utf-8')).hexdigest())
+        self.position = 1
+
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename) as fh:
+                    self.position = json.load(fh)['position']
+            except Exception as err:
+                LOGGER.warning('Could not read checkpoint %s: %s', self.filename, err)
+
+        self.resumed = self.position > 1
+
+    def save(self, position):
+        ''' Record the position of the next record to harvest '''
+
+        self.position = position
+        with open(self.filename, 'w') as fh:
+            json.dump({'source': self.source, 'position': position}, fh)
+
+    def clear(self):
+        ''' Remove checkpoint once a harvest completes '''
+
+        self.position = 1
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class WafHarvestState(object):
+    ''' Validators and identifiers of documents harvested from a WAF '''
+
+    def __init__(self, directory, source):
+        ''' Initialize state, loading that of any previous harvest '''
+
+        self.source = source
+        self.directory = directory
+        self.filename = os.path.join(directory, '%s.json' %
+                                     hashlib.sha1(source.encode('utf-8')).hexdigest())
+        self.files = {}
+        self.listed = set()
+        self.replaced = set()
+
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename) as fh:
+                    self.files = json.load(fh)['files']
+            except Exception as err:
+                LOGGER.warning('Could not read WAF state %s: %s', self.filename, err)
+
+    def update(self, link, headers, digest=None, identifier=None):
+        ''' Record the validators of a document and the record it yielded '''
+
+        entry = self.files.setdefault(link, {})
+        if identifier is not None:
+            if entry.get('identifier') not in [None, identifier]:
+                self.replaced.add(entry['identifier'])
+            entry['identifier'] = identifier
+        if digest is not None:
+            entry['hash'] = digest
+        for key, header in [('etag', 'ETag'), ('last_modified', 'Last-Modified')]:
+            if headers.get(header) is not None:
+                entry[key] = headers[header]
+
+    def removed(self):
+        ''' Identifiers of records whose documents are no longer in the WAF '''
+
+        current = set(self.files[link].get('identifier') for link in self.listed
+                      if link in self.files)
+        gone = set(entry.get('identifier') for link, entry in self.files.items()
+                   if link not in self.listed)
+        return sorted((gone | self.replaced) - current - set([None]))
+
+    def save(self):
+        ''' Persist state of the documents listed in this harvest '''
+
+        files = dict((link, entry) for link, entry in self.files.items()
+                     if link in self.listed)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        with open(self.filename, 'w') as fh:
+            json.dump({'source': self.source, 'files': files}, fh)
+
+
 def parse_record(context, record, repos=None,
     mtype='http://www.opengis.net/cat/csw/2.0.2',
     identifier=None, pagesize=10):
@@ -56,26 +161,14 @@ def parse_record(context, record, repos=None,
     # parse web services
     if (mtype == 'http://www.opengis.net/cat/csw/2.0.2' and
         isinstance(record, str) and record.startswith('http')):
-        LOGGER.info('CSW service detected, fetching via HTTP')
         # CSW service, not csw:Record
-        try:
-            return _parse_csw(context, repos, record, identifier, pagesize)
-        except Exception as err:
-            # TODO: implement better exception handling
-            if str(err).find('ExceptionReport') != -1:
-                msg = 'CSW harvesting error: %s' % str(err)
-                LOGGER.exception(msg)
-                raise RuntimeError(msg)
-            LOGGER.debug('Not a CSW, attempting to fetch Dublin Core')
-            try:
-                content = util.http_request('GET', record)
-            except Exception as err:
-                raise RuntimeError('HTTP error: %s' % str(err))
-            return [_parse_dc(context, repos, etree.fromstring(content, context.parser))]
+        return [recobj for page in parse_record_pages(context, record, repos,
+                mtype, identifier, pagesize) for recobj in page]
 
     elif mtype == 'urn:geoss:waf':  # WAF
         LOGGER.info('WAF detected, fetching via HTTP')
-        return _parse_waf(context, repos, record, identifier)
+        return [recobj for page in _parse_waf(context, repos, record,
+                identifier, pagesize) for recobj in page]
 
     elif mtype == 'http://www.opengis.net/wms':  # WMS
         LOGGER.info('WMS detected, fetching via OWSLib')
@@ -116,6 +209,42 @@ def parse_record(context, record, repos=None,
 
     return _parse_metadata(context, repos, record)
 
+def parse_record_pages(context, record, repos=None,
+    mtype='http://www.opengis.net/cat/csw/2.0.2',
+    identifier=None, pagesize=10, workers=1, checkpoint=None, state=None):
+    ''' parse metadata, yielding lists of records as they become available '''
+
+    if identifier is None:
+        identifier = uuid.uuid4().urn
+
+    if (mtype == 'http://www.opengis.net/cat/csw/2.0.2' and
+        isinstance(record, str) and record.startswith('http')):
+        LOGGER.info('CSW service detected, fetching via HTTP')
+        # CSW service, not csw:Record
+        try:
+            return _parse_csw(context, repos, record, identifier, pagesize,
+                              workers, checkpoint)
+        except Exception as err:
+            # TODO: implement better exception handling
+            if str(err).find('ExceptionReport') != -1:
+                msg = 'CSW harvesting error: %s' % str(err)
+                LOGGER.exception(msg)
+                raise RuntimeError(msg)
+            LOGGER.debug('Not a CSW, attempting to fetch Dublin Core')
+            try:
+                content = util.http_request('GET', record)
+            except Exception as err:
+                raise RuntimeError('HTTP error: %s' % str(err))
+            return iter([[_parse_dc(context, repos, etree.fromstring(content, context.parser))]])
+
+    if mtype == 'urn:geoss:waf':  # WAF
+        LOGGER.info('WAF detected, fetching via HTTP')
+        return _parse_waf(context, repos, record, identifier, pagesize,
+                          workers, state)
+
+    return iter([parse_record(context, record, repos, mtype, identifier,
+                              pagesize)])
+
 def _set(context, obj, name, value):
     ''' convenience method to set values '''
     setattr(obj, context.md_core_model['mappings'][name], value)
@@ -156,11 +285,11 @@ def _parse_metadata(context, repos, record):
         raise RuntimeError('Unsupported metadata format')
 
 
-def _parse_csw(context, repos, record, identifier, pagesize=10):
+def _parse_csw(context, repos, record, identifier, pagesize=10, workers=1,
+               checkpoint=None):
 
     from owslib.csw import CatalogueServiceWeb
 
-    recobjs = []  # records
     serviceobj = repos.dataset()
 
     # if init raises error, this might not be a CSW
@@ -204,8 +333,6 @@ def _parse_csw(context, repos, record, identifier, pagesize=10):
     _set(context, serviceobj, 'pycsw:Links', '^'.join(links))
     _set(context, serviceobj, 'pycsw:XML', caps2iso(serviceobj, md, context))
 
-    recobjs.append(serviceobj)
-
     # get all supported typenames of metadata
     # so we can harvest the entire CSW
 
@@ -232,22 +359,66 @@ def _parse_csw(context, repos, record, identifier, pagesize=10):
         raise RuntimeError(md.response)
 
     if pagesize > matches:
-        pagesize = matches
+        pagesize = max(matches, 1)
 
     LOGGER.info('Harvesting %d CSW records', matches)
 
-    # loop over all catalogue records incrementally
-    for r in range(1, matches+1, pagesize):
-        try:
-            md.getrecords2(typenames=csw_typenames, startposition=r,
-                           maxrecords=pagesize, outputschema=csw_outputschema, esn='full')
-        except Exception as err:  # this is a CSW, but server rejects query
-            raise RuntimeError(md.response)
-        for k, v in md.records.items():
+    startposition = 1
+    if checkpoint is not None and checkpoint.position > 1:
+        LOGGER.info('Resuming harvest of %s from record %d', record,
+                    checkpoint.position)
+        startposition = checkpoint.position
+
+    return _harvest_csw_pages(context, repos, md, serviceobj, csw_typenames,
+                              csw_outputschema, matches, startposition,
+                              pagesize, workers, checkpoint)
+
+def _harvest_csw_pages(context, repos, md, serviceobj, typenames, outputschema,
+                       matches, startposition, pagesize, workers, checkpoint):
+    ''' yield the service record, then pages of remote CSW records '''
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    local = threading.local()
+    maxpagesize = pagesize * 10
+
+    def getrecords(csw, position, maxrecords):
+        for attempt in range(1, CSW_HARVEST_RETRIES + 1):
+            try:
+                csw.getrecords2(typenames=typenames, startposition=position,
+                                maxrecords=maxrecords,
+                                outputschema=outputschema, esn='full')
+                return
+            except Exception as err:  # this is a CSW, but server rejects query
+                if attempt == CSW_HARVEST_RETRIES:
+                    raise RuntimeError(getattr(csw, 'response', err))
+                LOGGER.warning('Fetching records %d-%d failed (attempt %d): %s',
+                               position, position + maxrecords - 1, attempt, err)
+                time.sleep(2 ** attempt)
+
+    def fetch_page(position, maxrecords):
+        # OWSLib keeps per-request state, so each thread needs its own copy
+        if not hasattr(local, 'csw'):
+            local.csw = copy.copy(md)
+
+        begin = time.time()
+        records = []
+        while maxrecords > 0:  # servers may cap the number of records returned
+            getrecords(local.csw, position, maxrecords)
+            records.extend(local.csw.records.values())
+            returned = local.csw.results['returned']
+            if returned == 0:
+                break
+            position += returned
+            maxrecords -= returned
+        latency = time.time() - begin
+
+        recobjs = []
+        for v in records:
             # try to parse metadata
             try:
-                LOGGER.info('Parsing metadata record: %s', v.xml)
-                if csw_typenames == 'gmd:MD_Metadata':
+                LOGGER.debug('Parsing metadata record: %s', v.xml)
+                if typenames == 'gmd:MD_Metadata':
                     recobjs.append(_parse_iso(context, repos,
                                               etree.fromstring(v.xml, context.parser)))
                 else:
@@ -255,12 +426,65 @@ def _parse_csw(context, repos, record, identifier, pagesize=10):
                                              etree.fromstring(v.xml, context.parser)))
             except Exception as err:  # parsing failed for some reason
                 LOGGER.exception('Metadata parsing failed')
+        return recobjs, latency
 
-    return recobjs
+    yield [serviceobj]
 
-def _parse_waf(context, repos, record, identifier):
+    # loop over all catalogue records incrementally, keeping a bounded
+    # number of pages in flight and handing them out in order
+    pending = deque()
+    position = startposition
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while position <= matches or pending:
+                while position <= matches and len(pending) < workers * 2:
+                    maxrecords = min(pagesize, matches - position + 1)
+                    pending.append((position, maxrecords,
+                                    executor.submit(fetch_page, position, maxrecords)))
+                    position += maxrecords
+
+                page_position, page_size, future = pending.popleft()
+                try:
+                    recobjs, latency = future.result()
+                except Exception as err:
+                    if checkpoint is not None:
+                        checkpoint.save(page_position)
+                    raise
+
+                # adapt page size to remote latency
+                if latency < CSW_HARVEST_PAGE_LATENCY / 2.0:
+                    pagesize = min(pagesize * 2, maxpagesize)
+                elif latency > CSW_HARVEST_PAGE_LATENCY:
+                    pagesize = max(pagesize // 2, 1)
+                LOGGER.debug('Fetched records %d-%d in %.2fs, next page size %d',
+                             page_position, page_position + page_size - 1,
+                             latency, pagesize)
+
+                yield recobjs
+
+                if checkpoint is not None:
+                    checkpoint.save(page_position + page_size)
+        finally:  # stop fetching pages nobody will consume
+            for page in pending:
+                page[2].cancel()
+
+    if checkpoint is not None:
+        checkpoint.clear()
+
+def _get_capabilities(record, service, version):
+    ''' fetch a GetCapabilities document via the shared HTTP client '''
+
+    params = {'service': service, 'request': 'GetCapabilities'}
+    if service == 'SOS':
+        params['acceptVersions'] = version
+    else:
+        params['version'] = version
 
-    recobjs = []
+    return util.http_request('GET', build_get_url(record, params))
+
+def _parse_waf(context, repos, record, identifier, pagesize=10, workers=1,
+               state=None):
+    ''' collect the documents of a WAF, returning a generator of pages '''
 
     content = util.http_request('GET', record)
 
@@ -297,16 +521,74 @@ def _parse_waf(context, repos, record, identifier):
         links.append(link)
 
     LOGGER.debug('%d links found', len(links))
-    for link in links:
+
+    if state is not None:
+        state.listed.update(links)
+
+    return _harvest_waf_pages(context, repos, links, pagesize, workers, state)
+
+def _harvest_waf_pages(context, repos, links, pagesize, workers, state):
+    ''' yield pages of records parsed from changed WAF documents '''
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch_document(link, entry):
         LOGGER.info('Processing link %s', link)
+        if state is None:
+            linkcontent = util.http_request('GET', link)
+            headers = {}
+        else:  # skip documents the server reports as unchanged
+            linkcontent, headers = httpclient.CLIENT.get_if_modified(
+                link, entry.get('etag'), entry.get('last_modified'))
+            if linkcontent is None:
+                LOGGER.debug('%s not modified', link)
+                return None, headers, None
+
+        digest = hashlib.sha256(linkcontent).hexdigest()
+        if digest == entry.get('hash'):
+            LOGGER.debug('%s content unchanged', link)
+            return None, headers, digest
+
         # fetch and parse
-        linkcontent = util.http_request('GET', link)
         recobj = _parse_metadata(context, repos, linkcontent)[0]
         recobj.source = link
         recobj.mdsource = link
-        recobjs.append(recobj)
+        return recobj, headers, digest
 
-    return recobjs
+    page = []
+    pending = deque()
+    links = deque(links)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while links or pending:
+                while links and len(pending) < workers * 2:
+                    link = links.popleft()
+                    entry = {}
+                    if state is not None:
+                        entry = dict(state.files.get(link, {}))
+                    pending.append((link, executor.submit(fetch_document, link, entry)))
+
+                link, future = pending.popleft()
+                recobj, headers, digest = future.result()
+
+                if recobj is None:
+                    if state is not None:
+                        state.update(link, headers, digest)
+                    continue
+
+                if state is not None:
+                    state.update(link, headers, digest, getattr(recobj,
+                                 context.md_core_model['mappings']['pycsw:Identifier']))
+                page.append(recobj)
+                if len(page) >= pagesize:
+                    yield page
+                    page = []
+        finally:  # stop fetching documents nobody will consume
+            for link, future in pending:
+                future.cancel()
+
+    if page:
+        yield page
 
 def _parse_wms(context, repos, record, identifier):
 
@@ -315,12 +597,13 @@ def _parse_wms(context, repos, record, identifier):
     recobjs = []
     serviceobj = repos.dataset()
 
-    md = WebMapService(record)
     try:
-        md = WebMapService(record, version='1.3.0')
+        md = WebMapService(record, version='1.3.0',
+                           xml=_get_capabilities(record, 'WMS', '1.3.0'))
     except Exception as err:
-        LOGGER.info('Looks like WMS 1.3.0 is not supported; trying 1.1.1', err)
-        md = WebMapService(record)
+        LOGGER.info('Looks like WMS 1.3.0 is not supported; trying 1.1.1: %s', err)
+        md = WebMapService(record,
+                           xml=_get_capabilities(record, 'WMS', '1.1.1'))
 
     # generate record of service instance
     _set(context, serviceobj, 'pycsw:Identifier', identifier)
@@ -458,7 +741,8 @@ def _parse_wmts(context, repos, record, identifier):
     recobjs = []
     serviceobj = repos.dataset()
 
-    md = WebMapTileService(record)
+    md = WebMapTileService(record,
+                           xml=_get_capabilities(record, 'WMTS', '1.0.0'))
     # generate record of service instance
     _set(context, serviceobj, 'pycsw:Identifier', identifier)
     _set(context, serviceobj, 'pycsw:Typename', 'csw:Record')
@@ -591,12 +875,14 @@ def _parse_wfs(context, repos, record, identifier, version):
     serviceobj = repos.dataset()
 
     try:
-        md = WebFeatureService(record, version)
+        md = WebFeatureService(record, version,
+                               xml=_get_capabilities(record, 'WFS', version))
     except requests.exceptions.HTTPError as err:
         raise
     except Exception as err:
         if version == '1.1.0':
-            md = WebFeatureService(record, '1.0.0')
+            md = WebFeatureService(
+                record, '1.0.0', xml=_get_capabilities(record, 'WFS', '1.0.0'))
 
     # generate record of service instance
     _set(context, serviceobj, 'pycsw:Identifier', identifier)
@@ -712,7 +998,8 @@ def _parse_wcs(context, repos, record, identifier):
     recobjs = []
     serviceobj = repos.dataset()
 
-    md = WebCoverageService(record, '1.0.0')
+    md = WebCoverageService(record, '1.0.0',
+                            xml=_get_capabilities(record, 'WCS', '1.0.0'))
 
     # generate record of service instance
     _set(context, serviceobj, 'pycsw:Identifier', identifier)
@@ -818,7 +1105,8 @@ def _parse_wps(context, repos, record, identifier):
     recobjs = []
     serviceobj = repos.dataset()
 
-    md = WebProcessingService(record)
+    md = WebProcessingService(record, skip_caps=True)
+    md.getcapabilities(xml=_get_capabilities(record, 'WPS', '1.0.0'))
 
     # generate record of service instance
     _set(context, serviceobj, 'pycsw:Identifier', identifier)
@@ -916,7 +1204,8 @@ def _parse_sos(context, repos, record, identifier, version):
     else:
         schema = 'http://www.opengis.net/sos/2.0'
 
-    md = SensorObservationService(record, version=version)
+    md = SensorObservationService(record, version=version,
+                                  xml=_get_capabilities(record, 'SOS', version))
 
     # generate record of service instance
     _set(context, serviceobj, 'pycsw:Identifier', identifier)
@@ -1213,8 +1502,364 @@ def _parse_gm03(context, repos, exml):
     # contacts
     return recobj
 
+# namespaces of the ISO 19139 fast path XPaths (as used by owslib.iso)
+ISO_NAMESPACES = {
+    'gco': 'http://www.isotc211.org/2005/gco',
+    'gmd': 'http://www.isotc211.org/2005/gmd',
+    'gml': 'http://www.opengis.net/gml',
+    'gml32': 'http://www.opengis.net/gml/3.2',
+    'gmx': 'http://www.isotc211.org/2005/gmx',
+    'srv': 'http://www.isotc211.org/2005/srv'
+}
+
+# precompiled XPaths of the ISO 19139 fast path, relative to the
+# element they are evaluated against
+ISO_XPATHS = dict((key, etree.XPath(path, namespaces=ISO_NAMESPACES)) for key, path in {
+    # documents the OWSLib parser rejects or handles differently
+    'owslib_only': 'boolean('
+        'gmd:locale/gmd:PT_Locale[not(gmd:languageCode/gmd:LanguageCode) or '
+        'not(gmd:characterEncoding/gmd:MD_CharacterSetCode)] | '
+        'gmd:identificationInfo/*[1][local-name()="MD_ServiceIdentification"] | '
+        'gmd:identificationInfo//gmd:EX_BoundingPolygon) or '
+        'not(gmd:identificationInfo/gmd:MD_DataIdentification | '
+        'gmd:identificationInfo/srv:SV_ServiceIdentification)',
+    # MD_Metadata
+    'identifier': 'gmd:fileIdentifier/gco:CharacterString',
+    'parentidentifier': 'gmd:parentIdentifier/gco:CharacterString',
+    'language': 'gmd:language/gco:CharacterString',
+    'dataseturi': 'gmd:dataSetURI/gco:CharacterString',
+    'datestamp': 'gmd:dateStamp/gco:Date',
+    'datetimestamp': 'gmd:dateStamp/gco:DateTime',
+    'hierarchy': 'gmd:hierarchyLevel/gmd:MD_ScopeCode',
+    'contact': 'gmd:contact/gmd:CI_ResponsibleParty',
+    'referencesystem': 'gmd:referenceSystemInfo/gmd:MD_ReferenceSystem',
+    'referencesystem_code': 'gmd:referenceSystemIdentifier/gmd:RS_Identifier/gmd:code/gco:CharacterString',
+    'dataidentification': 'gmd:identificationInfo/gmd:MD_DataIdentification',
+    'serviceidentification': 'gmd:identificationInfo/srv:SV_ServiceIdentification',
+    'identificationinfo': 'gmd:identificationInfo',
+    'distribution': 'gmd:distributionInfo/gmd:MD_Distribution',
+    # MD_DataIdentification
+    'title': 'gmd:citation/gmd:CI_Citation/gmd:title/gco:CharacterString',
+    'alternatetitle': 'gmd:citation/gmd:CI_Citation/gmd:alternateTitle/gco:CharacterString',
+    'aggregationinfo': 'gmd:aggregationInfo',
+    'abstract': 'gmd:abstract/gco:CharacterString',
+    'abstract_anchor': 'gmd:abstract/gmx:Anchor',
+    'date': 'gmd:citation/gmd:CI_Citation/gmd:date/gmd:CI_Date',
+    'date_date': 'gmd:date/gco:Date',
+    'date_datetime': 'gmd:date/gco:DateTime',
+    'date_type': 'gmd:dateType/gmd:CI_DateTypeCode',
+    'uselimitation': 'gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:useLimitation/gco:CharacterString',
+    'uselimitation2': 'gmd:resourceConstraints/gmd:MD_Constraints/gmd:useLimitation/gco:CharacterString',
+    'uselimitation_anchor': 'gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:useLimitation/gmx:Anchor',
+    'uselimitation_anchor2': 'gmd:resourceConstraints/gmd:MD_Constraints/gmd:useLimitation/gmx:Anchor',
+    'accessconstraints': 'gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:accessConstraints/gmd:MD_RestrictionCode',
+    'classification': 'gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:accessConstraints/gmd:MD_ClassificationCode',
+    'otherconstraints': 'gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:otherConstraints/gco:CharacterString',
+    'securityconstraints': 'gmd:resourceConstraints/gmd:MD_SecurityConstraints/gmd:classification/gmd:MD_ClassificationCode',
+    'denominators': 'gmd:spatialResolution/gmd:MD_Resolution/gmd:equivalentScale/gmd:MD_RepresentativeFraction/gmd:denominator/gco:Integer',
+    'distance': 'gmd:spatialResolution/gmd:MD_Resolution/gmd:distance/gco:Distance',
+    'resourcelanguage': 'gmd:language/gco:CharacterString',
+    'pointofcontact': 'gmd:pointOfContact/gmd:CI_ResponsibleParty',
+    'descriptivekeywords': 'gmd:descriptiveKeywords',
+    'keyword': 'gmd:MD_Keywords/gmd:keyword',
+    'keyword_value': 'gco:CharacterString',
+    'keyword_type': 'gmd:MD_Keywords/gmd:type/gmd:MD_KeywordTypeCode',
+    'topiccategory': 'gmd:topicCategory/gmd:MD_TopicCategoryCode',
+    'extent': 'gmd:extent',
+    'extent2': 'srv:extent',
+    'geographicelement': 'gmd:EX_Extent/gmd:geographicElement',
+    'geographicelement_test': 'boolean(gmd:EX_GeographicBoundingBox | gmd:EX_BoundingPolygon)',
+    'begin': 'gmd:EX_Extent/gmd:temporalElement/gmd:EX_TemporalExtent/gmd:extent/gml:TimePeriod/gml:beginPosition',
+    'begin32': 'gmd:EX_Extent/gmd:temporalElement/gmd:EX_TemporalExtent/gmd:extent/gml32:TimePeriod/gml32:beginPosition',
+    'end': 'gmd:EX_Extent/gmd:temporalElement/gmd:EX_TemporalExtent/gmd:extent/gml:TimePeriod/gml:endPosition',
+    'end32': 'gmd:EX_Extent/gmd:temporalElement/gmd:EX_TemporalExtent/gmd:extent/gml32:TimePeriod/gml32:endPosition',
+    'bbox': 'gmd:EX_GeographicBoundingBox',
+    'bbox_minx': 'gmd:westBoundLongitude/gco:Decimal',
+    'bbox_maxx': 'gmd:eastBoundLongitude/gco:Decimal',
+    'bbox_miny': 'gmd:southBoundLatitude/gco:Decimal',
+    'bbox_maxy': 'gmd:northBoundLatitude/gco:Decimal',
+    'description_code': 'gmd:EX_GeographicDescription/gmd:geographicIdentifier/gmd:MD_Identifier/gmd:code/gco:CharacterString',
+    # SV_ServiceIdentification
+    'servicetype': 'srv:serviceType/gco:LocalName',
+    'servicetypeversion': 'srv:serviceTypeVersion/gco:CharacterString',
+    'couplingtype': 'gmd:couplingType/gmd:SV_CouplingType',
+    'connectpoint': 'srv:containsOperations/srv:SV_OperationMetadata/srv:connectPoint',
+    'connectpoint_resource': 'gmd:CI_OnlineResource',
+    # CI_ResponsibleParty
+    'organization': 'gmd:organisationName/gco:CharacterString',
+    'role': 'gmd:role/gmd:CI_RoleCode',
+    # MD_Distribution
+    'online': 'gmd:transferOptions/gmd:MD_DigitalTransferOptions/gmd:onLine/gmd:CI_OnlineResource',
+    'distributor': 'gmd:distributor',
+    'distributor_online': 'gmd:MD_Distributor/gmd:distributorTransferOptions/gmd:MD_DigitalTransferOptions/gmd:onLine/gmd:CI_OnlineResource',
+    # CI_OnlineResource
+    'url': 'gmd:linkage/gmd:URL',
+    'protocol': 'gmd:protocol/gco:CharacterString',
+    'name': 'gmd:name/gco:CharacterString',
+    'description': 'gmd:description/gco:CharacterString'
+}.items())
+
+def _iso_value(key, node):
+    ''' stripped text of the first match (as owslib.util.testXMLValue) '''
+
+    nodes = ISO_XPATHS[key](node)
+    if nodes and nodes[0].text:
+        return nodes[0].text.strip()
+    return None
+
+def _iso_values(key, node):
+    ''' stripped text of all matches with text '''
+
+    return [i.text.strip() for i in ISO_XPATHS[key](node) if i.text]
+
+def _iso_codelist_value(node):
+    ''' codeListValue of a codelist element, else its text '''
+
+    if node is None:
+        return None
+    value = node.attrib.get('codeListValue')
+    if value is not None:
+        return value.strip()
+    if node.text:
+        return node.text.strip()
+    return None
+
+def _iso_first(key, node):
+    ''' first match, or None '''
+
+    nodes = ISO_XPATHS[key](node)
+    if nodes:
+        return nodes[0]
+    return None
+
+def _iso_link(node):
+    ''' link string of a gmd:CI_OnlineResource '''
+
+    if node is None:
+        return 'None,None,None,None'
+    return '%s,%s,%s,%s' % (_iso_value('name', node), _iso_value('description', node),
+                            _iso_value('protocol', node), _iso_value('url', node))
+
+def _parse_iso_xpath(context, repos, exml):
+    ''' parse ISO 19139 straight from the document tree with precompiled
+    XPaths, producing the same values as the OWSLib based parser '''
+
+    recobj = repos.dataset()
+    links = []
+
+    _set(context, recobj, 'pycsw:Identifier', _iso_value('identifier', exml))
+    _set(context, recobj, 'pycsw:Typename', 'gmd:MD_Metadata')
+    _set(context, recobj, 'pycsw:Schema', context.namespaces['gmd'])
+    _set(context, recobj, 'pycsw:MdSource', 'local')
+    _set(context, recobj, 'pycsw:InsertDate', util.get_today_and_now())
+    _set(context, recobj, 'pycsw:XML', etree.tostring(exml))
+    _set(context, recobj, 'pycsw:AnyText', util.get_anytext(exml))
+    _set(context, recobj, 'pycsw:Language', _iso_value('language', exml))
+    _set(context, recobj, 'pycsw:Type', _iso_codelist_value(_iso_first('hierarchy', exml)))
+    _set(context, recobj, 'pycsw:ParentIdentifier', _iso_value('parentidentifier', exml))
+    datestamp = _iso_value('datestamp', exml)
+    if not datestamp:
+        datestamp = _iso_value('datetimestamp', exml)
+    _set(context, recobj, 'pycsw:Date', datestamp)
+    _set(context, recobj, 'pycsw:Modified', datestamp)
+    _set(context, recobj, 'pycsw:Source', _iso_value('dataseturi', exml))
+
+    referencesystem = _iso_first('referencesystem', exml)
+    if referencesystem is not None:
+        code = _iso_value('referencesystem_code', referencesystem)
+        try:
+            code_ = 'urn:ogc:def:crs:EPSG::%d' % int(code)
+        except ValueError:
+            code_ = code
+        _set(context, recobj, 'pycsw:CRS', code_)
+
+    serviceidentification = None
+    identification = _iso_first('dataidentification', exml)
+    if identification is None:
+        identification = serviceidentification = _iso_first('serviceidentification', exml)
+
+    _set(context, recobj, 'pycsw:Title', _iso_value('title', identification))
+    _set(context, recobj, 'pycsw:AlternateTitle', _iso_value('alternatetitle', identification))
+    abstract = _iso_value('abstract', identification)
+    if _iso_first('abstract_anchor', identification) is not None:
+        abstract = _iso_value('abstract_anchor', identification)
+    _set(context, recobj, 'pycsw:Abstract', abstract)
+    _set(context, recobj, 'pycsw:Relation', _iso_value('aggregationinfo', identification))
+
+    bbox = None
+    extents = (ISO_XPATHS['extent'](identification) +
+               ISO_XPATHS['extent2'](identification))
+    if extents:
+        geographicelement = begin = end = None
+        for extent in extents:
+            if geographicelement is None:
+                for element in ISO_XPATHS['geographicelement'](extent):
+                    if ISO_XPATHS['geographicelement_test'](element):
+                        geographicelement = element
+                        break
+            if begin is None:
+                begin = _iso_first('begin', extent)
+                if begin is None:
+                    begin = _iso_first('begin32', extent)
+            if end is None:
+                end = _iso_first('end', extent)
+                if end is None:
+                    end = _iso_first('end32', extent)
+
+        for key, node in [('pycsw:TempExtent_begin', begin), ('pycsw:TempExtent_end', end)]:
+            _set(context, recobj, key, node.text.strip() if node is not None and node.text else None)
+
+        description_code = None
+        if geographicelement is not None:
+            bbox = _iso_first('bbox', geographicelement)
+            description_code = _iso_value('description_code', geographicelement)
+        _set(context, recobj, 'pycsw:GeographicDescriptionCode', description_code)
+
+    topiccategory = _iso_values('topiccategory', identification)
+    if topiccategory:
+        _set(context, recobj, 'pycsw:TopicCategory', topiccategory[0])
+
+    resourcelanguage = _iso_values('resourcelanguage', identification)
+    if resourcelanguage:
+        _set(context, recobj, 'pycsw:ResourceLanguage', resourcelanguage[0])
+
+    descriptivekeywords = ISO_XPATHS['descriptivekeywords'](identification)
+    if descriptivekeywords:
+        all_keywords = []
+        for keywords in descriptivekeywords:
+            for keyword in ISO_XPATHS['keyword'](keywords):
+                value = _iso_first('keyword_value', keyword)
+                if value is not None and value.text:
+                    all_keywords.append(value.text.strip())
+        _set(context, recobj, 'pycsw:Keywords', ','.join(all_keywords))
+        _set(context, recobj, 'pycsw:KeywordType',
+             _iso_codelist_value(_iso_first('keyword_type', descriptivekeywords[0])))
+
+    roles = {'originator': [], 'publisher': [], 'author': []}
+    organizations = []
+    for party in ISO_XPATHS['pointofcontact'](identification):
+        organization = _iso_value('organization', party)
+        organizations.append(organization)
+        role = _iso_first('role', party)
+        if role is not None and _iso_codelist_value(role) in roles:
+            roles[_iso_codelist_value(role)].append(organization)
+
+    for key, role in [('pycsw:Creator', 'originator'), ('pycsw:Publisher', 'publisher'),
+                      ('pycsw:Contributor', 'author'), ('pycsw:OrganizationName', None)]:
+        orgs = organizations if role is None else roles[role]
+        if orgs:
+            _set(context, recobj, key, ';'.join(set([org for org in orgs if org is not None])))
+
+    for key, path in [('pycsw:SecurityConstraints', 'securityconstraints'),
+                      ('pycsw:AccessConstraints', 'accessconstraints'),
+                      ('pycsw:Classification', 'classification')]:
+        values = [value for value in map(_iso_codelist_value, ISO_XPATHS[path](identification))
+                  if value is not None]
+        if values:
+            _set(context, recobj, key, values[0])
+
+    otherconstraints = _iso_values('otherconstraints', identification)
+    if otherconstraints:
+        _set(context, recobj, 'pycsw:OtherConstraints', otherconstraints[0])
+
+    for date in ISO_XPATHS['date'](identification):
+        if _iso_first('date_date', date) is not None:
+            value = _iso_value('date_date', date)
+        else:
+            value = _iso_value('date_datetime', date)
+        datetype = _iso_codelist_value(_iso_first('date_type', date))
+        if datetype == 'revision':
+            _set(context, recobj, 'pycsw:RevisionDate', value)
+        elif datetype == 'creation':
+            _set(context, recobj, 'pycsw:CreationDate', value)
+        elif datetype == 'publication':
+            _set(context, recobj, 'pycsw:PublicationDate', value)
+
+    denominators = _iso_values('denominators', identification)
+    if denominators:
+        _set(context, recobj, 'pycsw:Denominator', denominators[0])
+    distances = ISO_XPATHS['distance'](identification)
+    values = [i.text.strip() for i in distances if i.text]
+    if values:
+        _set(context, recobj, 'pycsw:DistanceValue', values[0])
+    if distances:
+        _set(context, recobj, 'pycsw:DistanceUOM', distances[0].get('uom'))
+
+    uselimitation = (_iso_values('uselimitation', identification) +
+                     _iso_values('uselimitation2', identification) +
+                     _iso_values('uselimitation_anchor', identification) +
+                     _iso_values('uselimitation_anchor2', identification))
+    if uselimitation:
+        _set(context, recobj, 'pycsw:ConditionApplyingToAccessAndUse', uselimitation[0])
+
+    # as with the OWSLib parser, pycsw:Format and data quality
+    # properties are not populated
+
+    if serviceidentification is not None:
+        _set(context, recobj, 'pycsw:ServiceTypeVersion',
+             _iso_value('servicetypeversion', serviceidentification))
+        _set(context, recobj, 'pycsw:CouplingType',
+             _iso_codelist_value(_iso_first('couplingtype', serviceidentification)))
+
+    service_types = []
+    services = []
+    for identificationinfo in ISO_XPATHS['identificationinfo'](exml):
+        children = list(identificationinfo)
+        if (children and isinstance(children[0].tag, str) and
+                etree.QName(children[0]).localname == 'SV_ServiceIdentification'):
+            services.append(children[0])
+            servicetype = _iso_value('servicetype', children[0])
+            if servicetype is not None:
+                service_types.append(servicetype)
+
+    _set(context, recobj, 'pycsw:ServiceType', ','.join(service_types))
+
+    contact = _iso_first('contact', exml)
+    if contact is not None:
+        _set(context, recobj, 'pycsw:ResponsiblePartyRole',
+             _iso_codelist_value(_iso_first('role', contact)))
+
+    LOGGER.info('Scanning for links')
+    distribution = _iso_first('distribution', exml)
+    if distribution is not None:
+        dist_links = ISO_XPATHS['online'](distribution)
+        for distributor in ISO_XPATHS['distributor'](distribution):
+            dist_links.extend(ISO_XPATHS['distributor_online'](distributor))
+        for link in dist_links:
+            url = _iso_value('url', link)
+            protocol = _iso_value('protocol', link)
+            if url is not None and protocol is None:  # take a best guess
+                protocol = sniff_link(url)
+            links.append('%s,%s,%s,%s' % (_iso_value('name', link),
+                         _iso_value('description', link), protocol, url))
+
+    for service in services:
+        for connectpoint in ISO_XPATHS['connectpoint'](service):
+            links.append(_iso_link(_iso_first('connectpoint_resource', connectpoint)))
+
+    if len(links) > 0:
+        _set(context, recobj, 'pycsw:Links', '^'.join(links))
+
+    if bbox is not None:
+        try:
+            tmp = '%s,%s,%s,%s' % (_iso_value('bbox_minx', bbox), _iso_value('bbox_miny', bbox),
+                                   _iso_value('bbox_maxx', bbox), _iso_value('bbox_maxy', bbox))
+            _set(context, recobj, 'pycsw:BoundingBox', util.bbox2wktpolygon(tmp))
+        except:  # coordinates are corrupted, do not include
+            _set(context, recobj, 'pycsw:BoundingBox', None)
+    else:
+        _set(context, recobj, 'pycsw:BoundingBox', None)
+
+    return recobj
+
 def _parse_iso(context, repos, exml):
 
+    if (context.iso_parser == 'xpath' and
+        exml.tag in ['{http://www.isotc211.org/2005/gmd}MD_Metadata',
+                     '{http://www.isotc211.org/2005/gmi}MI_Metadata'] and
+        not ISO_XPATHS['owslib_only'](exml)):
+        return _parse_iso_xpath(context, repos, exml)
+
     from owslib.iso import MD_Metadata
     from owslib.iso_che import CHE_MD_Metadata
 
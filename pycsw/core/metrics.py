@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import glob
+import json
+import logging
+import os
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1000, 10000, 100000, 1000000, 10000000, 100000000)
+MEMORY_BUCKETS = (100000, 1000000, 10000000, 100000000, 1000000000)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'pycsw_requests_total': (
+        'counter', 'Requests, by operation, version and mode', None),
+    'pycsw_exceptions_total': (
+        'counter', 'Requests answered with an exception report', None),
+    'pycsw_request_duration_seconds': (
+        'histogram', 'Request latency', LATENCY_BUCKETS),
+    'pycsw_response_size_bytes': (
+        'histogram', 'Response body size', SIZE_BUCKETS),
+    'pycsw_request_rss_growth_bytes': (
+        'histogram', 'Growth of the worker resident set size per request',
+        MEMORY_BUCKETS),
+    'pycsw_request_memory_peak_bytes': (
+        'histogram', 'Peak memory allocated by Python per request',
+        MEMORY_BUCKETS),
+    'pycsw_process_resident_memory_bytes': (
+        'gauge', 'Resident set size of the worker processes', None),
+    'pycsw_response_budget_exceeded_total': (
+        'counter', 'Responses over the byte or record budget, by budget',
+        None),
+    'pycsw_admission_rejected_total': (
+        'counter', 'Requests rejected over the admission limits, by operation',
+        None),
+    'pycsw_records_returned_total': (
+        'counter', 'Records written to responses', None),
+    'pycsw_record_cache_requests_total': (
+        'counter', 'Rendered record cache lookups, by result', None),
+    'pycsw_db_pool_connections': (
+        'gauge', 'Database connections, by state', None),
+    'pycsw_http_client_requests_total': (
+        'counter', 'Outgoing HTTP requests, by host', None),
+    'pycsw_http_client_cache_hits_total': (
+        'counter', 'Outgoing HTTP requests served from cache, by host', None),
+    'pycsw_http_client_bytes_total': (
+        'counter', 'Outgoing HTTP response bytes, by host', None),
+    'pycsw_harvest_records_total': (
+        'counter', 'Records inserted or updated by Harvest, by source', None),
+    'pycsw_harvest_seconds_total': (
+        'counter', 'Time spent harvesting, by source', None),
+    'pycsw_harvest_failures_total': (
+        'counter', 'Failed Harvest requests, by source', None),
+}
+
+
+class Registry(object):
+    ''' metric values of this process
+
+    When directory is set, values are written there after each request, one
+    file per process, and scrapes add up the files of all processes; gauges
+    are only reported for live processes '''
+
+    def __init__(self, directory=None):
+        ''' initialize registry '''
+
+        self.directory = directory
+        self.values = {}  # (name, labels): value
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        ''' increment a counter '''
+
+        key = (name, _get_labels(labels))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        ''' set a gauge, or a counter kept elsewhere '''
+
+        with self._lock:
+            self.values[(name, _get_labels(labels))] = value
+
+    def observe(self, name, labels, value):
+        ''' add an observation to a histogram '''
+
+        labels = _get_labels(labels)
+        with self._lock:
+            for bucket in METRICS[name][2] + ('+Inf',):
+                key = ('%s_bucket' % name, labels + (('le', str(bucket)),))
+                self.values[key] = self.values.get(key, 0) + int(
+                    bucket == '+Inf' or value <= bucket)
+            for suffix, increment in [('sum', value), ('count', 1)]:
+                key = ('%s_%s' % (name, suffix), labels)
+                self.values[key] = self.values.get(key, 0) + increment
+
+    def flush(self):
+        ''' write the values of this process to the shared directory '''
+
+        if self.directory is None:
+            return
+
+        with self._lock:
+            content = json.dumps([[name, labels, value] for
+                                  (name, labels), value in self.values.items()])
+
+        path = os.path.join(self.directory, 'pycsw_%d.json' % os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmppath = '%s.%s.tmp' % (path, threading.get_ident())
+            with open(tmppath, 'w') as fh:
+                fh.write(content)
+            os.replace(tmppath, path)
+        except (IOError, OSError) as err:
+            LOGGER.warning('Could not write metrics: %s', err)
+
+    def collect(self):
+        ''' return the values of all processes '''
+
+        with self._lock:
+            values = dict(self.values)
+
+        if self.directory is None:
+            return values
+
+        for path in glob.glob(os.path.join(self.directory, 'pycsw_*.json')):
+            try:
+                pid = int(os.path.basename(path)[6:-5])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            alive = _is_alive(pid)
+            try:
+                with open(path) as fh:
+                    entries = json.load(fh)
+            except (IOError, OSError, ValueError):
+                continue
+            for name, labels, value in entries:
+                if _get_type(name) == 'gauge' and not alive:
+                    continue
+                key = (name, tuple(tuple(label) for label in labels))
+                values[key] = values.get(key, 0) + value
+
+        return values
+
+    def render(self):
+        ''' return the values of all processes in the Prometheus text
+        exposition format '''
+
+        values = self.collect()
+
+        lines = []
+        for metric, (type_, help_, buckets) in METRICS.items():
+            names = [metric]
+            if type_ == 'histogram':
+                names = ['%s_%s' % (metric, suffix) for suffix in
+                         ['bucket', 'sum', 'count']]
+            samples = sorted([(name, labels, value) for (name, labels), value
+                              in values.items() if name in names],
+                             key=_sample_order)
+            if not samples:
+                continue
+            lines.append('# HELP %s %s' % (metric, help_))
+            lines.append('# TYPE %s %s' % (metric, type_))
+            for name, labels, value in samples:
+                if labels:
+                    name = '%s{%s}' % (name, ','.join(
+                        '%s="%s"' % (label, _escape(label_value))
+                        for label, label_value in labels))
+                lines.append('%s %s' % (name, repr(float(value))))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _get_labels(labels):
+    ''' return labels as a hashable, ordered tuple '''
+
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _sample_order(sample):
+    ''' sort samples by name, then labels, with buckets in numeric order '''
+
+    name, labels, value = sample
+    return (name, [(label, float(label_value) if label == 'le' else 0,
+                    label_value) for label, label_value in labels])
+
+
+def _get_type(name):
+    ''' return the type of the metric of a sample name '''
+
+    for suffix in ['_bucket', '_sum', '_count']:
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return 'histogram'
+    return METRICS.get(name, ('untyped',))[0]
+
+
+def _escape(value):
+    ''' escape a label value '''
+
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _is_alive(pid):
+    ''' whether process pid is running '''
+
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # running, under another user
+        return True
+    return True
+
+
+# process-wide registry
+REGISTRY = Registry()
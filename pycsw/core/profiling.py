@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+LOGGER = logging.getLogger(__name__)
+
+FORMATS = ['pstats', 'speedscope']
+
+# seconds between two samples of the sampling profiler
+SAMPLE_INTERVAL = 0.001
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class Profile(object):
+    ''' profile of a request: deterministic, with cProfile, saved as pstats,
+    or sampled from a background thread, saved for speedscope '''
+
+    def __init__(self, format_='pstats', interval=SAMPLE_INTERVAL):
+        ''' initialize profile '''
+
+        if format_ not in FORMATS:
+            raise RuntimeError('Invalid profile format: %s' % format_)
+
+        self.format = format_
+        self.interval = interval
+        self.profiler = None
+        self.samples = []  # (stack, weight), stacks from the outermost frame
+        self.duration = 0
+        self._thread_id = None
+        self._depth = 0
+        self._done = threading.Event()
+
+    def run(self, function, *args, **kwargs):
+        ''' call function, profiling it, and return its result '''
+
+        start = time.perf_counter()
+        try:
+            if self.format == 'pstats':
+                return self._run_cprofile(function, *args, **kwargs)
+            return self._run_sampled(function, *args, **kwargs)
+        finally:
+            self.duration = time.perf_counter() - start
+
+    def save(self, directory, operation, request_id):
+        ''' write the profile to directory, tagged with the operation and
+        request id, and return its path '''
+
+        filename = '%s-%s-%s' % (
+            datetime.utcnow().strftime('%Y%m%dT%H%M%S.%fZ'),
+            re.sub(r'[^\w.-]', '_', operation), request_id)
+        if self.format == 'pstats':
+            path = os.path.join(directory, '%s.pstats' % filename)
+        else:
+            path = os.path.join(directory, '%s.speedscope.json' % filename)
+
+        os.makedirs(directory, exist_ok=True)
+        if self.format == 'pstats':
+            if self.profiler is None:
+                return None
+            self.profiler.dump_stats(path)
+        else:
+            with open(path, 'w') as fh:
+                json.dump(self.get_speedscope('%s %s' % (operation,
+                                                         request_id)), fh)
+
+        LOGGER.info('Profile of request %s written to %s', request_id, path)
+        return path
+
+    def get_speedscope(self, name):
+        ''' return the samples in the speedscope file format '''
+
+        frames = []
+        indexes = {}
+        samples = []
+        for stack, weight in self.samples:
+            sample = []
+            for frame in stack:
+                if frame not in indexes:
+                    indexes[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1],
+                                   'line': frame[2]})
+                sample.append(indexes[frame])
+            samples.append(sample)
+        weights = [weight for stack, weight in self.samples]
+
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'pycsw',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+    def _run_cprofile(self, function, *args, **kwargs):
+        ''' call function under cProfile '''
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as err:  # another profiler is active
+            LOGGER.warning('Could not profile request: %s', err)
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self.profiler = profiler
+
+    def _run_sampled(self, function, *args, **kwargs):
+        ''' call function, sampling the stack of the calling thread '''
+
+        self._thread_id = threading.get_ident()
+        self._depth = len(_get_stack(sys._getframe()))
+        self._done.clear()
+
+        sampler = threading.Thread(target=self._sample,
+                                   name='pycsw-profiler')
+        sampler.daemon = True
+        sampler.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._done.set()
+            sampler.join()
+
+    def _sample(self):
+        ''' record the stack of the profiled thread until it is done '''
+
+        last = time.perf_counter()
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = _get_stack(frame)[self._depth:]
+            now = time.perf_counter()
+            if stack:
+                self.samples.append((stack, now - last))
+            last = now
+
+
+def _get_stack(frame):
+    ''' return the (function, file, line) of the frames of a stack, from the
+    outermost one '''
+
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RecordCache(object):
+    ''' LRU cache of serialized records, optionally backed by a directory
+
+    Values are JSON serializable.  Entries are keyed by tuples of strings and
+    numbers starting with the record identifier, so that
+    all renderings of a record can be invalidated at once.  When a directory
+    is set, it is shared by all processes serving the repository: entries are
+    written to it, and in-memory entries are only served while their file
+    still exists, so invalidation from one process applies to all '''
+
+    def __init__(self, maxsize=0, cachedir=None):
+        ''' initialize cache '''
+
+        self.maxsize = maxsize
+        self.cachedir = cachedir
+        self._entries = OrderedDict()
+        self._identifiers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        ''' whether records are cached at all '''
+
+        return self.maxsize > 0 or self.cachedir is not None
+
+    def get(self, key):
+        ''' return cached value of key, or None '''
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+
+        if self.cachedir is None:
+            return value
+
+        path = self._path(key)
+        if value is not None:
+            if os.path.exists(path):
+                return value
+            self._forget(key)
+            return None
+
+        try:
+            with open(path, 'rb') as fh:
+                value = json.loads(fh.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        ''' cache value of key '''
+
+        self._remember(key, value)
+
+        if self.cachedir is not None:
+            path = self._path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmppath = '%s.%s.%s.tmp' % (path, os.getpid(),
+                                            threading.get_ident())
+                with open(tmppath, 'wb') as fh:
+                    fh.write(json.dumps(value).encode('utf-8'))
+                os.replace(tmppath, path)
+            except (IOError, OSError) as err:
+                LOGGER.warning('Could not write record cache entry: %s', err)
+
+    def invalidate(self, identifiers):
+        ''' drop all cached renderings of records '''
+
+        with self._lock:
+            for identifier in identifiers:
+                for key in self._identifiers.pop(identifier, []):
+                    self._entries.pop(key, None)
+
+        if self.cachedir is not None:
+            for identifier in identifiers:
+                shutil.rmtree(self._directory(identifier), ignore_errors=True)
+
+    def clear(self):
+        ''' drop all entries '''
+
+        with self._lock:
+            self._entries.clear()
+            self._identifiers.clear()
+
+        if self.cachedir is not None:
+            shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def _remember(self, key, value):
+        ''' add an entry to the in-memory LRU '''
+
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._identifiers.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key = self._entries.popitem(last=False)[0]
+                keys = self._identifiers.get(old_key[0])
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._identifiers[old_key[0]]
+
+    def _forget(self, key):
+        ''' drop an entry from the in-memory LRU '''
+
+        with self._lock:
+            self._entries.pop(key, None)
+            keys = self._identifiers.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._identifiers[key[0]]
+
+    def _directory(self, identifier):
+        ''' directory holding all cached renderings of a record '''
+
+        digest = hashlib.sha1(identifier.encode('utf-8')).hexdigest()
+        return os.path.join(self.cachedir, digest[:2], digest)
+
+    def _path(self, key):
+        ''' file path of a cached entry '''
+
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._directory(key[0]), digest)
+
+
+# process-wide cache, disabled unless configured
+CACHE = RecordCache()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pycsw.core.etree import etree, PARSER
+
+LOGGER = logging.getLogger(__name__)
+
+# process-wide pool, created on first use
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+# chunks of records per worker, so that workers finish at about the same time
+CHUNKS_PER_WORKER = 4
+
+
+class Record(object):
+    ''' plain record, rebuilt in a worker from its column values '''
+
+    def __init__(self, columns):
+        ''' initialize record '''
+
+        self.__dict__.update(columns)
+
+
+def get_columns(record):
+    ''' return the column values of a repository record '''
+
+    return dict((key, value) for key, value in record.__dict__.items()
+                if not key.startswith('_'))
+
+
+def render(records, writer, args, workers):
+    ''' render records with writer(record, *args) in a pool of worker
+    processes, returning the resulting elements in order
+
+    Workers are sent the column values of the records, and send back the
+    serialized elements, which are parsed again here.  Elements with empty
+    text are serialized as ``<a></a>`` rather than ``<a/>``; their positions
+    travel with the fragment, so that they serialize the same afterwards '''
+
+    pool = _get_pool(workers)
+
+    rows = [get_columns(record) for record in records]
+    size = max(1, -(-len(rows) // (workers * CHUNKS_PER_WORKER)))
+
+    futures = [pool.submit(_render_rows, writer, args, rows[i:i+size])
+               for i in range(0, len(rows), size)]
+
+    nodes = []
+    try:
+        for future in futures:
+            nodes.extend(_parse_fragment(fragment, empty)
+                         for fragment, empty in future.result())
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+    return nodes
+
+
+def _render_rows(writer, args, rows):
+    ''' render rows in a worker process '''
+
+    fragments = []
+    for row in rows:
+        node = writer(Record(row), *args)
+        empty = [num for num, element in enumerate(node.iter())
+                 if element.text == '']
+        fragments.append((etree.tostring(node), empty))
+    return fragments
+
+
+def _parse_fragment(fragment, empty):
+    ''' parse a fragment rendered by a worker process '''
+
+    node = etree.fromstring(fragment, PARSER)
+    if empty:
+        elements = list(node.iter())
+        for num in empty:
+            elements[num].text = ''
+    return node
+
+
+def _get_pool(workers):
+    ''' return the process pool, (re)creating it with workers processes '''
+
+    global _POOL, _POOL_WORKERS
+
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            LOGGER.info('Starting %d record rendering processes', workers)
+            _POOL = ProcessPoolExecutor(max_workers=workers)
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def _reset_pool(pool):
+    ''' drop a broken pool, so that the next page starts a new one '''
+
+    global _POOL
+
+    with _POOL_LOCK:
+        if _POOL is pool:
+            LOGGER.warning('Record rendering pool broken; restarting')
+            _POOL = None
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+
+import io
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import wsgiref.util
+from glob import glob
+from urllib.parse import parse_qsl, urlparse
+
+import requests
+
+from pycsw.core.etree import etree
+
+LOGGER = logging.getLogger(__name__)
+
+# request types which change the catalogue, only replayed when given a
+# weight in the mix
+WRITE_TYPES = ['Transaction', 'Harvest']
+
+# request line of the Common and Combined Log Formats
+ACCESS_LOG_REQUEST = re.compile(r'"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+"')
+
+
+class ReplayRequest(object):
+    ''' request of a replay corpus '''
+
+    def __init__(self, name, query=None, body=None):
+        ''' initialize request '''
+
+        self.name = name
+        self.query = query or ''
+        self.body = body
+        self.type = get_request_type(self.query, self.body)
+
+
+class HttpTarget(object):
+    ''' send requests to a running endpoint '''
+
+    def __init__(self, url, timeout=30):
+        ''' initialize target '''
+
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, request):
+        ''' send a request and return its status code and response body '''
+
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+
+        if request.body is not None:
+            response = session.post(
+                self.url, params=request.query or None, data=request.body,
+                headers={'Content-Type': 'application/xml'},
+                timeout=self.timeout)
+        else:
+            url = self.url
+            if request.query:
+                url = '%s%s%s' % (url, '&' if '?' in url else '?',
+                                  request.query)
+            response = session.get(url, timeout=self.timeout)
+
+        return response.status_code, response.content
+
+
+class WsgiTarget(object):
+    ''' send requests to pycsw's WSGI application, in-process '''
+
+    def __init__(self, config_path):
+        ''' initialize target '''
+
+        self.config_path = config_path
+
+    def send(self, request):
+        ''' send a request and return its status code and response body '''
+
+        from pycsw import wsgi
+
+        environ = {
+            'PYCSW_CONFIG': self.config_path,
+            'REMOTE_ADDR': '127.0.0.1',
+            'QUERY_STRING': request.query,
+            'REQUEST_METHOD': 'GET'
+        }
+        if request.body is not None:
+            environ['REQUEST_METHOD'] = 'POST'
+            environ['CONTENT_TYPE'] = 'application/xml'
+            environ['CONTENT_LENGTH'] = str(len(request.body))
+            environ['wsgi.input'] = io.BytesIO(request.body)
+        wsgiref.util.setup_testing_defaults(environ)
+
+        status = []
+
+        def start_response(status_line, headers):
+            status.append(int(status_line.split()[0]))
+
+        contents = b''.join(wsgi.application(environ, start_response))
+        return status[0], contents
+
+
+class Results(object):
+    ''' latencies and outcomes of replayed requests, by request type '''
+
+    def __init__(self):
+        ''' initialize results '''
+
+        self.durations = {}
+        self.errors = {}
+        self.exceptions = {}
+        self.elapsed = None
+        self._lock = threading.Lock()
+
+    def add(self, type_, duration, status=None, contents=None):
+        ''' record the outcome of a request; status is None on transport
+        errors '''
+
+        error = status is None or status >= 500
+        exception = not error and (status >= 400 or (
+            contents is not None and b'ExceptionReport' in contents))
+
+        with self._lock:
+            self.durations.setdefault(type_, []).append(duration)
+            self.errors[type_] = self.errors.get(type_, 0) + int(error)
+            self.exceptions[type_] = (self.exceptions.get(type_, 0) +
+                                      int(exception))
+
+    def to_dict(self):
+        ''' return the statistics of each request type, and of all '''
+
+        types = dict((type_, self._get_stats(
+            durations, self.errors[type_], self.exceptions[type_]))
+            for type_, durations in sorted(self.durations.items()))
+        types['all'] = self._get_stats(
+            [duration for durations in self.durations.values()
+             for duration in durations],
+            sum(self.errors.values()), sum(self.exceptions.values()))
+        return types
+
+    def report(self):
+        ''' return the statistics as a text table '''
+
+        lines = ['%-32s %8s %9s %9s %9s %9s %7s %7s' % (
+            'type', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+            'errors', 'exc.')]
+        for type_, stats in self.to_dict().items():
+            lines.append('%-32s %8d %9.1f %9.1f %9.1f %9.1f %6.1f%% %6.1f%%' % (
+                type_, stats['requests'], stats['throughput'],
+                stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+                stats['error_rate'] * 100, stats['exception_rate'] * 100))
+        return '\n'.join(lines)
+
+    def _get_stats(self, durations, errors, exceptions):
+        ''' return the statistics of a list of request durations '''
+
+        durations = sorted(durations)
+        count = len(durations)
+        stats = {
+            'requests': count,
+            'throughput': count / self.elapsed if self.elapsed else 0,
+            'error_rate': errors / count if count else 0,
+            'exception_rate': exceptions / count if count else 0,
+            'mean_ms': sum(durations) * 1000 / count if count else 0
+        }
+        for rank in [50, 95, 99, 100]:
+            key = 'max_ms' if rank == 100 else 'p%d_ms' % rank
+            stats[key] = percentile(durations, rank) * 1000
+        return stats
+
+
+def percentile(values, rank):
+    ''' return a percentile of sorted values, interpolating linearly '''
+
+    if not values:
+        return 0
+    position = (len(values) - 1) * rank / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def get_request_type(query, body=None):
+    ''' return the kind of a request, such as GetRecords or
+    OAI-PMH:ListRecords '''
+
+    if body is not None:
+        try:
+            root = etree.fromstring(body)
+        except etree.XMLSyntaxError:
+            return 'unknown'
+        if etree.QName(root).localname == 'Envelope':  # SOAP
+            for element in root.iter():
+                if etree.QName(element).localname == 'Body' and len(element):
+                    root = element[0]
+                    break
+        return etree.QName(root).localname
+
+    params = dict((key.lower(), value) for key, value in
+                  parse_qsl(query, keep_blank_values=True))
+    mode = params.get('mode')
+    if mode == 'oaipmh':
+        return 'OAI-PMH:%s' % params.get('verb', 'unknown')
+    if mode == 'sru':
+        return 'SRU:%s' % params.get('operation', 'explain')
+    if mode == 'opensearch':
+        return 'OpenSearch:%s' % params.get('request', 'unknown')
+    return params.get('request', 'unknown')
+
+
+def load_suites(path):
+    ''' return the requests of functional test suites: path is a suite
+    directory, or a directory of suites, with get/requests.txt and
+    post/*.xml '''
+
+    suites = [path]
+    if not os.path.isdir(os.path.join(path, 'get')) and not os.path.isdir(
+            os.path.join(path, 'post')):
+        suites = sorted(glob(os.path.join(path, '*')))
+
+    corpus = []
+    for suite in suites:
+        name = os.path.basename(suite.rstrip(os.sep))
+        get_requests = os.path.join(suite, 'get', 'requests.txt')
+        if os.path.isfile(get_requests):
+            with open(get_requests, encoding='utf-8') as fh:
+                for line in fh:
+                    if ',' not in line:
+                        continue
+                    identifier, query = line.strip().split(',', 1)
+                    # the suites select their configuration in the query
+                    query = query.split('PYCSW_SERVER?', 1)[-1]
+                    query = '&'.join(param for param in query.split('&')
+                                     if not param.startswith('config='))
+                    corpus.append(ReplayRequest(
+                        '%s/get/%s' % (name, identifier), query=query))
+        for xml in sorted(glob(os.path.join(suite, 'post', '*.xml'))):
+            with open(xml, 'rb') as fh:
+                corpus.append(ReplayRequest(
+                    '%s/post/%s' % (name, os.path.basename(xml)[:-4]),
+                    body=fh.read()))
+
+    return corpus
+
+
+def load_access_log(path):
+    ''' return the GET requests of an access log in the Common or Combined
+    Log Format; POST requests are skipped, as their body is not logged '''
+
+    corpus = []
+    skipped = 0
+    with open(path, encoding='utf-8', errors='replace') as fh:
+        for number, line in enumerate(fh, 1):
+            match = ACCESS_LOG_REQUEST.search(line)
+            if match is None:
+                continue
+            if match.group('method') != 'GET':
+                skipped += 1
+                continue
+            corpus.append(ReplayRequest(
+                'line %d' % number, query=urlparse(match.group('path')).query))
+
+    if skipped:
+        LOGGER.warning('Skipped %d non-GET requests of %s', skipped, path)
+    return corpus
+
+
+def load(path):
+    ''' return the requests of a directory of suites or of an access log '''
+
+    if os.path.isdir(path):
+        return load_suites(path)
+    return load_access_log(path)
+
+
+def get_mix(value):
+    ''' parse a mix such as "GetRecords=5,GetRecordById=2,Transaction=0" '''
+
+    mix = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        try:
+            type_, weight = item.split('=')
+            mix[type_.strip()] = float(weight)
+        except ValueError:
+            raise RuntimeError('Invalid mix item: %s (expected type=weight)'
+                               % item)
+    return mix
+
+
+def replay(corpus, target, concurrency=1, rate=None, duration=None,
+           count=None, mix=None, seed=None):
+    ''' replay requests drawn from corpus against a target
+
+    concurrency: number of requests in flight
+    rate: requests started per second (open loop); as fast as possible
+    when None
+    duration: seconds to replay for
+    count: number of requests to send; one pass over the corpus when
+    neither duration nor count are given
+    mix: weight of each request type; requests of other types are drawn
+    in proportion to their share of the corpus, except writes
+    (WRITE_TYPES), which are left out
+
+    returns Results
+    '''
+
+    mix = mix or {}
+    weights = [mix.get(request.type,
+                       0 if request.type in WRITE_TYPES else 1)
+               for request in corpus]
+    if not sum(weights):
+        raise RuntimeError('No request to replay')
+    if duration is None and count is None:
+        count = sum(1 for weight in weights if weight)
+
+    chooser = random.Random(seed)
+    results = Results()
+    lock = threading.Lock()
+    state = {'sent': 0}
+    start = time.time()
+
+    def next_request():
+        ''' return the next request and when to send it, or None when done '''
+
+        with lock:
+            number = state['sent']
+            if count is not None and number >= count:
+                return None
+            scheduled = start + number / rate if rate else time.time()
+            if duration is not None and scheduled - start >= duration:
+                return None
+            state['sent'] += 1
+            return chooser.choices(corpus, weights)[0], scheduled
+
+    def worker():
+        ''' send requests until done '''
+
+        while True:
+            item = next_request()
+            if item is None:
+                return
+            request, scheduled = item
+            delay = scheduled - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            # latency counts from the scheduled time, so that requests
+            # delayed by a saturated target are not under-reported
+            try:
+                status, contents = target.send(request)
+            except Exception as err:
+                LOGGER.warning('Request %s failed: %s', request.name, err)
+                results.add(request.type, time.time() - scheduled)
+            else:
+                results.add(request.type, time.time() - scheduled, status,
+                            contents)
+
+    threads = [threading.Thread(target=worker, name='pycsw-replay-%d' % num)
+               for num in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results.elapsed = time.time() - start
+    return results
+
+
+def write_results(results, path):
+    ''' save the statistics of a replay as JSON '''
+
+    with open(path, 'w') as fh:
+        json.dump(results.to_dict(), fh, indent=2)
@@ -32,7 +32,9 @@
 #
 # =================================================================
 
+import hashlib
 import inspect
+import json
 import logging
 import os
 
@@ -42,20 +44,48 @@ try:
 except:
     from shapely.geos import ReadingError
 
-from sqlalchemy import create_engine, func, __version__, select
+from sqlalchemy import and_, bindparam, create_engine, func, __version__, \
+    MetaData, select, Table
 from sqlalchemy.sql import text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import create_session
 
-from pycsw.core import util
+from pycsw.core import recordcache, tracing, util
 from pycsw.core.etree import etree
 from pycsw.core.etree import PARSER
 
 LOGGER = logging.getLogger(__name__)
 
+# maximum number of bound values in a single IN (...) clause
+# (SQLite < 3.32 limits a statement to 999 host parameters)
+MAX_IN_VALUES = 500
+
+# core properties kept in the facets table, and whether they hold
+# comma-separated lists of values
+FACETS = {
+    'pycsw:Keywords': True,
+    'pycsw:Format': False,
+    'pycsw:Type': False,
+    'pycsw:TopicCategory': False,
+    'pycsw:OrganizationName': False,
+}
+
+# typed shadow columns of core properties, and how to convert values to them
+SHADOWS = {
+    'pycsw:InsertDate': ('epoch', util.get_time_epoch),
+    'pycsw:TempExtent_begin': ('epoch', util.get_time_epoch),
+    'pycsw:TempExtent_end': ('epoch', util.get_time_epoch),
+    'pycsw:Date': ('epoch', util.get_time_epoch),
+    'pycsw:Modified': ('epoch', util.get_time_epoch),
+    'pycsw:Denominator': ('number', util.get_number),
+    'pycsw:DistanceValue': ('number', util.get_number),
+}
+
 
 class Repository(object):
     _engines = {}
+    # facets tables, or None, memoized by database url and records table
+    _facet_tables = {}
 
     @classmethod
     def create_engine(clazz, url):
@@ -94,6 +124,10 @@ class Repository(object):
         self.filter = repo_filter
         self.fts = False
 
+        # file to append the shape of GetRecords queries to, for the
+        # index advisor (pycsw-admin.py -c advise_db_indexes)
+        self.query_log = None
+
         # Don't use relative paths, this is hack to get around
         # most wsgi restriction...
         if (app_root and database.startswith('sqlite:///') and
@@ -102,6 +136,7 @@ class Repository(object):
                        'sqlite:///%s%s' % (app_root, os.sep))
 
         self.engine = Repository.create_engine('%s' % database)
+        tracing.attach(self.engine)
 
         base = declarative_base(bind=self.engine)
 
@@ -125,6 +160,41 @@ class Repository(object):
 
         self.dbtype = self.engine.name
 
+        # facets table, if the database was set up with one, looked up
+        # once per process
+        self.facet_columns = {}
+        self.facets = {}
+
+        key = (database, table)
+        if key not in Repository._facet_tables:
+            facet_table = None
+            if self.engine.has_table('%s_facets' % table_name,
+                                     schema=schema_name or None):
+                LOGGER.debug('Facets table detected')
+                facet_table = Table('%s_facets' % table_name, MetaData(),
+                                    autoload=True, autoload_with=self.engine,
+                                    schema=schema_name or None)
+            Repository._facet_tables[key] = facet_table
+        self.facet_table = Repository._facet_tables[key]
+
+        if self.facet_table is not None:
+            identifier = self.context.md_core_model['mappings']['pycsw:Identifier']
+            for name, split in FACETS.items():
+                column = self.context.md_core_model['mappings'][name]
+                self.facet_columns[column] = split
+                self.facets[column] = (
+                    "%s in (select record_id from %s_facets "
+                    "where facet = '%s' and value = %%s)" %
+                    (identifier, table, column))
+
+        # shadow columns, if the database was set up with them
+        self.shadows = {}
+
+        for name, (suffix, convert) in SHADOWS.items():
+            column = self.context.md_core_model['mappings'][name]
+            if '%s_%s' % (column, suffix) in self.dataset.__table__.c:
+                self.shadows[column] = ('%s_%s' % (column, suffix), convert)
+
         self.session = create_session(self.engine)
 
         temp_dbtype = None
@@ -167,6 +237,25 @@ class Repository(object):
             self.fts = bool(result)
             LOGGER.debug('PostgreSQL FTS enabled: %r', self.fts)
 
+        if self.dbtype == 'mysql':
+            # check if a native MySQL geometry column exists
+            try:
+                result = self.session.execute(
+                    "select column_name "
+                    "from information_schema.columns "
+                    "where table_schema = database() "
+                    "and table_name = '%s' "
+                    "and data_type = 'geometry' "
+                    "limit 1;" % table_name
+                )
+                row = result.fetchone()
+                if row is not None:
+                    self.postgis_geometry_column = str(row[0])
+                    temp_dbtype = 'mysql+native'
+                    LOGGER.debug('MySQL+Native detected')
+            except Exception as err:
+                LOGGER.exception('MySQL+Native detection failed')
+
         if temp_dbtype is not None:
             LOGGER.debug('%s support detected', temp_dbtype)
             self.dbtype = temp_dbtype
@@ -212,10 +301,52 @@ class Repository(object):
         query = self.session.query(self.dataset).filter(column.in_(ids))
         return self._get_repo_filter(query).all()
 
+    def query_id_sources(self, ids):
+        ''' Query the source of each existing record in a list of identifiers '''
+
+        identifier = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:Identifier'])
+        source = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:Source'])
+
+        ids = list(set(ids))
+        sources = {}
+        for i in range(0, len(ids), MAX_IN_VALUES):
+            query = self.session.query(identifier, source).filter(
+                identifier.in_(ids[i:i+MAX_IN_VALUES]))
+            sources.update(self._get_repo_filter(query).all())
+        return sources
+
+    def query_versions(self, ids):
+        ''' Query the version of each existing record in a list of
+        identifiers: its insert date, and a digest of its XML, which tells
+        apart changes made within the same second '''
+
+        identifier = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:Identifier'])
+        insert_date = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:InsertDate'])
+        xml = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:XML'])
+
+        query = self.session.query(identifier, insert_date, xml).filter(
+            identifier.in_(ids))
+
+        versions = {}
+        for identifier_, insert_date_, xml_ in self._get_repo_filter(query):
+            if not isinstance(xml_, bytes):
+                xml_ = (xml_ or '').encode('utf-8')
+            versions[identifier_] = (insert_date_,
+                                     hashlib.sha1(xml_).hexdigest())
+        return versions
+
     def query_domain(self, domain, typenames, domainquerytype='list',
         count=False):
         ''' Query by property domain values '''
 
+        if domain in self.facet_columns and domainquerytype != 'range':
+            return self._query_facet_domain(domain, count)
+
         domain_value = getattr(self.dataset, domain)
 
         if domainquerytype == 'range':
@@ -231,6 +362,31 @@ class Repository(object):
                 query = self.session.query(domain_value).distinct()
         return self._get_repo_filter(query).all()
 
+    def _query_facet_domain(self, domain, count=False):
+        ''' Query facet values of a property, one per keyword '''
+
+        table = self.facet_table
+        value = table.c.value
+
+        if count:
+            LOGGER.info('Generating facet value frequency counts')
+            query = self.session.query(value, func.count(table.c.record_id))
+        else:
+            query = self.session.query(value)
+        query = query.select_from(table).filter(table.c.facet == domain)
+
+        if self.filter is not None:
+            identifier = getattr(self.dataset,
+                self.context.md_core_model['mappings']['pycsw:Identifier'])
+            query = query.join(self.dataset,
+                identifier == table.c.record_id).filter(text(self.filter))
+
+        if count:
+            query = query.group_by(value)
+        else:
+            query = query.distinct()
+        return query.order_by(value).all()
+
     def query_insert(self, direction='max'):
         ''' Query to get latest (default) or earliest update to repository '''
         column = getattr(self.dataset, \
@@ -253,6 +409,9 @@ class Repository(object):
         maxrecords=10, startposition=0):
         ''' Query records from underlying repository '''
 
+        if self.query_log is not None:
+            self._log_query(constraint, sortby)
+
         # run the raw query and get total
         if 'where' in constraint:  # GetRecords with constraint
             LOGGER.debug('constraint detected')
@@ -262,7 +421,8 @@ class Repository(object):
             LOGGER.debug('No constraint detected')
             query = self.session.query(self.dataset)
 
-        total = self._get_repo_filter(query).count()
+        with tracing.span('count'):
+            total = self._get_repo_filter(query).count()
 
         if util.ranking_pass:  #apply spatial ranking
             #TODO: Check here for dbtype so to extract wkt from postgis native to wkt
@@ -291,20 +451,68 @@ class Repository(object):
                     query = query.order_by(sortby_column)
 
         # always apply limit and offset
-        return [str(total), self._get_repo_filter(query).limit(
-        maxrecords).offset(startposition).all()]
+        with tracing.span('query'):
+            return [str(total), self._get_repo_filter(query).limit(
+            maxrecords).offset(startposition).all()]
 
     def insert(self, record, source, insert_date):
         ''' Insert a record into the repository '''
 
         try:
             self.session.begin()
+            self._set_shadows(record)
             self.session.add(record)
+            self._update_facets([record.__dict__])
             self.session.commit()
         except Exception as err:
             self.session.rollback()
             raise
 
+        recordcache.CACHE.invalidate([getattr(record,
+            self.context.md_core_model['mappings']['pycsw:Identifier'])])
+
+    def upsert(self, inserts=None, updates=None):
+        ''' Insert new and update existing records in a single transaction '''
+
+        identifier = self.context.md_core_model['mappings']['pycsw:Identifier']
+        table = self.dataset.__table__
+
+        # executemany needs the same columns on every row, so group
+        # updates by the set of properties each record carries
+        for record in (inserts or []) + (updates or []):
+            self._set_shadows(record)
+
+        update_groups = {}
+        for record in updates or []:
+            values = dict((key, value) for key, value in record.__dict__.items()
+                          if key != '_sa_instance_state')
+            values['_identifier'] = values[identifier]
+            update_groups.setdefault(frozenset(values), []).append(values)
+
+        try:
+            self.session.begin()
+            if inserts:
+                self.session.add_all(inserts)
+                self.session.flush()
+            for values in update_groups.values():
+                statement = table.update().where(
+                    table.c[identifier] == bindparam('_identifier'))
+                if self.filter is not None:
+                    statement = statement.where(text(self.filter))
+                self.session.execute(statement, values)
+            self._update_facets([record.__dict__ for record in
+                                 (inserts or []) + (updates or [])])
+            self.session.commit()
+        except Exception as err:
+            self.session.rollback()
+            msg = 'Cannot commit to repository'
+            LOGGER.exception(msg)
+            raise RuntimeError(msg)
+
+        recordcache.CACHE.invalidate(
+            [getattr(record, identifier) for record in inserts or []] +
+            [record.__dict__[identifier] for record in updates or []])
+
     def update(self, record=None, recprops=None, constraint=None):
         ''' Update a record in the repository based on identifier '''
 
@@ -318,6 +526,7 @@ class Repository(object):
 
         if recprops is None and constraint is None:  # full update
             LOGGER.debug('full update')
+            self._set_shadows(record)
             update_dict = dict([(getattr(self.dataset, key),
             getattr(record, key)) \
             for key in record.__dict__.keys() if key != '_sa_instance_state'])
@@ -326,80 +535,298 @@ class Repository(object):
                 self.session.begin()
                 self._get_repo_filter(self.session.query(self.dataset)).filter_by(
                 identifier=identifier).update(update_dict, synchronize_session='fetch')
+                self._update_facets([record.__dict__])
                 self.session.commit()
             except Exception as err:
                 self.session.rollback()
                 msg = 'Cannot commit to repository'
                 LOGGER.exception(msg)
                 raise RuntimeError(msg)
+            recordcache.CACHE.invalidate([identifier])
         else:  # update based on record properties
             LOGGER.debug('property based update')
             try:
-                rows = rows2 = 0
                 self.session.begin()
                 for rpu in recprops:
-                    # update queryable column and XML document via XPath
                     if 'xpath' not in rpu['rp']:
-                        self.session.rollback()
                         raise RuntimeError('XPath not found for property %s' % rpu['rp']['name'])
                     if 'dbcol' not in rpu['rp']:
-                        self.session.rollback()
                         raise RuntimeError('property not found for XPath %s' % rpu['rp']['name'])
-                    rows += self._get_repo_filter(self.session.query(self.dataset)).filter(
-                        text(constraint['where'])).params(self._create_values(constraint['values'])).update({
-                            getattr(self.dataset,
-                            rpu['rp']['dbcol']): rpu['value'],
-                            'xml': func.update_xpath(str(self.context.namespaces),
-                                   getattr(self.dataset,
-                                   self.context.md_core_model['mappings']['pycsw:XML']),
-                                   str(rpu)),
-                        }, synchronize_session='fetch')
-                    # then update anytext tokens
-                    rows2 += self._get_repo_filter(self.session.query(self.dataset)).filter(
-                        text(constraint['where'])).params(self._create_values(constraint['values'])).update({
-                            'anytext': func.get_anytext(getattr(
-                            self.dataset, self.context.md_core_model['mappings']['pycsw:XML']))
-                        }, synchronize_session='fetch')
+                ids = self._update_recprops(recprops, constraint)
                 self.session.commit()
-                return rows
             except Exception as err:
                 self.session.rollback()
                 msg = 'Cannot commit to repository'
                 LOGGER.exception(msg)
                 raise RuntimeError(msg)
-
-    def delete(self, constraint):
-        ''' Delete a record from the repository '''
+            recordcache.CACHE.invalidate(ids)
+            return len(ids)
+
+    def _update_recprops(self, recprops, constraint):
+        ''' Apply record properties to all records matching a constraint,
+        returning the identifiers of the records '''
+
+        mappings = self.context.md_core_model['mappings']
+        table = self.dataset.__table__
+        identifier = getattr(self.dataset, mappings['pycsw:Identifier'])
+        xml = getattr(self.dataset, mappings['pycsw:XML'])
+
+        # compile XPaths once for all records, and bind queryable values
+        xpaths = [(etree.XPath(rpu['rp']['xpath'], namespaces=self.context.namespaces),
+                   rpu['value']) for rpu in recprops]
+        columns = dict((rpu['rp']['dbcol'], rpu['value']) for rpu in recprops)
+        # a new version of the records, as after a full update
+        columns[mappings['pycsw:InsertDate']] = util.get_today_and_now()
+        columns.update(self._get_shadows(columns))
+
+        ids = [row[0] for row in self._get_repo_filter(
+            self.session.query(identifier)).filter(text(constraint['where'])).params(
+            self._create_values(constraint['values']))]
+
+        statement = table.update().where(
+            table.c[mappings['pycsw:Identifier']] == bindparam('_identifier'))
+        if self.filter is not None:
+            statement = statement.where(text(self.filter))
+
+        for i in range(0, len(ids), MAX_IN_VALUES):
+            values = []
+            for row_identifier, row_xml in self._get_repo_filter(
+                self.session.query(identifier, xml)).filter(
+                    identifier.in_(ids[i:i+MAX_IN_VALUES])):
+                # parse each document once and apply all properties
+                if isinstance(row_xml, bytes) or isinstance(row_xml, str):
+                    row_xml = etree.fromstring(row_xml, PARSER)
+                for xpath, value in xpaths:
+                    for node in xpath(row_xml):
+                        if node.text != value:  # values differ, update
+                            node.text = value
+
+                row_values = dict(columns)
+                row_values.update({
+                    '_identifier': row_identifier,
+                    mappings['pycsw:XML']: etree.tostring(row_xml),
+                    mappings['pycsw:AnyText']: util.get_anytext(row_xml)
+                })
+                values.append(row_values)
+
+            if values:
+                self.session.execute(statement, values)
+                self._update_facets([
+                    dict(columns, **{mappings['pycsw:Identifier']: row['_identifier']})
+                    for row in values])
+
+        return ids
+
+    def delete(self, constraint, chunksize=None):
+        ''' Delete records matching a constraint, and all their descendants,
+        in one transaction, or, with chunksize, in transactions of at most
+        chunksize records each '''
+
+        if chunksize is not None:
+            return self._delete_chunks(constraint, chunksize)
+
+        table = self.dataset.__table__
+        identifier = table.c[self.context.md_core_model['mappings']['pycsw:Identifier']]
+        values = self._create_values(constraint['values'])
 
         try:
             self.session.begin()
-            rows = self._get_repo_filter(self.session.query(self.dataset)).filter(
-            text(constraint['where'])).params(self._create_values(constraint['values']))
+            tree = self._get_tree(constraint)
+            ids = None
+            if tree is None:  # no recursive CTEs
+                ids = members = self._query_tree_ids(constraint)
+            else:
+                members = select([tree.c.tree_identifier])
+                if recordcache.CACHE.enabled:  # to drop their rendered XML
+                    ids = [row[0] for row in self.session.execute(
+                        members, values)]
 
-            parentids = []
-            for row in rows:  # get ids
-                parentids.append(getattr(row,
-                self.context.md_core_model['mappings']['pycsw:Identifier']))
+            if ids is not None:
+                rows = len(ids)
+            else:
+                rows = self.session.execute(select([func.count()]).select_from(
+                    tree), values).scalar()
+            LOGGER.debug('Deleting %d records and descendants', rows)
+
+            if self.facet_table is not None:
+                self.session.execute(self.facet_table.delete().where(
+                    self.facet_table.c.record_id.in_(members)), values)
+            statement = table.delete().where(identifier.in_(members))
+            if self.filter is not None:
+                statement = statement.where(text(self.filter))
+            self.session.execute(statement, values)
+            self.session.commit()
+        except Exception as err:
+            self.session.rollback()
+            msg = 'Cannot commit to repository'
+            LOGGER.exception(msg)
+            raise RuntimeError(msg)
+
+        if ids:
+            recordcache.CACHE.invalidate(ids)
+        return rows
 
-            rows=rows.delete(synchronize_session='fetch')
+    def _delete_chunks(self, constraint, chunksize):
+        ''' Delete records matching a constraint, and all their descendants,
+        in transactions of at most chunksize records, so that locks on
+        large collections are not held for the whole delete '''
 
-            if rows > 0:
-                LOGGER.debug('Deleting all child records')
-                # delete any child records which had this record as a parent
-                rows += self._get_repo_filter(self.session.query(self.dataset)).filter(
-                    getattr(self.dataset,
-                    self.context.md_core_model['mappings']['pycsw:ParentIdentifier']).in_(parentids)).delete(
-                    synchronize_session='fetch')
+        table = self.dataset.__table__
+        identifier = table.c[self.context.md_core_model['mappings']['pycsw:Identifier']]
 
-            self.session.commit()
+        try:
+            ids = self._query_tree_ids(constraint)
         except Exception as err:
-            self.session.rollback()
             msg = 'Cannot commit to repository'
             LOGGER.exception(msg)
             raise RuntimeError(msg)
 
+        LOGGER.debug('Deleting %d records and descendants', len(ids))
+
+        rows = 0
+        for i in range(0, len(ids), chunksize):
+            chunk = ids[i:i+chunksize]
+            statement = table.delete().where(identifier.in_(chunk))
+            if self.filter is not None:
+                statement = statement.where(text(self.filter))
+            try:
+                self.session.begin()
+                count = self.session.execute(statement).rowcount
+                if self.facet_table is not None:
+                    self.session.execute(self.facet_table.delete().where(
+                        self.facet_table.c.record_id.in_(chunk)))
+                self.session.commit()
+            except Exception as err:
+                self.session.rollback()
+                msg = ('Cannot commit to repository: %d of %d records '
+                       'deleted' % (rows, len(ids)))
+                LOGGER.exception(msg)
+                raise RuntimeError(msg)
+            rows += count
+            recordcache.CACHE.invalidate(chunk)
+
         return rows
 
+    def _get_tree(self, constraint):
+        ''' Return a recursive CTE of the identifiers of records matching a
+        constraint and of their children, grandchildren, etc. via
+        parentidentifier, or None if the database has no recursive CTEs '''
+
+        if (self.dbtype.startswith('mysql') and
+            (self.engine.dialect.server_version_info or (0,)) < (8, 0)):
+            return None
+
+        table = self.dataset.__table__
+        identifier = table.c[self.context.md_core_model['mappings']['pycsw:Identifier']]
+        parentidentifier = table.c[
+            self.context.md_core_model['mappings']['pycsw:ParentIdentifier']]
+
+        matches = select([identifier.label('tree_identifier')]).where(
+            text(constraint['where']))
+        if self.filter is not None:
+            matches = matches.where(text(self.filter))
+
+        # UNION (not UNION ALL) also stops on cyclic parent references
+        tree = matches.cte('tree', recursive=True)
+        children = select([identifier]).where(
+            parentidentifier == tree.c.tree_identifier)
+        if self.filter is not None:
+            children = children.where(text(self.filter))
+        return tree.union(children)
+
+    def _query_tree_ids(self, constraint):
+        ''' Query identifiers of records matching a constraint and of their
+        children, grandchildren, etc. via parentidentifier '''
+
+        values = self._create_values(constraint['values'])
+        tree = self._get_tree(constraint)
+        if tree is not None:
+            return [row[0] for row in self.session.execute(
+                select([tree.c.tree_identifier]), values)]
+
+        # no recursive CTEs: resolve one generation at a time
+        table = self.dataset.__table__
+        identifier = table.c[self.context.md_core_model['mappings']['pycsw:Identifier']]
+        parentidentifier = table.c[
+            self.context.md_core_model['mappings']['pycsw:ParentIdentifier']]
+
+        matches = select([identifier]).where(text(constraint['where']))
+        if self.filter is not None:
+            matches = matches.where(text(self.filter))
+        ids = [row[0] for row in self.session.execute(matches, values)]
+        seen = set(ids)
+        generation = ids
+        while generation:
+            children = []
+            for i in range(0, len(generation), MAX_IN_VALUES):
+                query = select([identifier]).where(
+                    parentidentifier.in_(generation[i:i+MAX_IN_VALUES]))
+                if self.filter is not None:
+                    query = query.where(text(self.filter))
+                for row in self.session.execute(query):
+                    if row[0] not in seen:
+                        seen.add(row[0])
+                        children.append(row[0])
+            ids.extend(children)
+            generation = children
+        return ids
+
+    def _get_shadows(self, columns):
+        ''' Return the shadow column values of a dict of column values '''
+
+        return dict((shadow, convert(columns[column]))
+                    for column, (shadow, convert) in self.shadows.items()
+                    if column in columns)
+
+    def _set_shadows(self, record):
+        ''' Set the shadow column values of a record '''
+
+        for key, value in self._get_shadows(record.__dict__).items():
+            setattr(record, key, value)
+
+    def _update_facets(self, rows):
+        ''' Replace the facet values of records, given as dicts of column
+        values; facets of columns missing from a dict are left as is '''
+
+        if self.facet_table is None:
+            return
+
+        identifier = self.context.md_core_model['mappings']['pycsw:Identifier']
+        table = self.facet_table
+
+        deletes = []
+        inserts = []
+        for row in rows:
+            for column, split in self.facet_columns.items():
+                if column not in row:
+                    continue
+                deletes.append({'_record_id': row[identifier], '_facet': column})
+                inserts.extend({'record_id': row[identifier], 'facet': column,
+                                'value': value}
+                               for value in get_facet_values(row[column], split))
+
+        if deletes:
+            self.session.execute(table.delete().where(and_(
+                table.c.record_id == bindparam('_record_id'),
+                table.c.facet == bindparam('_facet'))), deletes)
+        if inserts:
+            self.session.execute(table.insert(), inserts)
+
+    def _log_query(self, constraint, sortby):
+        ''' append the where clause and sort column of a query to the
+        query log, one JSON object per line; values are not logged '''
+
+        entry = {
+            'where': constraint.get('where'),
+            'sortby': sortby['propertyname'] if sortby is not None else None
+        }
+
+        try:
+            with open(self.query_log, 'a') as fileobj:
+                fileobj.write('%s\n' % json.dumps(entry))
+        except (IOError, OSError):
+            LOGGER.exception('Could not write to query log %s', self.query_log)
+
     def _get_repo_filter(self, query):
         ''' Apply repository wide side filter / mask query '''
         if self.filter is not None:
@@ -427,6 +854,15 @@ def create_custom_sql_functions(connection):
         )
 
 
+def get_facet_values(value, split=False):
+    ''' return the distinct facet values of a column value '''
+
+    if value is None:
+        return []
+    values = value.split(',') if split else [value]
+    return sorted(set(val.strip() for val in values if val.strip()))
+
+
 def query_spatial(bbox_data_wkt, bbox_input_wkt, predicate, distance):
     """Perform spatial query
 
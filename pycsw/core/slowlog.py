@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import json
+import logging
+import logging.handlers
+import random
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from pycsw.core import tracing
+
+LOGGER = logging.getLogger(__name__)
+
+# rotation of the log file
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# longest bound value logged as is
+MAX_VALUE_LENGTH = 200
+
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN (ANALYZE, BUFFERS) ',
+    'mysql': 'EXPLAIN '
+}
+
+
+class SlowQueryLog(object):
+    ''' log of the repository statements slower than a threshold, as JSON
+    lines in a rotating file, with the query plan of a sample of them '''
+
+    def __init__(self):
+        ''' initialize log '''
+
+        self.path = None
+        self.threshold = 1.0  # seconds
+        self.explain_rate = 0.1
+        self.logger = logging.getLogger('pycsw.slowquery')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self._lock = threading.Lock()
+
+    def configure(self, path, threshold=None, explain_rate=None):
+        ''' log to path, rotating it when it grows too large '''
+
+        with self._lock:
+            if path != self.path:
+                for handler in list(self.logger.handlers):
+                    self.logger.removeHandler(handler)
+                    handler.close()
+                handler = logging.handlers.RotatingFileHandler(
+                    path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self.logger.addHandler(handler)
+                self.path = path
+            if threshold is not None:
+                self.threshold = threshold
+            if explain_rate is not None:
+                self.explain_rate = explain_rate
+
+    def attach(self, engine):
+        ''' time the statements executed by engine '''
+
+        if not event.contains(engine, 'before_cursor_execute', self._before):
+            event.listen(engine, 'before_cursor_execute', self._before)
+            event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context,
+                executemany):
+        ''' note when a statement starts '''
+
+        if context is not None:
+            context._pycsw_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context,
+               executemany):
+        ''' log a statement if it was slow '''
+
+        start = getattr(context, '_pycsw_start', None)
+        if self.path is None or start is None:
+            return
+        duration = time.perf_counter() - start
+        if duration < self.threshold:
+            return
+
+        trace = tracing.get_trace()
+        entry = {
+            'time': datetime.utcnow().isoformat() + 'Z',
+            'request_id': trace.trace_id if trace is not None else None,
+            'duration_ms': round(duration * 1000, 3),
+            'statement': statement,
+            'parameters': _get_values(parameters),
+            'rows': cursor.rowcount if cursor.rowcount >= 0 else None,
+            'plan': None
+        }
+
+        if (not executemany and random.random() < self.explain_rate and
+                statement.lstrip()[:6].lower() == 'select'):
+            entry['plan'] = self._explain(conn, statement, parameters)
+
+        self.logger.info(json.dumps(entry, default=str))
+
+    def _explain(self, conn, statement, parameters):
+        ''' return the query plan of a select statement '''
+
+        prefix = EXPLAIN.get(conn.dialect.name)
+        if prefix is None:
+            return None
+
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [list(row) for row in cursor.fetchall()]
+        except Exception as err:
+            LOGGER.warning('Could not explain slow query: %s', err)
+            return None
+        finally:
+            cursor.close()
+
+
+def _get_values(parameters):
+    ''' return bound values, with long values shortened '''
+
+    def shorten(value):
+        if isinstance(value, (str, bytes)) and len(value) > MAX_VALUE_LENGTH:
+            return '%s... (%d)' % (value[:MAX_VALUE_LENGTH], len(value))
+        return value
+
+    if isinstance(parameters, dict):
+        return dict((key, shorten(value)) for key, value in parameters.items())
+    if isinstance(parameters, (list, tuple)):
+        return [_get_values(value) if isinstance(value, (list, tuple, dict))
+                else shorten(value) for value in parameters]
+    return parameters
+
+
+# process-wide log
+LOG = SlowQueryLog()
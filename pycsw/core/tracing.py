@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# =================================================================
+#
+# Authors: Tom Kralidis <tomkralidis@gmail.com>
+#
+# Copyright (c) 2015 Tom Kralidis
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+LOGGER = logging.getLogger(__name__)
+
+# trace of the request handled by the current thread
+_LOCAL = threading.local()
+
+# spans kept per trace for export; timings are aggregated beyond this
+MAX_SPANS = 1000
+
+# process-wide exporters, by collector endpoint
+_EXPORTERS = {}
+_EXPORTERS_LOCK = threading.Lock()
+
+
+class Span(object):
+    ''' timed phase of a request '''
+
+    def __init__(self, name, parent=None):
+        ''' initialize span '''
+
+        self.name = name
+        self.parent = parent
+        self.span_id = os.urandom(8).hex()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.queries = 0
+
+
+class Trace(object):
+    ''' spans of a request, with the number of database round trips
+    made during each of them '''
+
+    def __init__(self):
+        ''' initialize trace '''
+
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span('request')
+        self.start_time = time.time()
+        self.attributes = {}
+        self.spans = []
+        self.totals = {}  # name: [duration, queries]
+        self._open = [self.root]
+
+    def start(self, name):
+        ''' open a span, nested in the innermost open span '''
+
+        span = Span(name, self._open[-1])
+        self._open.append(span)
+        return span
+
+    def stop(self, name):
+        ''' close the innermost open span called name, and the spans
+        opened after it '''
+
+        for num in range(len(self._open) - 1, 0, -1):
+            if self._open[num].name == name:
+                for span in reversed(self._open[num:]):
+                    self._close(span)
+                del self._open[num:]
+                return
+
+    def count_query(self):
+        ''' count a database round trip in the open spans '''
+
+        for span in self._open:
+            span.queries += 1
+
+    def finish(self):
+        ''' close the open spans '''
+
+        for span in reversed(self._open):
+            if span.duration is None:
+                self._close(span)
+        self._open = [self.root]
+
+    def get_header(self):
+        ''' return the timings as a Server-Timing header value '''
+
+        metrics = []
+        for name, (duration, queries) in self.totals.items():
+            metric = '%s;dur=%.3f' % (name, duration * 1000)
+            if queries:
+                metric += ';desc="%d queries"' % queries
+            metrics.append(metric)
+        metrics.append('total;dur=%.3f;desc="%d queries"' %
+                       (self.root.duration * 1000, self.root.queries))
+        return ', '.join(metrics)
+
+    def to_dict(self):
+        ''' return the timings as a dict, for logging '''
+
+        return {
+            'trace_id': self.trace_id,
+            'attributes': self.attributes,
+            'duration_ms': round(self.root.duration * 1000, 3),
+            'queries': self.root.queries,
+            'spans': dict((name, {'duration_ms': round(duration * 1000, 3),
+                                  'queries': queries})
+                          for name, (duration, queries) in self.totals.items())
+        }
+
+    def _close(self, span):
+        ''' record the duration of a span '''
+
+        span.duration = time.perf_counter() - span.start
+        if span is self.root:
+            return
+        parent = span.parent
+        while parent is not None and parent.name != span.name:
+            parent = parent.parent
+        if parent is None:  # not nested in a span of the same name
+            totals = self.totals.setdefault(span.name, [0, 0])
+            totals[0] += span.duration
+            totals[1] += span.queries
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(span)
+
+
+class OtlpExporter(object):
+    ''' send traces to an OpenTelemetry collector, as OTLP/HTTP JSON, from
+    a background thread '''
+
+    def __init__(self, endpoint, service_name='pycsw', batch_size=64,
+                 interval=5, maxsize=1024):
+        ''' initialize exporter '''
+
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=maxsize)
+
+        thread = threading.Thread(target=self._run, name='pycsw-otlp')
+        thread.daemon = True
+        thread.start()
+
+    def export(self, trace):
+        ''' queue a finished trace; traces are dropped when the collector
+        cannot keep up '''
+
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            LOGGER.debug('OTLP export queue full; dropping trace')
+
+    def _run(self):
+        ''' send queued traces in batches '''
+
+        batch = []
+        deadline = time.time() + self.interval
+        while True:
+            try:
+                batch.append(self.queue.get(
+                    timeout=max(0, deadline - time.time())))
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.time() >= deadline:
+                if batch:
+                    self._send(batch)
+                batch = []
+                deadline = time.time() + self.interval
+
+    def _send(self, traces):
+        ''' post traces to the collector '''
+
+        from pycsw.core import httpclient
+
+        try:
+            httpclient.CLIENT.request(
+                'POST', self.endpoint, data=json.dumps(get_otlp(
+                    traces, self.service_name)),
+                headers={'Content-Type': 'application/json'})
+        except Exception as err:
+            LOGGER.warning('Could not export traces to %s: %s',
+                           self.endpoint, err)
+
+
+def get_otlp(traces, service_name='pycsw'):
+    ''' return traces as an OTLP ExportTraceServiceRequest '''
+
+    spans = []
+    for trace in traces:
+        for span in [trace.root] + trace.spans:
+            start = int((trace.start_time + span.start - trace.root.start) *
+                        1e9)
+            attributes = [{'key': 'db.round_trips',
+                           'value': {'intValue': str(span.queries)}}]
+            if span is trace.root:
+                attributes.extend(
+                    {'key': 'pycsw.%s' % key, 'value': {'stringValue': str(value)}}
+                    for key, value in trace.attributes.items())
+            spans.append({
+                'traceId': trace.trace_id,
+                'spanId': span.span_id,
+                'parentSpanId': span.parent.span_id if span.parent else '',
+                'name': span.name,
+                'kind': 2 if span is trace.root else 1,  # server, internal
+                'startTimeUnixNano': str(start),
+                'endTimeUnixNano': str(start + int(span.duration * 1e9)),
+                'attributes': attributes
+            })
+
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{
+                'key': 'service.name',
+                'value': {'stringValue': service_name}
+            }]},
+            'scopeSpans': [{'scope': {'name': 'pycsw'}, 'spans': spans}]
+        }]
+    }
+
+
+def log(trace):
+    ''' log a finished trace as a JSON object '''
+
+    LOGGER.info('%s', json.dumps(trace.to_dict()))
+
+
+def get_exporter(endpoint):
+    ''' return the exporter to a collector endpoint '''
+
+    with _EXPORTERS_LOCK:
+        if endpoint not in _EXPORTERS:
+            LOGGER.info('Exporting traces to %s', endpoint)
+            _EXPORTERS[endpoint] = OtlpExporter(endpoint)
+        return _EXPORTERS[endpoint]
+
+
+def activate(trace):
+    ''' make trace the trace of the current thread '''
+
+    _LOCAL.trace = trace
+
+
+def deactivate(trace):
+    ''' detach trace from the current thread '''
+
+    if getattr(_LOCAL, 'trace', None) is trace:
+        _LOCAL.trace = None
+
+
+def get_trace():
+    ''' return the trace of the current thread, if any '''
+
+    return getattr(_LOCAL, 'trace', None)
+
+
+@contextmanager
+def activated(trace):
+    ''' make trace, if any, the trace of the current thread within a
+    block, and restore the previous one after it '''
+
+    previous = get_trace()
+    if trace is None or trace is previous:
+        yield
+        return
+    activate(trace)
+    try:
+        yield
+    finally:
+        _LOCAL.trace = previous
+
+
+def start(name):
+    ''' open a span in the trace of the current thread '''
+
+    trace = get_trace()
+    if trace is not None:
+        trace.start(name)
+
+
+def stop(name):
+    ''' close a span in the trace of the current thread '''
+
+    trace = get_trace()
+    if trace is not None:
+        trace.stop(name)
+
+
+@contextmanager
+def span(name):
+    ''' time a block in the trace of the current thread '''
+
+    trace = get_trace()
+    if trace is None:
+        yield
+        return
+    trace.start(name)
+    try:
+        yield
+    finally:
+        trace.stop(name)
+
+
+def traced(name):
+    ''' decorator timing each call of a function as a span '''
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def attach(engine):
+    ''' count the database round trips made with engine '''
+
+    if not event.contains(engine, 'before_cursor_execute', _count_query):
+        event.listen(engine, 'before_cursor_execute', _count_query)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    ''' count database round trips in the trace of the current thread '''
+
+    trace = getattr(_LOCAL, 'trace', None)
+    if trace is not None:
+        trace.count_query()
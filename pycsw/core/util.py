@@ -38,12 +38,11 @@ import datetime
 import logging
 import time
 
-from urllib.request import Request, urlopen
 from urllib.parse import urlparse
 from shapely.wkt import loads
-from owslib.util import http_post
 
 from pycsw.core.etree import etree, PARSER
+from pycsw.core.httpclient import CLIENT
 
 LOGGER = logging.getLogger(__name__)
 
@@ -58,6 +57,12 @@ _filename_ascii_strip_re = re.compile(r'[^A-Za-z0-9_.-]')
 _windows_device_files = ('CON', 'AUX', 'COM1', 'COM2', 'COM3', 'COM4', 'LPT1',
                          'LPT2', 'LPT3', 'PRN', 'NUL')
 
+_TIME_ISO8601 = re.compile(
+    r'^(?P<year>\d{4})(?:-(?P<month>\d{2})(?:-(?P<day>\d{2})'
+    r'(?:[T ](?P<hour>\d{2}):(?P<minute>\d{2})(?::(?P<second>\d{2})(?:\.\d+)?)?'
+    r'(?:Z|(?P<tzsign>[+-])(?P<tzhour>\d{2}):?(?P<tzminute>\d{2})?)?)?)?)?$')
+_EPOCH = datetime.datetime(1970, 1, 1)
+
 
 def get_today_and_now():
     """Get the date, right now, in ISO8601"""
@@ -95,6 +100,73 @@ def get_time_iso2unix(isotime):
         isotime, '%Y-%m-%dT%H:%M:%SZ'))) - time.timezone
 
 
+def get_time_epoch(value):
+    """Convert an ISO8601 date or datetime to a UNIX timestamp
+
+    Parameters
+    ----------
+    value: str
+        The temporal value, as year, year-month, date or datetime, with an
+        optional time zone (UTC is assumed otherwise)
+
+    Returns
+    -------
+    int
+        Seconds since 1970-01-01T00:00:00Z, or None if the value cannot be
+        parsed
+
+    """
+
+    if not value:
+        return None
+    match = _TIME_ISO8601.match(value.strip())
+    if match is None:
+        return None
+    parts = match.groupdict()
+    try:
+        result = datetime.datetime(
+            int(parts['year']), int(parts['month'] or 1),
+            int(parts['day'] or 1), int(parts['hour'] or 0),
+            int(parts['minute'] or 0), int(parts['second'] or 0))
+    except ValueError:
+        return None
+    if parts['tzhour'] is not None:
+        offset = datetime.timedelta(hours=int(parts['tzhour']),
+                                    minutes=int(parts['tzminute'] or 0))
+        result = result - offset if parts['tzsign'] == '+' else result + offset
+    return int((result - _EPOCH).total_seconds())
+
+
+def get_number(value):
+    """Convert a numeric text value to a float
+
+    Parameters
+    ----------
+    value: str
+        The value, a number or a representative fraction such as ``1:25000``
+
+    Returns
+    -------
+    float
+        The number (the denominator of a fraction), or None if the value
+        cannot be parsed
+
+    """
+
+    if not value:
+        return None
+    value = value.strip()
+    if value.startswith('1:'):
+        value = value[2:]
+    try:
+        result = float(value)
+    except ValueError:
+        return None
+    if result != result or result in (float('inf'), float('-inf')):
+        return None  # NaN and infinity cannot be stored
+    return result
+
+
 def get_version_integer(version):
     """Get an integer of the OGC version value x.y.z
 
@@ -128,6 +200,12 @@ def get_version_integer(version):
     return result
 
 
+# XPath expressions split into (prefix, element) steps, by expression.
+# Expressions may come from requests, so the cache is bounded
+_NSPATH_STEPS = {}
+_NSPATH_STEPS_MAX = 4096
+
+
 def nspath_eval(xpath, nsmap):
     """Return an etree friendly xpath.
 
@@ -151,17 +229,30 @@ def nspath_eval(xpath, nsmap):
 
     """
 
-    out = []
-    for node in xpath.split('/'):
-        chunks = node.split(":")
-        if len(chunks) == 2:
-            prefix, element = node.split(':')
-            out.append('{%s}%s' % (nsmap[prefix], element))
-        elif len(chunks) == 1:
-            out.append(node)
-        else:
-            raise RuntimeError("Invalid XPath expression: {0}".format(xpath))
-    return '/'.join(out)
+    try:
+        steps = _NSPATH_STEPS[xpath]
+    except KeyError:
+        steps = []
+        for node in xpath.split('/'):
+            chunks = node.split(":")
+            if len(chunks) == 2:
+                steps.append(tuple(chunks))
+            elif len(chunks) == 1:
+                steps.append((None, node))
+            else:
+                raise RuntimeError("Invalid XPath expression: {0}".format(xpath))
+        steps = tuple(steps)
+        if len(_NSPATH_STEPS) < _NSPATH_STEPS_MAX:
+            _NSPATH_STEPS[xpath] = steps
+
+    if len(steps) == 1:
+        prefix, element = steps[0]
+        if prefix is None:
+            return element
+        return '{%s}%s' % (nsmap[prefix], element)
+    return '/'.join(element if prefix is None else
+                    '{%s}%s' % (nsmap[prefix], element)
+                    for prefix, element in steps)
 
 
 def wktenvelope2bbox(envelope):
@@ -233,19 +324,27 @@ def transform_mappings(queryables, typename):
     queryables: dict
     typename: dict
 
+    Returns
+    -------
+    dict
+        A copy of ``queryables`` whose entries are mapped from
+        ``typename``. ``queryables`` itself is left untouched.
+
     """
 
-    for item in queryables:
-        try:
-            matching_typename = [key for key, value in typename.items() if
-                                 value == item][0]
-            queryable_value = queryables[matching_typename]
-            queryables[item] = {
+    sources = {}
+    for key, value in typename.items():
+        sources.setdefault(value, key)
+
+    transformed = dict(queryables)
+    for item in transformed:
+        if item in sources:
+            queryable_value = transformed[sources[item]]
+            transformed[item] = {
                 "xpath": queryable_value["xpath"],
                 "dbcol": queryable_value["dbcol"],
             }
-        except IndexError:
-            pass
+    return transformed
 
 
 def getqattr(obj, name):
@@ -253,6 +352,8 @@ def getqattr(obj, name):
     result = None
     try:
         item = getattr(obj, name)
+        if item is None or isinstance(item, str):  # plain column value
+            return item
         value = item()
         if "link" in name:  # create link format
             links = []
@@ -272,13 +373,12 @@ def getqattr(obj, name):
 
 
 def http_request(method, url, request=None, timeout=30):
-    """Perform HTTP request"""
+    """Perform HTTP request via the shared HTTP client"""
+    headers = None
     if method == 'POST':
-        return http_post(url, request, timeout=timeout)
-    else:  # GET
-        request = Request(url)
-        request.add_header('User-Agent', 'pycsw (https://pycsw.org/)')
-        return urlopen(request, timeout=timeout).read()
+        headers = {'Content-Type': 'text/xml'}
+    return CLIENT.request(method, url, data=request, headers=headers,
+                          timeout=timeout)
 
 
 def bind_url(url):
@@ -40,6 +40,7 @@ from pycsw import oaipmh, opensearch, sru
 from pycsw.plugins.profiles import profile as pprofile
 import pycsw.plugins.outputschemas
 from pycsw.core import config, log, metadata, util
+from pycsw.core.repository import MAX_IN_VALUES
 from pycsw.core.formats.fmt_json import xml2dict
 from pycsw.ogc.fes import fes2
 import logging
@@ -54,6 +55,7 @@ class Csw3(object):
 
         self.parent = server_csw
         self.version = '3.0.0'
+        self._record_plans = {}
 
     def getcapabilities(self):
         ''' Handle GetCapabilities request '''
@@ -471,6 +473,27 @@ class Csw3(object):
             util.nspath_eval('fes20:SpatialOperator', self.parent.context.namespaces),
             name=spatial_comparison)
 
+        temporalcaps = etree.SubElement(fltcaps,
+        util.nspath_eval('fes20:Temporal_Capabilities', self.parent.context.namespaces))
+
+        temporalopds = etree.SubElement(temporalcaps,
+        util.nspath_eval('fes20:TemporalOperands', self.parent.context.namespaces))
+
+        for temporal_operand in \
+        fes2.MODEL['TemporalOperands']['values']:
+            etree.SubElement(temporalopds,
+            util.nspath_eval('fes20:TemporalOperand', self.parent.context.namespaces),
+            name=temporal_operand)
+
+        temporalops = etree.SubElement(temporalcaps,
+        util.nspath_eval('fes20:TemporalOperators', self.parent.context.namespaces))
+
+        for temporal_comparison in \
+        fes2.MODEL['TemporalOperators']['values']:
+            etree.SubElement(temporalops,
+            util.nspath_eval('fes20:TemporalOperator', self.parent.context.namespaces),
+            name=temporal_comparison)
+
         functions = etree.SubElement(fltcaps,
         util.nspath_eval('fes20:Functions', self.parent.context.namespaces))
 
@@ -733,6 +756,13 @@ class Csw3(object):
                 if int(self.parent.kvp['maxrecords']) > maxrecords_cfg:
                     self.parent.kvp['maxrecords'] = maxrecords_cfg
 
+        budget = self.parent.max_response_records
+        if budget is not None and int(self.parent.kvp['maxrecords']) > budget:
+            LOGGER.debug('Limiting maxrecords to the budget of %d records',
+                         budget)
+            self.parent.budget_exceeded = 'records'
+            self.parent.kvp['maxrecords'] = budget
+
         if any(x in ['bbox', 'q', 'time'] for x in self.parent.kvp):
             LOGGER.debug('OpenSearch Geo/Time parameters detected.')
             self.parent.kvp['constraintlanguage'] = 'FILTER'
@@ -769,7 +799,8 @@ class Csw3(object):
                         cql = cql2fes1(tmp, self.parent.context.namespaces)
                         self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = fes1.parse(cql,
                         self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
+                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                        self.parent.repository.facets, self.parent.repository.shadows)
                         self.parent.kvp['constraint']['_dict'] = xml2dict(etree.tostring(cql), self.parent.context.namespaces)
                     except Exception as err:
                         LOGGER.exception('Invalid CQL query %s', tmp)
@@ -791,7 +822,8 @@ class Csw3(object):
                         fes2.parse(doc,
                         self.parent.repository.queryables['_all'],
                         self.parent.repository.dbtype,
-                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
+                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                        self.parent.repository.facets, self.parent.repository.shadows)
                         self.parent.kvp['constraint']['_dict'] = xml2dict(etree.tostring(doc), self.parent.context.namespaces)
                     except Exception as err:
                         errortext = \
@@ -924,48 +956,56 @@ class Csw3(object):
             LOGGER.info('Presenting records %s - %s',
             self.parent.kvp['startposition'], max1)
 
-            for res in results:
-                try:
-                    if (self.parent.kvp['outputschema'] ==
-                        'http://www.opengis.net/cat/csw/3.0' and
-                        ('csw:Record' in self.parent.kvp['typenames'] or
-                         'csw30:Record' in self.parent.kvp['typenames'])):
-                        # serialize csw:Record inline
-                        searchresults.append(self._write_record(
-                        res, self.parent.repository.queryables['_all']))
-                    elif (self.parent.kvp['outputschema'] ==
-                        'http://www.opengis.net/cat/csw/3.0' and
-                        'csw:Record' not in self.parent.kvp['typenames']):
-                        # serialize into csw:Record model
-
-                        for prof in self.parent.profiles['loaded']:
-                            # find source typename
-                            if self.parent.profiles['loaded'][prof].typename in \
-                            self.parent.kvp['typenames']:
-                                typename = self.parent.profiles['loaded'][prof].typename
-                                break
-
-                        util.transform_mappings(
-                            self.parent.repository.queryables['_all'],
-                            self.parent.context.model['typenames'][typename][
-                                'mappings']['csw:Record']
-                        )
+            source_typename = None
+            if (self.parent.kvp['outputschema'] == 'http://www.opengis.net/cat/csw/3.0' and
+                'csw:Record' not in self.parent.kvp['typenames']):
+                for prof in self.parent.profiles['loaded']:
+                    # find source typename
+                    if self.parent.profiles['loaded'][prof].typename in \
+                    self.parent.kvp['typenames']:
+                        source_typename = self.parent.profiles['loaded'][prof].typename
+                        break
 
-                        searchresults.append(self._write_record(
-                        res, self.parent.repository.queryables['_all']))
-                    elif self.parent.kvp['outputschema'] in self.parent.outputschemas:  # use outputschema serializer
-                        searchresults.append(self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(res, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url')))
+            if self.parent.kvp['outputschema'] != 'http://www.opengis.net/cat/csw/3.0':
+                try:
+                    if self.parent.kvp['outputschema'] in self.parent.outputschemas:  # use outputschema serializer
+                        writer = self.parent.outputschemas[self.parent.kvp['outputschema']].write_record
+                        args = (self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url'))
                     else:  # use profile serializer
-                        searchresults.append(
-                        self.parent.profiles['loaded'][self.parent.kvp['outputschema']].\
-                        write_record(res, self.parent.kvp['elementsetname'],
-                        self.parent.kvp['outputschema'],
-                        self.parent.repository.queryables['_all']))
+                        writer = self.parent.profiles['loaded'][self.parent.kvp['outputschema']].write_record
+                        args = (self.parent.kvp['elementsetname'],
+                                self.parent.kvp['outputschema'],
+                                self.parent.repository.queryables['_all'])
+                    searchresults.extend(self.parent.render_records(
+                        results, writer, args))
                 except Exception as err:
                     self.parent.response = self.exceptionreport(
                     'NoApplicableCode', 'service',
                     'Record serialization failed: %s' % str(err))
                     return self.parent.response
+            else:
+                for res in results:
+                    try:
+                        if (self.parent.kvp['outputschema'] ==
+                            'http://www.opengis.net/cat/csw/3.0' and
+                            ('csw:Record' in self.parent.kvp['typenames'] or
+                             'csw30:Record' in self.parent.kvp['typenames'])):
+                            # serialize csw:Record inline
+                            searchresults.append(self.parent.render_record(
+                            res, lambda: self._write_record(
+                            res, self._get_record_plan())))
+                        elif (self.parent.kvp['outputschema'] ==
+                            'http://www.opengis.net/cat/csw/3.0' and
+                            'csw:Record' not in self.parent.kvp['typenames']):
+                            # serialize into csw:Record model
+                            searchresults.append(self.parent.render_record(
+                            res, lambda: self._write_record(
+                            res, self._get_record_plan(source_typename))))
+                    except Exception as err:
+                        self.parent.response = self.exceptionreport(
+                        'NoApplicableCode', 'service',
+                        'Record serialization failed: %s' % str(err))
+                        return self.parent.response
 
         if (self.parent.config.has_option('server', 'federatedcatalogues') and
             'distributedsearch' in self.parent.kvp and
@@ -1106,8 +1146,10 @@ class Csw3(object):
         if raw:  # GetRepositoryItem request
             LOGGER.debug('GetRepositoryItem request.')
             if len(results) > 0:
-                return etree.fromstring(util.getqattr(results[0],
-                self.parent.context.md_core_model['mappings']['pycsw:XML']), self.parent.context.parser)
+                return self.parent.render_record(
+                results[0], lambda: etree.fromstring(util.getqattr(results[0],
+                self.parent.context.md_core_model['mappings']['pycsw:XML']), self.parent.context.parser),
+                raw=True)
 
         for result in results:
             if (util.getqattr(result,
@@ -1115,8 +1157,8 @@ class Csw3(object):
             and self.parent.kvp['outputschema'] ==
             'http://www.opengis.net/cat/csw/3.0'):
                 # serialize record inline
-                node = self._write_record(
-                result, self.parent.repository.queryables['_all'])
+                node = self.parent.render_record(
+                result, lambda: self._write_record(result, self._get_record_plan()))
             elif (self.parent.kvp['outputschema'] ==
                 'http://www.opengis.net/cat/csw/3.0'):
                 # serialize into csw:Record model
@@ -1128,20 +1170,16 @@ class Csw3(object):
                         typename = self.parent.profiles['loaded'][prof].typename
                         break
 
-                if typename is not None:
-                    util.transform_mappings(
-                        self.parent.repository.queryables['_all'],
-                        self.parent.context.model['typenames'][typename][
-                            'mappings']['csw:Record']
-                    )
-
-                node = self._write_record( result, self.parent.repository.queryables['_all'])
+                node = self.parent.render_record(
+                result, lambda: self._write_record(result, self._get_record_plan(typename)))
             elif self.parent.kvp['outputschema'] in self.parent.outputschemas:  # use outputschema serializer
-                node = self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(result, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url'))
+                node = self.parent.render_record(
+                result, lambda: self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(result, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url')))
             else:  # it's a profile output
-                node = self.parent.profiles['loaded'][self.parent.kvp['outputschema']].write_record(
+                node = self.parent.render_record(
+                result, lambda: self.parent.profiles['loaded'][self.parent.kvp['outputschema']].write_record(
                 result, self.parent.kvp['elementsetname'],
-                self.parent.kvp['outputschema'], self.parent.repository.queryables['_all'])
+                self.parent.kvp['outputschema'], self.parent.repository.queryables['_all']))
 
         if raw and len(results) == 0:
             return None
@@ -1361,11 +1399,23 @@ class Csw3(object):
                 return self.exceptionreport('NoApplicableCode',
                 'source', 'Harvest (insert) failed: %s.' % str(err))
         else:
-            # parse resource into record
+            # parse resource into pages of records
+            checkpoint = None
+            if self.parent.csw_harvest_checkpointdir is not None:
+                checkpoint = metadata.HarvestCheckpoint(
+                    self.parent.csw_harvest_checkpointdir, self.parent.kvp['source'])
+            workers = self.parent.csw_harvest_workers
+            waf_state = None
+            if self.parent.kvp['resourcetype'] == 'urn:geoss:waf':
+                workers = self.parent.waf_harvest_workers
+                if self.parent.waf_harvest_statedir is not None:
+                    waf_state = metadata.WafHarvestState(
+                        self.parent.waf_harvest_statedir, self.parent.kvp['source'])
             try:
-                records_parsed = metadata.parse_record(self.parent.context,
+                pages = metadata.parse_record_pages(self.parent.context,
                 content, self.parent.repository, self.parent.kvp['resourcetype'],
-                pagesize=self.parent.csw_harvest_pagesize)
+                pagesize=self.parent.csw_harvest_pagesize,
+                workers=workers, checkpoint=checkpoint, state=waf_state)
             except Exception as err:
                 LOGGER.exception(err)
                 return self.exceptionreport('NoApplicableCode', 'source',
@@ -1375,94 +1425,156 @@ class Csw3(object):
             updated = 0
             ir = []
 
-            LOGGER.debug('Total Records parsed: %d', len(records_parsed))
-            for record in records_parsed:
-                if self.parent.kvp['resourcetype'] == 'urn:geoss:waf':
-                    src = record.source
-                else:
-                    src = self.parent.kvp['source']
-
-                setattr(record, self.parent.context.md_core_model['mappings']['pycsw:Source'],
-                        src)
-
-                setattr(record, self.parent.context.md_core_model['mappings']['pycsw:InsertDate'],
-                util.get_today_and_now())
-
-                identifier = getattr(record,
-                self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
-                source = getattr(record,
-                self.parent.context.md_core_model['mappings']['pycsw:Source'])
-                insert_date = getattr(record,
-                self.parent.context.md_core_model['mappings']['pycsw:InsertDate'])
-                title = getattr(record,
-                self.parent.context.md_core_model['mappings']['pycsw:Title'])
-
-                record_type = getattr(record, self.parent.context.md_core_model['mappings']['pycsw:Type'])
-
-                record_identifier = getattr(record, self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
-
-                if record_type == 'service' and service_identifier is not None:  # service endpoint
-                    LOGGER.info('Replacing service identifier from %s to %s', record_identifier, service_identifier)
-                    old_identifier = record_identifier
-                    identifier = record_identifier = service_identifier
-                if (record_type != 'service' and service_identifier is not None
-                    and old_identifier is not None):  # service resource
-                    if record_identifier.find(old_identifier) != -1:
-                        new_identifier = record_identifier.replace(old_identifier, service_identifier)
-                        LOGGER.info('Replacing service resource identifier from %s to %s', record_identifier, new_identifier)
-                        identifier = record_identifier = new_identifier
-
-                ir.append({'identifier': identifier, 'title': title})
-
-                results = []
-                if not self.parent.config.has_option('repository', 'source'):
-                    # query repository to see if record already exists
-                    LOGGER.info('checking if record exists (%s)', identifier)
-                    results = self.parent.repository.query_ids(ids=[identifier])
+            # write each page of records as soon as it has been parsed
+            while True:
+                try:
+                    records_parsed = next(pages)
+                except StopIteration:
+                    break
+                except Exception as err:
+                    LOGGER.exception(err)
+                    return self.exceptionreport('NoApplicableCode', 'source',
+                    'Harvest failed: record parsing failed: %s' % str(err))
+
+                harvested = []
+                inserts = []
+                updates = []
+
+                LOGGER.debug('Records parsed: %d', len(records_parsed))
+                for record in records_parsed:
+                    if self.parent.kvp['resourcetype'] == 'urn:geoss:waf':
+                        src = record.source
+                    else:
+                        src = self.parent.kvp['source']
 
-                    if len(results) == 0:  # check for service identifier
-                        LOGGER.info('checking if service id exists (%s)', service_identifier)
-                        results = self.parent.repository.query_ids(ids=[service_identifier])
+                    setattr(record, self.parent.context.md_core_model['mappings']['pycsw:Source'],
+                            src)
 
-                LOGGER.debug(str(results))
+                    setattr(record, self.parent.context.md_core_model['mappings']['pycsw:InsertDate'],
+                    util.get_today_and_now())
 
-                if len(results) == 0:  # new record, it's a new insert
-                    inserted += 1
-                    try:
-                        tmp = self.parent.repository.insert(record, source, insert_date)
-                        if tmp is not None: ir = tmp
-                    except Exception as err:
-                        return self.exceptionreport('NoApplicableCode',
-                        'source', 'Harvest (insert) failed: %s.' % str(err))
-                else:  # existing record, it's an update
-                    if source != results[0].source:
+                    identifier = getattr(record,
+                    self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
+                    title = getattr(record,
+                    self.parent.context.md_core_model['mappings']['pycsw:Title'])
+
+                    record_type = getattr(record, self.parent.context.md_core_model['mappings']['pycsw:Type'])
+
+                    record_identifier = getattr(record, self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
+
+                    if record_type == 'service' and service_identifier is not None:  # service endpoint
+                        LOGGER.info('Replacing service identifier from %s to %s', record_identifier, service_identifier)
+                        old_identifier = record_identifier
+                        identifier = record_identifier = service_identifier
+                    if (record_type != 'service' and service_identifier is not None
+                        and old_identifier is not None):  # service resource
+                        if record_identifier.find(old_identifier) != -1:
+                            new_identifier = record_identifier.replace(old_identifier, service_identifier)
+                            LOGGER.info('Replacing service resource identifier from %s to %s', record_identifier, new_identifier)
+                            identifier = record_identifier = new_identifier
+
+                    ir.append({'identifier': identifier, 'title': title})
+                    harvested.append((identifier, record))
+
+                if self.parent.config.has_option('repository', 'source'):
+                    inserted += len(harvested)
+                    for identifier, record in harvested:
+                        try:
+                            tmp = self.parent.repository.insert(record,
+                            getattr(record, self.parent.context.md_core_model['mappings']['pycsw:Source']),
+                            getattr(record, self.parent.context.md_core_model['mappings']['pycsw:InsertDate']))
+                            if tmp is not None: ir = tmp
+                        except Exception as err:
+                            return self.exceptionreport('NoApplicableCode',
+                            'source', 'Harvest (insert) failed: %s.' % str(err))
+                    continue
+
+                # query repository once to see which records already exist
+                ids = [i[0] for i in harvested]
+                if service_identifier is not None:
+                    ids.append(service_identifier)
+                LOGGER.info('checking which of %d records exist', len(ids))
+                existing = self.parent.repository.query_id_sources(ids)
+
+                for identifier, record in harvested:
+                    source = getattr(record,
+                    self.parent.context.md_core_model['mappings']['pycsw:Source'])
+
+                    if identifier in existing:
+                        existing_source = existing[identifier]
+                    elif (service_identifier in existing and identifier != getattr(record,
+                          self.parent.context.md_core_model['mappings']['pycsw:Identifier'])):
+                        # service or service resource with a replaced identifier
+                        existing_source = existing[service_identifier]
+                    else:  # new record, it's a new insert
+                        inserted += 1
+                        inserts.append(record)
+                        # repeated identifiers in the same harvest are updates
+                        existing[identifier] = source
+                        continue
+
+                    # existing record, it's an update
+                    if source != existing_source:
                         # same identifier, but different source
                         return self.exceptionreport('NoApplicableCode',
                         'source', 'Insert failed: identifier %s in repository\
                         has source %s.' % (identifier, source))
+                    updates.append(record)
+                    updated += 1
 
+                # write the records of the page in one transaction, inserts
+                # before the updates that may follow them
+                try:
+                    self.parent.repository.upsert(inserts, updates)
+                except Exception as err:
+                    return self.exceptionreport('NoApplicableCode',
+                    'source', 'Harvest (insert/update) failed: %s.' % str(err))
+
+            if waf_state is not None:
+                # remove records of documents no longer in the WAF
+                deleted = waf_state.removed()
+                LOGGER.debug('Records to delete: %s', deleted)
+
+                # in chunks of bounded IN lists, as in Repository.delete
+                for i in range(0, len(deleted), MAX_IN_VALUES):
+                    chunk = deleted[i:i+MAX_IN_VALUES]
+                    delete_constraint = {
+                        'type': 'filter',
+                        'values': chunk,
+                        'where': 'identifier IN (%s)' % ','.join(
+                            [':pvalue%d' % j for j in range(len(chunk))])
+                    }
                     try:
-                        self.parent.repository.update(record)
+                        self.parent.repository.delete(delete_constraint)
                     except Exception as err:
                         return self.exceptionreport('NoApplicableCode',
-                        'source', 'Harvest (update) failed: %s.' % str(err))
-                    updated += 1
+                        'source', 'Harvest (delete) failed: %s.' % str(err))
+                waf_state.save()
 
-            if service_identifier is not None:
+            if (service_identifier is not None and checkpoint is not None and
+                checkpoint.resumed):
+                LOGGER.info('Harvest resumed from a checkpoint, not deleting records')
+            elif service_identifier is not None:
                 fresh_records = [str(i['identifier']) for i in ir]
                 existing_records = [str(i.identifier) for i in service_results]
 
                 deleted = set(existing_records) - set(fresh_records)
                 LOGGER.debug('Records to delete: %s', deleted)
 
-                for to_delete in deleted:
+                # remove stale records, in chunks of bounded IN lists
+                stale = sorted(deleted)
+                for i in range(0, len(stale), MAX_IN_VALUES):
+                    chunk = stale[i:i+MAX_IN_VALUES]
                     delete_constraint = {
                         'type': 'filter',
-                        'values': [to_delete],
-                        'where': 'identifier = :pvalue0'
+                        'values': chunk,
+                        'where': 'identifier IN (%s)' % ','.join(
+                            [':pvalue%d' % j for j in range(len(chunk))])
                     }
                     self.parent.repository.delete(delete_constraint)
 
+        self.parent.records_harvested = inserted + updated
+
         node = etree.Element(util.nspath_eval('csw:HarvestResponse',
         self.parent.context.namespaces), nsmap=self.parent.context.namespaces)
 
@@ -1489,136 +1601,191 @@ class Csw3(object):
         else:
             return node
 
-    def _write_record(self, recobj, queryables):
-        ''' Generate csw30:Record '''
-        if self.parent.kvp['elementsetname'] == 'brief':
+    def _get_record_plan(self, typename=None):
+        ''' Return the csw30:Record serializer plan for records of typename
+
+        The plan holds the element tags and columns to write for the
+        requested elementsetname or elementnames.  It is compiled once per
+        source typename and reused for every record of the response '''
+
+        kvp = self.parent.kvp
+        key = (typename, kvp.get('elementsetname'),
+               tuple(kvp.get('elementname') or ()))
+
+        if key in self._record_plans:
+            return self._record_plans[key]
+
+        queryables = self.parent.repository.queryables['_all']
+        if typename is not None:  # serialize into csw:Record model
+            queryables = util.transform_mappings(
+                queryables, self.parent.context.model['typenames'][typename][
+                    'mappings']['csw:Record'])
+
+        namespaces = self.parent.context.namespaces
+        mappings = self.parent.context.md_core_model['mappings']
+        esn = kvp['elementsetname']
+
+        def field(term):
+            return (util.nspath_eval(term, namespaces), queryables[term]['dbcol'])
+
+        if esn == 'brief':
             elname = 'BriefRecord'
-        elif self.parent.kvp['elementsetname'] == 'summary':
+        elif esn == 'summary':
             elname = 'SummaryRecord'
         else:
             elname = 'Record'
 
-        record = etree.Element(util.nspath_eval('csw30:%s' % elname,
-                 self.parent.context.namespaces), nsmap=self.parent.context.namespaces)
-
-        if ('elementname' in self.parent.kvp and
-            len(self.parent.kvp['elementname']) > 0):
-            for req_term in ['dc:identifier', 'dc:title']:
-                if req_term not in self.parent.kvp['elementname']:
-                    value = util.getqattr(recobj, queryables[req_term]['dbcol'])
-                    etree.SubElement(record,
-                    util.nspath_eval(req_term,
-                    self.parent.context.namespaces)).text = value
-            for elemname in self.parent.kvp['elementname']:
+        plan = {
+            'tag': util.nspath_eval('csw30:%s' % elname, namespaces),
+            'esn': esn,
+            'elementnames': None,
+            'identifier': (util.nspath_eval('dc:identifier', namespaces),
+                           mappings['pycsw:Identifier']),
+            'typename': mappings['pycsw:Typename'],
+            'schema': mappings['pycsw:Schema'],
+            'type': mappings['pycsw:Type'],
+            'xml': mappings['pycsw:XML'],
+            'bbox': mappings['pycsw:BoundingBox'],
+            'time_begin': mappings['pycsw:TempExtent_begin'],
+            'time_end': mappings['pycsw:TempExtent_end']
+        }
+
+        if 'elementname' in kvp and len(kvp['elementname']) > 0:
+            plan['required'] = [field(req_term) for req_term in
+                                ['dc:identifier', 'dc:title']
+                                if req_term not in kvp['elementname']]
+            plan['elementnames'] = []
+            for elemname in kvp['elementname']:
                 if (elemname.find('BoundingBox') != -1 or
                     elemname.find('Envelope') != -1):
-                    bboxel = write_boundingbox(util.getqattr(recobj,
-                    self.parent.context.md_core_model['mappings']['pycsw:BoundingBox']),
-                    self.parent.context.namespaces)
+                    plan['elementnames'].append((None, None))
+                else:
+                    plan['elementnames'].append(field(elemname))
+        else:
+            plan['brief'] = [field(i) for i in ['dc:title', 'dc:type']]
+            if esn in ['summary', 'full']:
+                plan['subject'] = field('dc:subject')
+                plan['topiccategory'] = (plan['subject'][0],
+                                         mappings['pycsw:TopicCategory'])
+                plan['format'] = field('dc:format')
+                plan['links'] = (util.nspath_eval('dct:references', namespaces),
+                                 mappings['pycsw:Links'])
+                plan['summary'] = [field(i) for i in
+                                   ['dc:relation', 'dct:modified', 'dct:abstract']]
+            if esn == 'full':
+                plan['full'] = [field(i) for i in ['dc:date', 'dc:creator',
+                                'dc:publisher', 'dc:contributor', 'dc:source',
+                                'dc:language', 'dc:rights', 'dct:alternative']]
+                plan['spatial'] = field('dct:spatial')
+            if esn != 'brief':
+                plan['tempext'] = util.nspath_eval('csw30:TemporalExtent', namespaces)
+                plan['begin'] = util.nspath_eval('csw30:begin', namespaces)
+                plan['end'] = util.nspath_eval('csw30:end', namespaces)
+
+        self._record_plans[key] = plan
+        return plan
+
+    def _write_record(self, recobj, plan):
+        ''' Generate csw30:Record '''
+
+        getqattr = util.getqattr
+        namespaces = self.parent.context.namespaces
+
+        record = etree.Element(plan['tag'], nsmap=namespaces)
+
+        if plan['elementnames'] is not None:
+            for tag, column in plan['required']:
+                etree.SubElement(record, tag).text = getqattr(recobj, column)
+            for tag, column in plan['elementnames']:
+                if tag is None:
+                    bboxel = write_boundingbox(getqattr(recobj, plan['bbox']),
+                                               namespaces)
                     if bboxel is not None:
                         record.append(bboxel)
                 else:
-                    value = util.getqattr(recobj, queryables[elemname]['dbcol'])
-                    elem = etree.SubElement(record,
-                           util.nspath_eval(elemname,
-                           self.parent.context.namespaces))
+                    value = getqattr(recobj, column)
+                    elem = etree.SubElement(record, tag)
                     if value:
                         elem.text = value
-        elif 'elementsetname' in self.parent.kvp:
-            if (self.parent.kvp['elementsetname'] == 'full' and
-            util.getqattr(recobj, self.parent.context.md_core_model['mappings']\
-            ['pycsw:Typename']) == 'csw:Record' and
-            util.getqattr(recobj, self.parent.context.md_core_model['mappings']\
-            ['pycsw:Schema']) == 'http://www.opengis.net/cat/csw/3.0' and
-            util.getqattr(recobj, self.parent.context.md_core_model['mappings']\
-            ['pycsw:Type']) != 'service'):
+        else:
+            if (plan['esn'] == 'full' and
+                getqattr(recobj, plan['typename']) == 'csw:Record' and
+                getqattr(recobj, plan['schema']) == 'http://www.opengis.net/cat/csw/3.0' and
+                getqattr(recobj, plan['type']) != 'service'):
                 # dump record as is and exit
-                return etree.fromstring(util.getqattr(recobj,
-                self.parent.context.md_core_model['mappings']['pycsw:XML']), self.parent.context.parser)
+                return etree.fromstring(getqattr(recobj, plan['xml']),
+                                        self.parent.context.parser)
 
-            etree.SubElement(record,
-            util.nspath_eval('dc:identifier', self.parent.context.namespaces)).text = \
-            util.getqattr(recobj,
-            self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
+            tag, column = plan['identifier']
+            etree.SubElement(record, tag).text = getqattr(recobj, column)
 
-            for i in ['dc:title', 'dc:type']:
-                val = util.getqattr(recobj, queryables[i]['dbcol'])
+            for tag, column in plan['brief']:
+                val = getqattr(recobj, column)
                 if not val:
                     val = ''
-                etree.SubElement(record, util.nspath_eval(i,
-                self.parent.context.namespaces)).text = val
+                etree.SubElement(record, tag).text = val
 
-            if self.parent.kvp['elementsetname'] in ['summary', 'full']:
+            if 'summary' in plan:
                 # add summary elements
-                keywords = util.getqattr(recobj, queryables['dc:subject']['dbcol'])
+                tag, column = plan['subject']
+                keywords = getqattr(recobj, column)
                 if keywords is not None:
                     for keyword in keywords.split(','):
-                        etree.SubElement(record,
-                        util.nspath_eval('dc:subject',
-                        self.parent.context.namespaces)).text = keyword
+                        etree.SubElement(record, tag).text = keyword
 
-                val = util.getqattr(recobj, self.parent.context.md_core_model['mappings']['pycsw:TopicCategory'])
+                tag, column = plan['topiccategory']
+                val = getqattr(recobj, column)
                 if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dc:subject',
-                    self.parent.context.namespaces), scheme='http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#MD_TopicCategoryCode').text = val
+                    etree.SubElement(record, tag, scheme='http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#MD_TopicCategoryCode').text = val
 
-                val = util.getqattr(recobj, queryables['dc:format']['dbcol'])
+                tag, column = plan['format']
+                val = getqattr(recobj, column)
                 if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dc:format',
-                    self.parent.context.namespaces)).text = val
+                    etree.SubElement(record, tag).text = val
 
                 # links
-                rlinks = util.getqattr(recobj,
-                self.parent.context.md_core_model['mappings']['pycsw:Links'])
+                tag, column = plan['links']
+                rlinks = getqattr(recobj, column)
 
                 if rlinks:
                     links = rlinks.split('^')
                     for link in links:
                         linkset = link.split(',')
-                        etree.SubElement(record,
-                        util.nspath_eval('dct:references',
-                        self.parent.context.namespaces),
+                        etree.SubElement(record, tag,
                         scheme=linkset[2]).text = linkset[-1]
 
-                for i in ['dc:relation', 'dct:modified', 'dct:abstract']:
-                    val = util.getqattr(recobj, queryables[i]['dbcol'])
+                for tag, column in plan['summary']:
+                    val = getqattr(recobj, column)
                     if val is not None:
-                        etree.SubElement(record,
-                        util.nspath_eval(i, self.parent.context.namespaces)).text = val
-
-            if self.parent.kvp['elementsetname'] == 'full':  # add full elements
-                for i in ['dc:date', 'dc:creator', \
-                'dc:publisher', 'dc:contributor', 'dc:source', \
-                'dc:language', 'dc:rights', 'dct:alternative']:
-                    val = util.getqattr(recobj, queryables[i]['dbcol'])
+                        etree.SubElement(record, tag).text = val
+
+            if 'full' in plan:  # add full elements
+                for tag, column in plan['full']:
+                    val = getqattr(recobj, column)
                     if val:
-                        etree.SubElement(record,
-                        util.nspath_eval(i, self.parent.context.namespaces)).text = val
-                val = util.getqattr(recobj, queryables['dct:spatial']['dbcol'])
+                        etree.SubElement(record, tag).text = val
+                tag, column = plan['spatial']
+                val = getqattr(recobj, column)
                 if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dct:spatial', self.parent.context.namespaces), scheme='http://www.opengis.net/def/crs').text = val
+                    etree.SubElement(record, tag, scheme='http://www.opengis.net/def/crs').text = val
 
             # always write out ows:BoundingBox
-            bboxel = write_boundingbox(getattr(recobj,
-            self.parent.context.md_core_model['mappings']['pycsw:BoundingBox']),
-            self.parent.context.namespaces)
+            bboxel = write_boundingbox(getattr(recobj, plan['bbox']),
+                                       namespaces)
 
             if bboxel is not None:
                 record.append(bboxel)
 
-            if self.parent.kvp['elementsetname'] != 'brief':  # add temporal extent
-                begin = util.getqattr(record, self.parent.context.md_core_model['mappings']['pycsw:TempExtent_begin'])
-                end = util.getqattr(record, self.parent.context.md_core_model['mappings']['pycsw:TempExtent_end'])
+            if 'tempext' in plan:  # add temporal extent
+                begin = getqattr(record, plan['time_begin'])
+                end = getqattr(record, plan['time_end'])
 
                 if begin or end:
-                    tempext = etree.SubElement(record, util.nspath_eval('csw30:TemporalExtent', self.parent.context.namespaces))
+                    tempext = etree.SubElement(record, plan['tempext'])
                     if begin:
-                        etree.SubElement(record, util.nspath_eval('csw30:begin', self.parent.context.namespaces)).text = begin
+                        etree.SubElement(record, plan['begin']).text = begin
                     if end:
-                        etree.SubElement(record, util.nspath_eval('csw30:end', self.parent.context.namespaces)).text = end
+                        etree.SubElement(record, plan['end']).text = end
 
         return record
 
@@ -1634,7 +1801,8 @@ class Csw3(object):
                 query['type'] = 'filter'
                 query['where'], query['values'] = fes2.parse(tmp,
                 self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
+                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                self.parent.repository.facets, self.parent.repository.shadows)
                 query['_dict'] = xml2dict(etree.tostring(tmp), self.parent.context.namespaces)
             except Exception as err:
                 return 'Invalid Filter request: %s' % err
@@ -1648,7 +1816,8 @@ class Csw3(object):
                 cql = cql2fes1(tmp.text, self.parent.context.namespaces)
                 query['where'], query['values'] = fes1.parse(cql,
                 self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
+                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                self.parent.repository.facets, self.parent.repository.shadows)
                 query['_dict'] = xml2dict(etree.tostring(cql), self.parent.context.namespaces)
             except Exception as err:
                 LOGGER.exception('Invalid CQL request: %s', tmp.text)
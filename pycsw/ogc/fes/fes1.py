@@ -32,8 +32,9 @@
 
 import logging
 
-from pycsw.core import util
+from pycsw.core import tracing, util
 from pycsw.core.etree import etree
+from pycsw.ogc.fes import fes2
 from pycsw.ogc.gml import gml3
 
 LOGGER = logging.getLogger(__name__)
@@ -73,9 +74,15 @@ MODEL = {
 }
 
 
-def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='english', fts=False):
+@tracing.traced('filter')
+def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='english', fts=False, facets=None, shadows=None):
     """OGC Filter object support"""
 
+    if facets is None:  # SQL of equality filters on faceted columns
+        facets = {}
+    if shadows is None:  # typed shadow columns, and their value converters
+        shadows = {}
+
     boq = None
     is_pg = dbtype.startswith('postgresql')
 
@@ -128,8 +135,12 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
         else:
             try:
                 LOGGER.debug('Testing existence of ogc:PropertyName')
-                pname = queryables[elem.find(
-                    util.nspath_eval('ogc:PropertyName', nsmap)).text]['dbcol']
+                queryable = queryables[elem.find(
+                    util.nspath_eval('ogc:PropertyName', nsmap)).text]
+                # core model mappings (e.g. pycsw:TempExtent_begin) are
+                # plain column names
+                pname = (queryable['dbcol'] if isinstance(queryable, dict)
+                         else queryable)
             except Exception as err:
                 raise RuntimeError('Invalid PropertyName: %s.  %s' %
                                    (elem.find(util.nspath_eval('ogc:PropertyName',
@@ -140,7 +151,7 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                 MODEL['SpatialOperators']['values']]:
                 boolean_true = '\'true\''
                 boolean_false = '\'false\''
-                if dbtype == 'mysql':
+                if dbtype.startswith('mysql'):
                     boolean_true = 'true'
                     boolean_false = 'false'
 
@@ -169,6 +180,13 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
             upper_boundary = elem.find(
                 util.nspath_eval('ogc:UpperBoundary/ogc:Literal',
                                  nsmap)).text
+            if fname is None:
+                lower = fes2.get_shadow_value(shadows, pname, lower_boundary)
+                upper = fes2.get_shadow_value(shadows, pname, upper_boundary)
+                if lower is not None and upper is not None:
+                    LOGGER.debug('Shadow column comparison')
+                    pname = shadows[pname][0]
+                    lower_boundary, upper_boundary = lower, upper
             expression = "%s %s %s and %s" % \
                            (pname, com_op, assign_param(), assign_param())
             values.append(lower_boundary)
@@ -190,6 +208,12 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
 
                     LOGGER.debug('new value: %s', pvalue)
 
+            if fname is None and com_op in fes2.SHADOW_OPERATORS:
+                shadow_value = fes2.get_shadow_value(shadows, pname, pval)
+                if shadow_value is not None:
+                    LOGGER.debug('Shadow column comparison')
+                    pname, pvalue = shadows[pname][0], shadow_value
+
             values.append(pvalue)
 
             if boq == ' not ':
@@ -200,6 +224,9 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     LOGGER.debug('PostgreSQL FTS specific search')
                     expression = ("%s is null or not plainto_tsquery('%s', %s) @@ anytext_tsvector" %
                                   (anytext, language, assign_param()))
+                elif com_op == '=' and pname in facets:
+                    LOGGER.debug('Facet specific search')
+                    expression = "not %s" % (facets[pname] % assign_param())
                 else:
                     LOGGER.debug('PostgreSQL non-FTS specific search')
                     expression = "%s is null or not %s %s %s" % \
@@ -212,12 +239,25 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     LOGGER.debug('PostgreSQL FTS specific search')
                     expression = ("plainto_tsquery('%s', %s) @@ anytext_tsvector" %
                                   (language, assign_param()))
+                elif com_op == '=' and pname in facets:
+                    LOGGER.debug('Facet specific search')
+                    expression = facets[pname] % assign_param()
                 else:
                     LOGGER.debug('PostgreSQL non-FTS specific search')
                     expression = "%s %s %s" % (pname, com_op, assign_param())
 
         return expression
 
+    def _get_nested_expression(elem):
+        """return the SQL expression of a nested binary logic query, or
+        of a comparison"""
+        tagname = ' %s ' % etree.QName(elem).localname.lower()
+        if tagname in [' or ', ' and ']:
+            return '(%s)' % tagname.join(
+                _get_nested_expression(child) for child in
+                elem.xpath('child::*'))
+        return _get_comparison_expression(elem)
+
     queries = []
     queries_nested = []
     values = []
@@ -228,7 +268,7 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
         boolean_true = '\'true\''
         boolean_false = '\'false\''
 
-        if dbtype == 'mysql':
+        if dbtype.startswith('mysql'):
             boolean_true = 'true'
             boolean_false = 'false'
 
@@ -285,7 +325,7 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
             if tagname in [' or ', ' and ']:  # this is a nested binary logic query
                 LOGGER.debug('Nested binary logic detected; operator=%s', tagname)
                 for child2 in child.xpath('child::*'):
-                    queries_nested.append(_get_comparison_expression(child2))
+                    queries_nested.append(_get_nested_expression(child2))
                 queries.append('(%s)' % tagname.join(queries_nested))
             else:
                 queries.append(_get_comparison_expression(child))
@@ -321,7 +361,18 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
 
     LOGGER.debug('Spatial predicate: %s', spatial_predicate)
 
-    if dbtype == 'mysql':  # adjust spatial query for MySQL
+    if (dbtype == 'mysql+native' and
+            spatial_predicate not in ['beyond', 'dwithin']):  # adjust spatial query for MySQL with native geometry
+        LOGGER.debug('Adjusting spatial query for MySQL+native')
+        if spatial_predicate == 'bbox':  # envelope test, served by the spatial index
+            spatial_function = 'mbrintersects'
+        else:
+            spatial_function = 'st_%s' % spatial_predicate
+
+        spatial_query = "%s(%s, st_geomfromtext('%s', 4326, 'axis-order=long-lat'))" % \
+            (spatial_function, postgis_geometry_column, geometry.wkt)
+
+    elif dbtype.startswith('mysql'):  # adjust spatial query for MySQL
         LOGGER.debug('Adjusting spatial query for MySQL')
         if spatial_predicate == 'bbox':
             spatial_predicate = 'intersects'
@@ -32,12 +32,26 @@
 
 import logging
 
-from pycsw.core import util
+from pycsw.core import tracing, util
 from pycsw.core.etree import etree
 from pycsw.ogc.gml import gml3
 
 LOGGER = logging.getLogger(__name__)
 
+# comparison operators which may use typed shadow columns
+SHADOW_OPERATORS = ['=', '!=', '<', '>', '<=', '>=']
+
+# conditions of each temporal operator, on the begin and end of record
+# values and the begin and end of the temporal operand
+TEMPORAL_CONDITIONS = {
+    'After': [('begin', '>', 'end')],
+    'AnyInteracts': [('begin', '<=', 'end'), ('end', '>=', 'begin')],
+    'Before': [('end', '<', 'begin')],
+    'During': [('begin', '>', 'begin'), ('end', '<', 'end')],
+    'TOverlaps': [('begin', '<', 'begin'), ('end', '>', 'begin'),
+                  ('end', '<', 'end')],
+}
+
 MODEL = {
     'Conformance': {
         'values': [
@@ -78,6 +92,12 @@ MODEL = {
         'ogc:PropertyIsNotEqualTo': {'opname': 'PropertyIsNotEqualTo', 'opvalue': '!='},
         'ogc:PropertyIsNull': {'opname': 'PropertyIsNull', 'opvalue': 'is null'},
     },
+    'TemporalOperands': {
+        'values': ['gml:TimeInstant', 'gml:TimePeriod']
+    },
+    'TemporalOperators': {
+        'values': ['After', 'AnyInteracts', 'Before', 'During', 'TOverlaps']
+    },
     'Functions': {
         'length': {'returns': 'xs:string'},
         'lower': {'returns': 'xs:string'},
@@ -92,9 +112,15 @@ MODEL = {
 }
 
 
-def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='english', fts=False):
+@tracing.traced('filter')
+def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='english', fts=False, facets=None, shadows=None):
     """OGC Filter object support"""
 
+    if facets is None:  # SQL of equality filters on faceted columns
+        facets = {}
+    if shadows is None:  # typed shadow columns, and their value converters
+        shadows = {}
+
     boq = None
     is_pg = dbtype.startswith('postgresql')
 
@@ -123,6 +149,12 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
         singlechar = elem.attrib.get('singleChar')
         expression = None
 
+        if etree.QName(elem).localname in MODEL['TemporalOperators']['values']:
+            LOGGER.debug('Temporal operator detected')
+            expression = get_temporal_expression(
+                elem, queryables, shadows, assign_param, values)
+            return 'not %s' % expression if boq == ' not ' else expression
+
         if wildcard is None:
             wildcard = '%'
 
@@ -159,7 +191,7 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                 MODEL['SpatialOperators']['values']]:
                 boolean_true = '\'true\''
                 boolean_false = '\'false\''
-                if dbtype == 'mysql':
+                if dbtype.startswith('mysql'):
                     boolean_true = 'true'
                     boolean_false = 'false'
 
@@ -188,6 +220,13 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
             upper_boundary = elem.find(
                 util.nspath_eval('ogc:UpperBoundary/ogc:Literal',
                                  nsmap)).text
+            if fname is None:
+                lower = get_shadow_value(shadows, pname, lower_boundary)
+                upper = get_shadow_value(shadows, pname, upper_boundary)
+                if lower is not None and upper is not None:
+                    LOGGER.debug('Shadow column comparison')
+                    pname = shadows[pname][0]
+                    lower_boundary, upper_boundary = lower, upper
             expression = "%s %s %s and %s" % \
                            (pname, com_op, assign_param(), assign_param())
             values.append(lower_boundary)
@@ -209,6 +248,12 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
 
                     LOGGER.debug('new value: %s', pvalue)
 
+            if fname is None and com_op in SHADOW_OPERATORS:
+                shadow_value = get_shadow_value(shadows, pname, pval)
+                if shadow_value is not None:
+                    LOGGER.debug('Shadow column comparison')
+                    pname, pvalue = shadows[pname][0], shadow_value
+
             values.append(pvalue)
 
             if boq == ' not ':
@@ -219,6 +264,9 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     LOGGER.debug('PostgreSQL FTS specific search')
                     expression = ("%s is null or not plainto_tsquery('%s', %s) @@ anytext_tsvector" %
                                   (anytext, language, assign_param()))
+                elif com_op == '=' and pname in facets:
+                    LOGGER.debug('Facet specific search')
+                    expression = "not %s" % (facets[pname] % assign_param())
                 else:
                     LOGGER.debug('PostgreSQL non-FTS specific search')
                     expression = "%s is null or not %s %s %s" % \
@@ -231,6 +279,9 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     LOGGER.debug('PostgreSQL FTS specific search')
                     expression = ("plainto_tsquery('%s', %s) @@ anytext_tsvector" %
                                   (language, assign_param()))
+                elif com_op == '=' and pname in facets:
+                    LOGGER.debug('Facet specific search')
+                    expression = facets[pname] % assign_param()
                 else:
                     LOGGER.debug('PostgreSQL non-FTS specific search')
                     expression = "%s %s %s" % (pname, com_op, assign_param())
@@ -247,7 +298,7 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
         boolean_true = '\'true\''
         boolean_false = '\'false\''
 
-        if dbtype == 'mysql':
+        if dbtype.startswith('mysql'):
             boolean_true = 'true'
             boolean_false = 'false'
 
@@ -340,7 +391,18 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
 
     LOGGER.debug('Spatial predicate: %s', spatial_predicate)
 
-    if dbtype == 'mysql':  # adjust spatial query for MySQL
+    if (dbtype == 'mysql+native' and
+            spatial_predicate not in ['beyond', 'dwithin']):  # adjust spatial query for MySQL with native geometry
+        LOGGER.debug('Adjusting spatial query for MySQL+native')
+        if spatial_predicate == 'bbox':  # envelope test, served by the spatial index
+            spatial_function = 'mbrintersects'
+        else:
+            spatial_function = 'st_%s' % spatial_predicate
+
+        spatial_query = "%s(%s, st_geomfromtext('%s', 4326, 'axis-order=long-lat'))" % \
+            (spatial_function, postgis_geometry_column, geometry.wkt)
+
+    elif dbtype.startswith('mysql'):  # adjust spatial query for MySQL
         LOGGER.debug('Adjusting spatial query for MySQL')
         if spatial_predicate == 'bbox':
             spatial_predicate = 'intersects'
@@ -402,6 +464,87 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
     return spatial_query
 
 
+def get_shadow_value(shadows, column, value):
+    """return a literal converted to the type of the shadow column of a
+    column, or None if there is no shadow column or the literal does not
+    convert"""
+
+    if column not in shadows:
+        return None
+    return shadows[column][1](value)
+
+
+def get_temporal_expression(element, queryables, shadows, assign_param, values):
+    """return the SQL expression of a temporal operator
+
+    The temporal extent of records is a period from pycsw:TempExtent_begin to
+    pycsw:TempExtent_end, other temporal properties are instants.  Operands
+    are gml:TimePeriod (with an indeterminate begin or end position for
+    open periods) or gml:TimeInstant"""
+
+    operator = etree.QName(element).localname
+
+    pname = element.xpath('*[local-name()="ValueReference" or '
+                          'local-name()="PropertyName"]')
+    try:
+        queryable = queryables[pname[0].text]
+        column = queryable['dbcol'] if isinstance(queryable, dict) else queryable
+    except Exception as err:
+        raise RuntimeError('Invalid PropertyName: %s.  %s' %
+                           (pname[0].text if pname else None, str(err)))
+
+    extent = (queryables.get('pycsw:TempExtent_begin'),
+              queryables.get('pycsw:TempExtent_end'))
+    if column in extent:
+        columns = {'begin': extent[0], 'end': extent[1]}
+    else:
+        columns = {'begin': column, 'end': column}
+
+    period = element.xpath('*[local-name()="TimePeriod"]')
+    instant = element.xpath('*[local-name()="TimeInstant"]/*[local-name()="timePosition"]')
+    if period:
+        operand = {'begin': _get_time_position(period[0], 'begin'),
+                   'end': _get_time_position(period[0], 'end')}
+    elif instant and instant[0].text:
+        operand = {'begin': instant[0].text.strip(),
+                   'end': instant[0].text.strip()}
+    else:
+        raise RuntimeError('Invalid temporal operand for %s' % operator)
+
+    conditions = []
+    for record_bound, sql_op, operand_bound in TEMPORAL_CONDITIONS[operator]:
+        value = operand[operand_bound]
+        if value is None:  # open period
+            if operator != 'AnyInteracts':
+                raise RuntimeError('Invalid open period for %s' % operator)
+            continue
+        pname = columns[record_bound]
+        if pname in shadows:
+            shadow_value = get_shadow_value(shadows, pname, value)
+            if shadow_value is None:
+                raise RuntimeError('Invalid temporal value: %s' % value)
+            pname, value = shadows[pname][0], shadow_value
+        conditions.append('%s %s %s' % (pname, sql_op, assign_param()))
+        values.append(value)
+
+    if not conditions:
+        conditions.append('%s is not null' % columns['begin'])
+
+    return '(%s)' % ' and '.join(conditions)
+
+
+def _get_time_position(period, bound):
+    """return the begin or end position of a gml:TimePeriod, or None if
+    indeterminate"""
+
+    position = period.xpath(
+        '*[local-name()="{0}Position"]|*[local-name()="{0}"]/'
+        '*[local-name()="TimeInstant"]/*[local-name()="timePosition"]'.format(bound))
+    if not position or not (position[0].text or '').strip():
+        return None
+    return position[0].text.strip()
+
+
 def _get_comparison_operator(element):
     """return the SQL operator based on Filter query"""
 
@@ -318,56 +318,18 @@ def kvp2filterxml(kvp, context):
         time_list = kvp['time'].split("/")
         if (len(time_list) == 2):
             LOGGER.debug('TIMELIST: %s', time_list)
-            # This is a normal request
-            if '' not in time_list:
-                LOGGER.debug('Both dates present')
-                # Both dates are present
-                time_element = etree.Element(util.nspath_eval('ogc:PropertyIsBetween',
-                            context.namespaces))
-                el = etree.Element(util.nspath_eval('ogc:PropertyName',
-                            context.namespaces))
-                el.text = 'dc:date'
-                time_element.append(el)
-                el = etree.Element(util.nspath_eval('ogc:LowerBoundary',
-                            context.namespaces))
-                el2 = etree.Element(util.nspath_eval('ogc:Literal',
-                            context.namespaces))
-                el2.text = time_list[0]
-                el.append(el2)
-                time_element.append(el)
-                el = etree.Element(util.nspath_eval('ogc:UpperBoundary',
-                            context.namespaces))
-                el2 = etree.Element(util.nspath_eval('ogc:Literal',
-                            context.namespaces))
-                el2.text = time_list[1]
-                el.append(el2)
-                time_element.append(el)
+            if time_list == ['', '']:
+                par_count -= 1
             else:
-                if time_list == ['', '']:
-                    par_count -= 1
-                # One of two is empty
-                elif time_list[1] == '':
-                    time_element = etree.Element(util.nspath_eval('ogc:PropertyIsGreaterThanOrEqualTo',
-                                context.namespaces))
-                    el = etree.Element(util.nspath_eval('ogc:PropertyName',
-                                context.namespaces))
-                    el.text = 'dc:date'
-                    time_element.append(el)
-                    el = etree.Element(util.nspath_eval('ogc:Literal',
-                                context.namespaces))
-                    el.text = time_list[0]
-                    time_element.append(el)
-                else:
-                    time_element = etree.Element(util.nspath_eval('ogc:PropertyIsLessThanOrEqualTo',
-                                context.namespaces))
-                    el = etree.Element(util.nspath_eval('ogc:PropertyName',
-                                context.namespaces))
-                    el.text = 'dc:date'
-                    time_element.append(el)
-                    el = etree.Element(util.nspath_eval('ogc:Literal',
-                                context.namespaces))
-                    el.text = time_list[1]
-                    time_element.append(el)
+                # records whose date falls within, or whose temporal
+                # extent overlaps, the (possibly open) time range
+                time_element = etree.Element(util.nspath_eval('ogc:Or',
+                            context.namespaces))
+                for begin, end in [('dc:date', 'dc:date'),
+                                   ('pycsw:TempExtent_begin',
+                                    'pycsw:TempExtent_end')]:
+                    time_element.append(_time_range_element(
+                        begin, end, time_list, context))
         elif ((len(time_list) == 1) and ('' not in time_list)):
             # This is an equal request
             time_element = etree.Element(util.nspath_eval('ogc:PropertyIsEqualTo',
@@ -417,6 +379,32 @@ def kvp2filterxml(kvp, context):
     return etree.tostring(root, encoding='unicode')
 
 
+def _time_range_element(begin, end, time_list, context):
+    ''' return a FES 1.1 element matching the records whose period, from
+    property begin to property end, overlaps a time range, open at either
+    end when its begin or end are empty '''
+
+    conditions = []
+    for operator, pname, value in [
+            ('ogc:PropertyIsLessThanOrEqualTo', begin, time_list[1]),
+            ('ogc:PropertyIsGreaterThanOrEqualTo', end, time_list[0])]:
+        if value == '':
+            continue
+        condition = etree.Element(util.nspath_eval(operator,
+                    context.namespaces))
+        etree.SubElement(condition, util.nspath_eval('ogc:PropertyName',
+                    context.namespaces)).text = pname
+        etree.SubElement(condition, util.nspath_eval('ogc:Literal',
+                    context.namespaces)).text = value
+        conditions.append(condition)
+
+    if len(conditions) == 1:
+        return conditions[0]
+    element = etree.Element(util.nspath_eval('ogc:And', context.namespaces))
+    element.extend(conditions)
+    return element
+
+
 def validate_4326(bbox_list):
     """Helper function to validate 4326."""
     is_valid = False
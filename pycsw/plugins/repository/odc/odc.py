@@ -46,6 +46,8 @@ class OpenDataCatalogRepository(object):
         self.context = context
         self.filter = repo_filter
         self.fts = False
+        self.facets = {}
+        self.shadows = {}
 
         self.dbtype = settings.DATABASES['default']['ENGINE'].split('.')[-1]
 
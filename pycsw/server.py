@@ -32,8 +32,14 @@
 #
 # =================================================================
 
+import email.utils
+import functools
+import hashlib
+import json
 import logging
 import os
+import random
+import re
 from urllib.parse import parse_qsl, splitquery, urlparse
 from io import StringIO
 import configparser
@@ -45,17 +51,45 @@ from pycsw.core.etree import etree
 from pycsw import oaipmh, opensearch, sru
 from pycsw.plugins.profiles import profile as pprofile
 import pycsw.plugins.outputschemas
-from pycsw.core import config, log, util
+from pycsw.core import admission, config, httpclient, log, memory, \
+    metrics, profiling, recordcache, renderpool, slowlog, tracing, util
 from pycsw.ogc.csw import csw2, csw3
 
 LOGGER = logging.getLogger(__name__)
 
+# placeholder of a cached record, spliced in at serialization time
+RECORD_PLACEHOLDER = re.compile(r'<\?pycsw-record (\d+)\?>')
+# markers around a record to cache, and the whitespace they add
+RECORD_MARKERS = re.compile(r'<\?pycsw-record-start (\d+)\?>\s*(.*?)\s*'
+                            r'<\?pycsw-record-end \1\?>', re.DOTALL)
+
+
+def _request_handler(method):
+    """ decorator running a request handler with the request trace, if any,
+    as the trace of the current thread, and stopping the memory accounting
+    of the request when it returns """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            with tracing.activated(self.trace):
+                return method(self, *args, **kwargs)
+        finally:
+            if self.memory is not None:
+                self.memory.stop()
+    return wrapper
+
 
 class Csw(object):
     """ Base CSW server """
     def __init__(self, rtconfig=None, env=None, version='3.0.0'):
         """ Initialize CSW """
 
+        # trace of the request, kept below if a consumer of its spans or
+        # identifier is configured
+        trace = tracing.Trace()
+        trace.start('config')
+
         if not env:
             self.environ = os.environ
         else:
@@ -84,10 +118,37 @@ class Csw(object):
         self.mimetype = 'application/xml; charset=UTF-8'
         self.encoding = 'UTF-8'
         self.pretty_print = 0
+        self.fragments = []
+        self.rendered = []
+        self.render_workers = 0
+        self.render_threshold = 100
         self.domainquerytype = 'list'
         self.orm = 'django'
         self.language = {'639_code': 'en', 'text': 'english'}
         self.process_time_start = time()
+        self.trace = None
+        self.tracing = False
+        self.tracing_endpoint = None
+        self.metrics_path = None
+        self.slow_query_log = False
+        self.profile_dir = None
+        self.profile_allowed_ips = ['127.0.0.1']
+        self.profile_sample_rate = 0
+        self.profile_format = 'pstats'
+        self.memory = None
+        self.max_response_records = None
+        self.max_response_bytes = None
+        self.budget_exceeded = None
+        self.response_bytes = 0
+        self.admission_retry_after = 1
+        self.admission_rejected = None
+        self.headers = {}
+        self.cache_control = None
+        self.surrogate_key_header = None
+        self.records_returned = 0
+        self.records_harvested = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         # define CSW implementation object (default CSW3)
         self.iface = csw3.Csw3(server_csw=self)
@@ -162,6 +223,106 @@ class Csw(object):
                 self.config.get('server', 'spatial_ranking') == 'true'):
             util.ranking_enabled = True
 
+        # set ISO 19139 parser
+        if self.config.has_option('server', 'iso_parser'):
+            self.context.iso_parser = self.config.get('server', 'iso_parser')
+
+        # set rendered record cache
+        if self.config.has_option('server', 'record_cache_size'):
+            recordcache.CACHE.maxsize = int(
+                self.config.get('server', 'record_cache_size'))
+        if self.config.has_option('server', 'record_cache_dir'):
+            recordcache.CACHE.cachedir = self.config.get(
+                'server', 'record_cache_dir')
+
+        # set record rendering process pool
+        if self.config.has_option('server', 'render_workers'):
+            self.render_workers = int(
+                self.config.get('server', 'render_workers'))
+        if self.config.has_option('server', 'render_threshold'):
+            self.render_threshold = int(
+                self.config.get('server', 'render_threshold'))
+
+        # set request tracing
+        if (self.config.has_option('server', 'tracing') and
+                self.config.get('server', 'tracing') == 'true'):
+            self.tracing = True
+        if self.config.has_option('server', 'tracing_endpoint'):
+            self.tracing_endpoint = self.config.get(
+                'server', 'tracing_endpoint')
+
+        # set metrics endpoint
+        if self.config.has_option('server', 'metrics_path'):
+            self.metrics_path = self.config.get('server', 'metrics_path')
+        if self.config.has_option('server', 'metrics_dir'):
+            metrics.REGISTRY.directory = self.config.get(
+                'server', 'metrics_dir')
+
+        # set slow query log
+        if self.config.has_option('server', 'slow_query_log'):
+            threshold = explain_rate = None
+            if self.config.has_option('server', 'slow_query_threshold'):
+                threshold = float(self.config.get(
+                    'server', 'slow_query_threshold')) / 1000
+            if self.config.has_option('server', 'slow_query_explain_rate'):
+                explain_rate = float(self.config.get(
+                    'server', 'slow_query_explain_rate'))
+            slowlog.LOG.configure(self.config.get('server', 'slow_query_log'),
+                                  threshold, explain_rate)
+            self.slow_query_log = True
+
+        # set request profiling
+        if self.config.has_option('server', 'profile_dir'):
+            self.profile_dir = self.config.get('server', 'profile_dir')
+        if self.config.has_option('server', 'profile_allowed_ips'):
+            self.profile_allowed_ips = self.config.get(
+                'server', 'profile_allowed_ips').split(',')
+        if self.config.has_option('server', 'profile_sample_rate'):
+            self.profile_sample_rate = float(self.config.get(
+                'server', 'profile_sample_rate'))
+        if self.config.has_option('server', 'profile_format'):
+            self.profile_format = self.config.get('server', 'profile_format')
+
+        # set memory accounting and response budgets
+        if self.config.has_option('server', 'memory_tracking'):
+            try:
+                self.memory = memory.Usage(
+                    self.config.get('server', 'memory_tracking'))
+            except RuntimeError as err:
+                LOGGER.exception('Could not track memory: %s', err)
+        if self.config.has_option('server', 'max_response_records'):
+            self.max_response_records = int(self.config.get(
+                'server', 'max_response_records'))
+        if self.config.has_option('server', 'max_response_bytes'):
+            self.max_response_bytes = int(self.config.get(
+                'server', 'max_response_bytes'))
+
+        # set admission control
+        if self.config.has_option('server', 'admission_limits'):
+            try:
+                limits = admission.get_limits(
+                    self.config.get('server', 'admission_limits'))
+                timeouts = {}
+                if self.config.has_option('server', 'admission_timeouts'):
+                    timeouts = admission.get_limits(self.config.get(
+                        'server', 'admission_timeouts'), float)
+                directory = None
+                if self.config.has_option('server', 'admission_dir'):
+                    directory = self.config.get('server', 'admission_dir')
+                admission.LIMITER.configure(limits, timeouts, directory)
+            except RuntimeError as err:
+                LOGGER.exception('Could not set admission limits: %s', err)
+        if self.config.has_option('server', 'admission_retry_after'):
+            self.admission_retry_after = int(self.config.get(
+                'server', 'admission_retry_after'))
+
+        # set HTTP caching of records
+        if self.config.has_option('server', 'cache_control'):
+            self.cache_control = self.config.get('server', 'cache_control')
+        if self.config.has_option('server', 'surrogate_key_header'):
+            self.surrogate_key_header = self.config.get(
+                'server', 'surrogate_key_header')
+
         # set language default
         if self.config.has_option('server', 'language'):
             try:
@@ -210,6 +371,11 @@ class Csw(object):
         LOGGER.debug('Outputschemas loaded: %s.', self.outputschemas)
         LOGGER.debug('Namespaces: %s', self.context.namespaces)
 
+        trace.stop('config')
+        if (self.tracing or self.slow_query_log or self.memory is not None
+                or self.profile_dir is not None):
+            self.trace = trace
+
     def expand_path(self, path):
         """ return safe path for WSGI environments """
         if 'local.app_root' in self.environ and not os.path.isabs(path):
@@ -217,6 +383,7 @@ class Csw(object):
         else:
             return path
 
+    @_request_handler
     def dispatch_wsgi(self):
         """ WSGI handler """
 
@@ -225,6 +392,14 @@ class Csw(object):
 
         LOGGER.debug('WSGI mode detected')
 
+        if (self.metrics_path is not None and
+                self.environ.get('PATH_INFO') == self.metrics_path):
+            LOGGER.debug('Metrics request')
+            self.mode = 'metrics'
+            self.contenttype = metrics.CONTENT_TYPE
+            return [self.context.response_codes[self.status],
+                    metrics.REGISTRY.render().encode('utf-8')]
+
         if self.environ['REQUEST_METHOD'] == 'POST':
             try:
                 request_body_size = int(self.environ.get('CONTENT_LENGTH', 0))
@@ -245,7 +420,31 @@ class Csw(object):
                 LOGGER.exception('Could not parse query string')
                 self.kvp = {}
             LOGGER.debug('Request type: GET.  Request:\n%s\n', self.request)
-        return self.dispatch()
+
+        ticket = None
+        if admission.LIMITER.enabled:
+            operation = admission.get_operation(
+                self.kvp, self.request if self.requesttype == 'POST' else None)
+            with tracing.span('admission'):
+                ticket = admission.LIMITER.acquire(operation)
+            if ticket is None:
+                return self._write_unavailable(operation)
+
+        try:
+            profile = self._get_profile()
+            if profile is None:
+                return self.dispatch()
+
+            response = profile.run(self.dispatch)
+            try:
+                profile.save(self.profile_dir, self._get_operation(),
+                             self.trace.trace_id)
+            except (IOError, OSError) as err:
+                LOGGER.warning('Could not write profile: %s', err)
+            return response
+        finally:
+            if ticket is not None:
+                admission.LIMITER.release(ticket)
 
     def opensearch(self):
         """ enable OpenSearch """
@@ -267,6 +466,7 @@ class Csw(object):
             self.oaipmhobj = oaipmh.OAIPMH(self.context, self.config)
         return self.oaipmhobj
 
+    @_request_handler
     def dispatch(self, writer=sys.stdout, write_headers=True):
         """ Handle incoming HTTP request """
 
@@ -365,6 +565,7 @@ class Csw(object):
             LOGGER.debug('Profiles loaded: %s' % list(self.profiles['loaded'].keys()))
 
         # init repository
+        tracing.start('repository')
         # look for tablename, set 'records' as default
         if not self.config.has_option('repository', 'table'):
             self.config.set('repository', 'table', 'records')
@@ -403,6 +604,9 @@ class Csw(object):
                     self.config.get('repository', 'table'),
                     repo_filter
                 )
+                if self.config.has_option('repository', 'query_log'):
+                    self.repository.query_log = self.config.get(
+                        'repository', 'query_log')
                 LOGGER.debug(
                     'Repository loaded (local): %s.' % self.repository.dbtype)
             except Exception as err:
@@ -413,6 +617,13 @@ class Csw(object):
                 locator = 'service'
                 text = 'Could not initialize repository. Check server logs'
 
+        if self.slow_query_log and hasattr(self, 'repository') and \
+                hasattr(self.repository, 'engine'):
+            slowlog.LOG.attach(self.repository.engine)
+
+        tracing.stop('repository')
+
+        tracing.start('parse')
         if self.requesttype == 'POST':
             LOGGER.debug('HTTP POST request')
             LOGGER.debug('CSW version: %s', self.iface.version)
@@ -528,11 +739,14 @@ class Csw(object):
                         code = 'InvalidParameterValue'
                         text = 'Invalid value for request: %s' % request
 
+        tracing.stop('parse')
+
         if error == 1:  # return an ExceptionReport
             LOGGER.error('basic service options error: %s, %s, %s', code, locator, text)
             self.response = self.iface.exceptionreport(code, locator, text)
 
         else:  # process per the request value
+            tracing.start('operation')
 
             if 'responsehandler' in self.kvp:
                 # set flag to process asynchronously
@@ -543,7 +757,10 @@ class Csw(object):
                     import uuid
                     self.kvp['requestid'] = str(uuid.uuid4())
 
-            if self.kvp['request'] == 'GetCapabilities':
+            if (self.kvp['request'] in ['GetRecordById', 'GetRepositoryItem']
+                    and self._not_modified()):
+                self.status = 'NotModified'
+            elif self.kvp['request'] == 'GetCapabilities':
                 self.response = self.iface.getcapabilities()
             elif self.kvp['request'] == 'DescribeRecord':
                 self.response = self.iface.describerecord()
@@ -572,6 +789,7 @@ class Csw(object):
                     'InvalidParameterValue', 'request',
                     'Invalid request parameter: %s' % self.kvp['request']
                 )
+            tracing.stop('operation')
 
         LOGGER.info('Request processed')
         if self.mode == 'sru':
@@ -592,6 +810,134 @@ class Csw(object):
 
         return self._write_response()
 
+    @tracing.traced('render')
+    def render_record(self, record, render, raw=False):
+        """ Render a record through the rendered record cache
+
+        On a cache hit, returns a placeholder for the record as serialized
+        in an earlier response, which ``_write_response`` splices in as is.
+        Otherwise returns the element built by ``render``, which
+        ``_write_response`` caches as serialized in this response.
+        ``raw`` renders the record as stored (GetRepositoryItem) """
+
+        if self.budget_exceeded == 'bytes':  # answered with an exception
+            return etree.Comment(' over the response budget ')
+
+        self.records_returned += 1
+        key = self._record_cache_key(record, raw)
+        if key is None:
+            node = render()
+        else:
+            node = self._cached_record(key)
+            if node is None:
+                node = render()
+                self.rendered.append((key, node))
+
+        self._count_response_bytes(node)
+        return node
+
+    @tracing.traced('render')
+    def render_records(self, records, writer, args):
+        """ Render records with ``writer(record, *args)``
+
+        Like ``render_record``, for a page of records.  Records missing from
+        the rendered record cache are rendered in a pool of worker processes
+        when there are at least ``render_threshold`` of them and
+        ``render_workers`` is set """
+
+        self.records_returned += len(records)
+        nodes = [None] * len(records)
+        keys = [self._record_cache_key(record) for record in records]
+
+        pending = []
+        for num, key in enumerate(keys):
+            if key is not None:
+                nodes[num] = self._cached_record(key)
+            if nodes[num] is None:
+                pending.append(num)
+
+        for node in nodes:
+            if node is not None:
+                self._count_response_bytes(node)
+
+        if self.render_workers > 0 and len(pending) >= self.render_threshold:
+            LOGGER.debug('Rendering %d records in worker processes',
+                         len(pending))
+            rendered = renderpool.render([records[num] for num in pending],
+                                         writer, args, self.render_workers)
+            for node in rendered:
+                self._count_response_bytes(node)
+        else:
+            # stop rendering once the response is over its byte budget
+            rendered = []
+            for num in pending:
+                if self.budget_exceeded == 'bytes':
+                    break
+                rendered.append(writer(records[num], *args))
+                self._count_response_bytes(rendered[-1])
+
+        for num, node in zip(pending, rendered):
+            if keys[num] is not None:
+                self.rendered.append((keys[num], node))
+            nodes[num] = node
+
+        return [node for node in nodes if node is not None]
+
+    def _count_response_bytes(self, node):
+        """ Add the size of a rendered record to the size of the response,
+        if it has a byte budget, and flag the response once over it """
+
+        if self.max_response_bytes is None:
+            return
+
+        if (node.tag is etree.ProcessingInstruction and
+                node.target == 'pycsw-record'):  # cached record
+            self.response_bytes += len(
+                self.fragments[int(node.text)]['xml'].encode(self.encoding))
+        else:
+            self.response_bytes += len(etree.tostring(node))
+
+        if self.response_bytes > self.max_response_bytes:
+            self.budget_exceeded = 'bytes'
+
+    def _record_cache_key(self, record, raw=False):
+        """ Return the rendered record cache key of a record, or None when
+        the record is not to be cached """
+
+        if (not recordcache.CACHE.enabled or self.mode != 'csw' or
+                'responsehandler' in self.kvp or self.kvp.get('elementname')):
+            return None
+
+        mappings = self.context.md_core_model['mappings']
+        if raw:
+            outputschema, esn = None, 'raw'
+        else:
+            outputschema = self.kvp.get('outputschema')
+            esn = self.kvp.get('elementsetname')
+
+        # the serialization also depends on where the record is written,
+        # and a process may serve several configurations
+        return (util.getqattr(record, mappings['pycsw:Identifier']),
+                util.getqattr(record, mappings['pycsw:InsertDate']),
+                outputschema, esn, self.iface.version,
+                self.kvp.get('request'), self.pretty_print, self.soap,
+                self.context.url, self.config.get('repository', 'database'),
+                self.config.get('repository', 'table', fallback='records'))
+
+    def _cached_record(self, key):
+        """ Return a placeholder for a cached record, or None """
+
+        fragment = recordcache.CACHE.get(key)
+        if fragment is None:
+            self.cache_misses += 1
+            return None
+
+        self.cache_hits += 1
+        LOGGER.debug('Record cache hit: %s', key[0])
+        self.fragments.append(fragment)
+        return etree.ProcessingInstruction('pycsw-record',
+                                           str(len(self.fragments) - 1))
+
     def getcapabilities(self):
         """ Handle GetCapabilities request """
         return self.iface.getcapabilities()
@@ -624,6 +970,118 @@ class Csw(object):
         """ Handle Harvest request """
         return self.iface.harvest()
 
+    def finish_trace(self):
+        """ Close the request trace, log and export it if tracing is
+        enabled, and return the HTTP response headers it adds """
+
+        if self.trace is None:
+            return {}
+
+        self.trace.finish()
+
+        if self.memory is not None:
+            self.memory.stop()
+            LOGGER.info('Memory used by %s request %s: %s',
+                        self._get_operation(), self.trace.trace_id,
+                        self.memory.to_dict())
+            for key, value in self.memory.to_dict().items():
+                self.trace.attributes['memory.%s' % key] = value
+
+        if not self.tracing:
+            return {}
+
+        if isinstance(self.kvp, dict) and 'request' in self.kvp:
+            self.trace.attributes['request'] = self.kvp['request']
+        self.trace.attributes['mode'] = self.mode
+        self.trace.attributes['status'] = self.status
+
+        tracing.log(self.trace)
+        if self.tracing_endpoint is not None:
+            tracing.get_exporter(self.tracing_endpoint).export(self.trace)
+
+        return {'Server-Timing': self.trace.get_header()}
+
+    def get_response_headers(self):
+        """ Return the HTTP response headers set while processing the
+        request """
+
+        return self.headers
+
+    def record_metrics(self, size):
+        """ Record the metrics of the request, of size bytes, if the
+        metrics endpoint is enabled """
+
+        if self.metrics_path is None or self.mode == 'metrics':
+            return
+
+        operation = self._get_operation()
+
+        registry = metrics.REGISTRY
+        labels = {'operation': operation, 'version': self.request_version,
+                  'mode': self.mode}
+        registry.inc('pycsw_requests_total', labels)
+        if self.exception:
+            registry.inc('pycsw_exceptions_total', labels)
+        registry.observe('pycsw_request_duration_seconds', labels,
+                         time() - self.process_time_start)
+        registry.observe('pycsw_response_size_bytes',
+                         {'operation': operation}, size)
+        registry.inc('pycsw_records_returned_total',
+                     {'operation': operation}, self.records_returned)
+        if self.budget_exceeded is not None:
+            registry.inc('pycsw_response_budget_exceeded_total',
+                         {'budget': self.budget_exceeded})
+        if self.admission_rejected is not None:
+            registry.inc('pycsw_admission_rejected_total',
+                         {'operation': self.admission_rejected})
+
+        if self.memory is not None:
+            if self.memory.rss_delta is not None:
+                registry.observe('pycsw_request_rss_growth_bytes',
+                                 {'operation': operation},
+                                 max(0, self.memory.rss_delta))
+            if self.memory.peak is not None:
+                registry.observe('pycsw_request_memory_peak_bytes',
+                                 {'operation': operation}, self.memory.peak)
+            if self.memory.rss is not None:
+                registry.set('pycsw_process_resident_memory_bytes', {},
+                             self.memory.rss)
+
+        for result, count in [('hit', self.cache_hits),
+                              ('miss', self.cache_misses)]:
+            if count:
+                registry.inc('pycsw_record_cache_requests_total',
+                             {'result': result}, count)
+
+        if operation == 'Harvest':
+            labels = {'source': self.kvp.get('source', '')}
+            registry.inc('pycsw_harvest_records_total', labels,
+                         self.records_harvested)
+            registry.inc('pycsw_harvest_seconds_total', labels,
+                         time() - self.process_time_start)
+            if self.exception:
+                registry.inc('pycsw_harvest_failures_total', labels)
+
+        pool = getattr(getattr(self, 'repository', None), 'engine', None)
+        pool = getattr(pool, 'pool', None)
+        for state, method in [('checked_out', 'checkedout'),
+                              ('size', 'size'), ('overflow', 'overflow')]:
+            if hasattr(pool, method):
+                registry.set('pycsw_db_pool_connections', {'state': state},
+                             getattr(pool, method)())
+
+        for host, stats in httpclient.CLIENT.get_stats().items():
+            labels = {'host': host}
+            registry.set('pycsw_http_client_requests_total', labels,
+                         stats['requests'])
+            registry.set('pycsw_http_client_cache_hits_total', labels,
+                         stats['cache_hits'])
+            registry.set('pycsw_http_client_bytes_total', labels,
+                         stats['bytes'])
+
+        registry.flush()
+
+    @tracing.traced('write')
     def _write_response(self):
         """ Generate response """
         # set HTTP response headers and XML declaration
@@ -633,16 +1091,81 @@ class Csw(object):
 
         LOGGER.info('Writing response.')
 
+        if self.exception:  # not the records the validators are for
+            for header in ['ETag', 'Last-Modified', 'Cache-Control',
+                           self.surrogate_key_header]:
+                self.headers.pop(header, None)
+
+        if self.status == 'NotModified':
+            self.contenttype = self.mimetype
+            if isinstance(self.contenttype, bytes):
+                self.contenttype = self.contenttype.decode()
+            return [self.context.response_codes[self.status], b'']
+
+        if self.budget_exceeded == 'bytes' and not self.exception:
+            # the records alone are over the budget: not serialized
+            return self._write_over_budget(
+                'Response exceeds the limit of %d bytes; request fewer '
+                'records' % self.max_response_bytes)
+
         if hasattr(self, 'soap') and self.soap:
             self._gen_soap_wrapper()
 
-        if etree.__version__ >= '3.5.0':  # remove superfluous namespaces
-            etree.cleanup_namespaces(self.response,
-                                     keep_ns_prefixes=self.context.keep_ns_prefixes)
+        if (self.fragments and
+                self.response.tag is etree.ProcessingInstruction):
+            # the response is a single cached record
+            response = self.fragments[int(self.response.text)]['xml']
+            if self.pretty_print:
+                response += '\n'
+        else:
+            # keep the namespace declarations cached records rely on
+            keep_ns_prefixes = list(self.context.keep_ns_prefixes)
+            for fragment in self.fragments:
+                keep_ns_prefixes.extend(fragment['prefixes'])
+
+            # mark the rendered records to cache
+            rendered = []
+            for key, node in self.rendered:
+                if node is self.response:
+                    rendered.append((key, node))
+                elif node.getroottree().getroot() is self.response:
+                    marker = str(len(rendered))
+                    node.addprevious(etree.ProcessingInstruction(
+                        'pycsw-record-start', marker))
+                    node.addnext(etree.ProcessingInstruction(
+                        'pycsw-record-end', marker))
+                    rendered.append((key, node))
+
+            if etree.__version__ >= '3.5.0':  # remove superfluous namespaces
+                etree.cleanup_namespaces(self.response,
+                                         keep_ns_prefixes=keep_ns_prefixes)
+
+            response = etree.tostring(self.response,
+                                      pretty_print=self.pretty_print,
+                                      encoding='unicode')
+
+            def cache_record(match):
+                """ cache a marked record and remove its markers """
+                key, node = rendered[int(match.group(1))]
+                recordcache.CACHE.set(key, {
+                    'xml': match.group(2),
+                    'prefixes': _namespace_prefixes(node)
+                })
+                return match.group(2)
+
+            if rendered:
+                if rendered[0][1] is self.response:
+                    recordcache.CACHE.set(rendered[0][0], {
+                        'xml': response.rstrip('\n'),
+                        'prefixes': []
+                    })
+                else:
+                    response = RECORD_MARKERS.sub(cache_record, response)
 
-        response = etree.tostring(self.response,
-                                  pretty_print=self.pretty_print,
-                                  encoding='unicode')
+            if self.fragments:  # splice in cached records
+                response = RECORD_PLACEHOLDER.sub(
+                    lambda match: self.fragments[int(match.group(1))]['xml'],
+                    response)
 
         if (isinstance(self.kvp, dict) and 'outputformat' in self.kvp and
                 self.kvp['outputformat'] == 'application/json'):
@@ -665,11 +1188,54 @@ class Csw(object):
             self.contenttype = self.contenttype.decode()
 
         s = (u'%s%s%s' % (xmldecl, appinfo, response)).encode(self.encoding)
+
+        if (self.max_response_bytes is not None and not self.exception and
+                len(s) > self.max_response_bytes):
+            size = len(s)
+            del response, s
+            return self._write_over_budget(
+                'Response of %d bytes exceeds the limit of %d bytes; '
+                'request fewer records' % (size, self.max_response_bytes))
+
         LOGGER.debug('Response code: %s',
                      self.context.response_codes[self.status])
         LOGGER.debug('Response:\n%s', s)
         return [self.context.response_codes[self.status], s]
 
+    def _write_over_budget(self, message):
+        """ Replace a response over the byte budget with an exception """
+
+        LOGGER.warning(message)
+        self.budget_exceeded = 'bytes'
+        self.fragments = []
+        self.rendered = []
+        self.response = self.iface.exceptionreport(
+            'NoApplicableCode', 'maxrecords', message)
+        return self._write_response()
+
+    def _write_unavailable(self, operation):
+        """ Answer a request over the admission limits with a 503 """
+
+        LOGGER.warning('Too many concurrent %s requests', operation)
+        # bound the values of the metrics label, as in _get_operation
+        if (operation != 'unknown' and
+                operation not in self.context.model['operations']):
+            operation = 'invalid'
+        self.admission_rejected = operation
+        self.kvp = self.normalize_kvp(self.kvp)
+        if (self.kvp.get('version') == '2.0.2' or
+                (self.requesttype == 'POST' and
+                 self.request.find(b'cat/csw/2.0.2') != -1)):
+            self.iface = csw2.Csw2(server_csw=self)
+            self.context.set_model('csw')
+
+        self.response = self.iface.exceptionreport(
+            'NoApplicableCode', 'request',
+            'Too many concurrent %s requests; retry later' % operation)
+        self.status = 'ServiceUnavailable'
+        self.headers['Retry-After'] = str(self.admission_retry_after)
+        return self._write_response()
+
     def _gen_soap_wrapper(self):
         """ Generate SOAP wrapper """
         LOGGER.info('Writing SOAP wrapper.')
@@ -773,17 +1339,148 @@ class Csw(object):
                 self.csw_harvest_pagesize = int(
                     self.config.get('manager', 'csw_harvest_pagesize'))
 
+            self.csw_harvest_workers = 1
+            if self.config.has_option('manager', 'csw_harvest_workers'):
+                self.csw_harvest_workers = int(
+                    self.config.get('manager', 'csw_harvest_workers'))
+
+            self.csw_harvest_checkpointdir = None
+            if self.config.has_option('manager', 'csw_harvest_checkpointdir'):
+                self.csw_harvest_checkpointdir = self.config.get(
+                    'manager', 'csw_harvest_checkpointdir')
+
+            self.waf_harvest_workers = 1
+            if self.config.has_option('manager', 'waf_harvest_workers'):
+                self.waf_harvest_workers = int(
+                    self.config.get('manager', 'waf_harvest_workers'))
+
+            self.waf_harvest_statedir = None
+            if self.config.has_option('manager', 'waf_harvest_statedir'):
+                self.waf_harvest_statedir = self.config.get(
+                    'manager', 'waf_harvest_statedir')
+
+            if self.config.has_option('manager', 'http_cachedir'):
+                httpclient.CLIENT.cachedir = self.config.get(
+                    'manager', 'http_cachedir')
+
+    def _not_modified(self):
+        """ Set the cache validators of a GetRecordById or
+        GetRepositoryItem response from the versions of its records, and
+        return whether the client has the response already (conditional
+        GET), looking up nothing else in the repository """
+
+        if (self.requesttype != 'GET' or self.mode != 'csw' or
+                'id' not in self.kvp or 'responsehandler' in self.kvp or
+                not hasattr(self.repository, 'query_versions')):
+            return False
+
+        ids = [self.kvp['id']]
+        if self.request_version == '2.0.2':
+            ids = self.kvp['id'].split(',')
+
+        try:
+            versions = self.repository.query_versions(ids)
+        except Exception as err:
+            LOGGER.exception('Could not query record versions: %s', err)
+            return False
+        if not ids or set(ids) != set(versions):
+            return False
+
+        # the response depends on the records, the request and the server
+        etag = hashlib.sha1(json.dumps([
+            sorted(versions.items()), sorted(self.kvp.items()),
+            self.request_version, self.environ.get('HTTP_ACCEPT'),
+            self.pretty_print, self.context.version, self.context.url
+        ], default=str).encode('utf-8')).hexdigest()
+        self.headers['ETag'] = 'W/"%s"' % etag
+
+        epochs = [util.get_time_epoch(str(insert_date))
+                  for insert_date, digest in versions.values()]
+        last_modified = None
+        if None not in epochs:
+            last_modified = max(epochs)
+            self.headers['Last-Modified'] = email.utils.formatdate(
+                last_modified, usegmt=True)
+
+        if self.cache_control is not None:
+            self.headers['Cache-Control'] = self.cache_control
+        if self.surrogate_key_header is not None:
+            self.headers[self.surrogate_key_header] = ' '.join(sorted(ids))
+
+        if 'HTTP_IF_NONE_MATCH' in self.environ:
+            tags = [tag.strip() for tag in
+                    self.environ['HTTP_IF_NONE_MATCH'].split(',')]
+            return ('*' in tags or
+                    any(tag.replace('W/', '', 1) == '"%s"' % etag
+                        for tag in tags))
+
+        if ('HTTP_IF_MODIFIED_SINCE' in self.environ and
+                last_modified is not None):
+            try:
+                since = email.utils.parsedate_to_datetime(
+                    self.environ['HTTP_IF_MODIFIED_SINCE']).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return last_modified <= since
+
+        return False
+
+    def _get_operation(self):
+        """ Return the operation of the request, for logs and metrics """
+
+        operation = 'unknown'
+        if isinstance(self.kvp, dict) and 'request' in self.kvp:
+            operation = self.kvp['request']
+            if operation not in self.context.model['operations']:
+                operation = 'invalid'
+        return operation
+
+    def _get_client_ip(self):
+        """ Return the IP address of the client, the first forwarded one if
+        behind a proxy """
+
+        if 'HTTP_X_FORWARDED_FOR' in self.environ:
+            return self.environ['HTTP_X_FORWARDED_FOR'].split(',')[0].strip()
+        return self.environ['REMOTE_ADDR']
+
+    def _get_profile(self):
+        """ Return a profile of this request if requested, with the
+        X-Pycsw-Profile header or the pycsw_profile parameter, from an
+        allowed IP address, or sampled, else None """
+
+        requested = False
+        for value in [self.environ.get('HTTP_X_PYCSW_PROFILE'),
+                      self.kvp.pop('pycsw_profile', None)]:
+            if value is not None and value.lower() in ['1', 'true', 'yes']:
+                requested = True
+
+        if self.profile_dir is None:
+            return None
+
+        if requested:
+            ipaddress = self._get_client_ip()
+            if not util.ipaddress_in_whitelist(ipaddress,
+                                               self.profile_allowed_ips):
+                LOGGER.debug('Profiling not allowed for %s', ipaddress)
+                requested = False
+
+        if (not requested and not (self.profile_sample_rate > 0 and
+                                   random.random() < self.profile_sample_rate)):
+            return None
+
+        try:
+            return profiling.Profile(self.profile_format)
+        except RuntimeError as err:
+            LOGGER.exception('Could not profile request: %s', err)
+            return None
+
     def _test_manager(self):
         """ Verify that transactions are allowed """
 
         if self.config.get('manager', 'transactions') != 'true':
             raise RuntimeError('CSW-T interface is disabled')
 
-        """ get the client first forwarded ip """
-        if 'HTTP_X_FORWARDED_FOR' in self.environ:
-            ipaddress = self.environ['HTTP_X_FORWARDED_FOR'].split(',')[0].strip()
-        else:
-            ipaddress = self.environ['REMOTE_ADDR']
+        ipaddress = self._get_client_ip()
 
         if not self.config.has_option('manager', 'allowed_ips') or \
         (self.config.has_option('manager', 'allowed_ips') and not
@@ -872,3 +1569,19 @@ class Csw(object):
         for name, value in kvp.items():
             result[name.lower()] = value
         return result
+
+
+def _namespace_prefixes(node):
+    """ Return the prefixes of the namespaces used in an element tree """
+
+    prefixes = set()
+    for element in node.iter(tag=etree.Element):
+        if element.prefix is not None:
+            prefixes.add(element.prefix)
+        for name in element.attrib:
+            if name.startswith('{'):
+                uri = name[1:].split('}')[0]
+                for prefix, namespace in element.nsmap.items():
+                    if namespace == uri and prefix is not None:
+                        prefixes.add(prefix)
+    return sorted(prefixes)
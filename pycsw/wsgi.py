@@ -63,6 +63,7 @@ import configparser
 from urllib.parse import unquote
 
 from pycsw import server
+from pycsw.core import tracing
 
 
 def application(env, start_response):
@@ -82,13 +83,17 @@ def application(env, start_response):
         'Content-Length': str(len(contents)),
         'Content-Type': str(csw.contenttype)
     }
-    if "gzip" in env.get("HTTP_ACCEPT_ENCODING", ""):
+    if status.startswith('304'):  # no body
+        headers = {}
+    elif "gzip" in env.get("HTTP_ACCEPT_ENCODING", ""):
         try:
             compression_level = int(
                 csw.config.get("server", "gzip_compresslevel"))
-            contents, compress_headers = compress_response(
-                contents, compression_level)
+            with tracing.activated(csw.trace):
+                contents, compress_headers = compress_response(
+                    contents, compression_level)
             headers.update(compress_headers)
+            headers['Content-Length'] = str(len(contents))
         except configparser.NoOptionError:
             print(
                 "The client requested a gzip compressed response. However, "
@@ -98,10 +103,15 @@ def application(env, start_response):
         except configparser.NoSectionError:
             print('Could not load user configuration %s' % configuration_path)
 
+    headers.update(csw.get_response_headers())
+    headers.update(csw.finish_trace())
+    csw.record_metrics(len(contents))
+
     start_response(status, list(headers.items()))
     return [contents]
 
 
+@tracing.traced('compress')
 def compress_response(response, compression_level):
     """Compress pycsw's response with gzip
 
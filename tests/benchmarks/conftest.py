@@ -0,0 +1,160 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""pytest configuration of the micro-benchmarks.
+
+Each micro-benchmark times a function with the ``benchmark`` fixture. The
+time per call is divided by that of a fixed, pure Python reference
+workload, timed along with it, so that baselines are less dependent on
+the speed (and load) of the machine they were recorded on. A benchmark
+fails when its relative time exceeds the baseline by more than
+``--benchmark-threshold`` percent in each of ``ATTEMPTS`` measurements.
+
+"""
+
+import json
+import os
+import platform
+import timeit
+
+import pytest
+
+# relative times of the benchmarks of this session, by name
+RESULTS = {}
+
+# shortest duration of a timed batch of calls, in seconds
+MIN_TIME = 0.05
+
+# batches timed per benchmark; the fastest one is kept
+REPEAT = 5
+
+# measurements of a benchmark slower than its baseline before it fails
+ATTEMPTS = 5
+
+
+def measure(function):
+    """Return the time per call of function, in seconds."""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(function, number=number)
+        if elapsed >= MIN_TIME:
+            break
+        number *= max(2, int(MIN_TIME / max(elapsed, 1e-9)))
+    times = [elapsed] + [timeit.timeit(function, number=number)
+                         for _ in range(REPEAT - 1)]
+    return min(times) / number
+
+
+def reference_workload():
+    """Fixed mix of string, dict and sort operations."""
+    values = {}
+    for number in range(2000):
+        key = "key-%d" % (number * 7919 % 2000)
+        values[key] = values.get(key, "") + key.upper()
+    return sorted(values, key=lambda key: values[key])
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    """Baseline relative times, by benchmark name."""
+    path = request.config.getoption("benchmark_baseline")
+    if request.config.getoption("benchmark_save") or not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)["benchmarks"]
+
+
+@pytest.fixture
+def benchmark(request, baseline):
+    """Time a function and compare it with its baseline.
+
+    Returns a function taking the callable to time, without arguments.
+    Benchmarks are named after the test (including its parameters).
+
+    """
+
+    threshold = request.config.getoption("benchmark_threshold")
+    save = request.config.getoption("benchmark_save")
+
+    def run(function):
+        name = request.node.name
+        expected = baseline.get(name)
+        limit = None if expected is None else expected * (
+            1 + threshold / 100.0)
+        times = []
+        references = []
+        for _ in range(ATTEMPTS):
+            times.append(measure(function))
+            references.append(measure(reference_workload))
+            relative = min(times) / min(references)
+            # a new baseline is the best of all attempts
+            if not save and (limit is None or relative <= limit):
+                break
+        RESULTS[name] = relative
+        if limit is not None and relative > limit:
+            pytest.fail("%s regressed by %.0f%% (threshold: %.0f%%)" % (
+                name, (relative / expected - 1) * 100, threshold))
+        return relative
+
+    return run
+
+
+def pytest_sessionfinish(session):
+    """Write the baseline, when asked to."""
+    config = session.config
+    if not RESULTS or not config.getoption("benchmark_save"):
+        return
+    path = config.getoption("benchmark_baseline")
+    benchmarks = {}
+    if os.path.exists(path):
+        with open(path) as fh:
+            benchmarks = json.load(fh)["benchmarks"]
+    benchmarks.update(RESULTS)
+    with open(path, "w") as fh:
+        json.dump({
+            "python": platform.python_version(),
+            "benchmarks": dict(sorted(benchmarks.items())),
+        }, fh, indent=2)
+        fh.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """Report the time of each benchmark relative to its baseline."""
+    if not RESULTS:
+        return
+    path = config.getoption("benchmark_baseline")
+    benchmarks = {}
+    if os.path.exists(path) and not config.getoption("benchmark_save"):
+        with open(path) as fh:
+            benchmarks = json.load(fh)["benchmarks"]
+    terminalreporter.section("micro-benchmarks (relative to reference)")
+    for name, relative in sorted(RESULTS.items()):
+        line = "%-60s %10.3f" % (name, relative)
+        if name in benchmarks:
+            line += "  %+6.1f%%" % ((relative / benchmarks[name] - 1) * 100)
+        terminalreporter.write_line(line)
@@ -0,0 +1,258 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Synthetic catalogue records for benchmarks.
+
+Records are written as ISO 19139, Dublin Core (csw:Record) and FGDC
+documents, with bounding boxes of varied size spread over the globe,
+keywords drawn from a vocabulary with a Zipf distribution (a few very
+common keywords, many rare ones) and dates between 1990 and 2020. The same
+seed always produces the same records.
+
+"""
+
+import os
+import random
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+FORMATS = ("iso", "dc", "fgdc")
+
+FIRST_DATE = date(1990, 1, 1)
+LAST_DATE = date(2020, 12, 31)
+
+WORDS = [
+    "water", "land", "cover", "soil", "elevation", "climate", "ocean",
+    "temperature", "precipitation", "forest", "agriculture", "urban",
+    "transport", "roads", "rivers", "lakes", "coast", "geology", "imagery",
+    "satellite", "population", "boundaries", "census", "health", "energy",
+    "wind", "solar", "vegetation", "wetlands", "biodiversity", "species",
+    "habitat", "fisheries", "ice", "snow", "glacier", "drought", "flood",
+    "hazard", "earthquake", "volcano", "air", "quality", "emissions",
+    "pollution", "noise", "buildings", "cadastre", "parcels", "address",
+    "utilities", "pipelines", "mining", "minerals", "bathymetry", "tides",
+    "currents", "salinity", "wave", "atmosphere", "aerosols", "ozone",
+    "radiation", "humidity", "pressure", "storms", "hydrography",
+    "groundwater", "aquifer", "catchment", "erosion", "sediment", "dunes",
+    "tundra", "grassland", "crops", "livestock", "irrigation", "fire",
+    "protected", "areas", "tourism", "heritage", "archaeology", "schools",
+    "hospitals", "railways", "airports", "ports", "shipping", "bridges",
+    "topography", "contours", "orthophoto", "lidar", "gravity", "magnetics",
+    "seismic", "permafrost", "phenology",
+]
+
+TOPICS = [
+    "biota", "boundaries", "climatologyMeteorologyAtmosphere", "economy",
+    "elevation", "environment", "farming", "geoscientificInformation",
+    "health", "imageryBaseMapsEarthCover", "inlandWaters", "oceans",
+    "society", "structure", "transportation", "utilitiesCommunication",
+]
+
+ORGANIZATIONS = [
+    "National Mapping Agency", "Geological Survey", "Environment Agency",
+    "Statistics Office", "Meteorological Service", "Hydrographic Office",
+    "Space Agency", "University Research Centre",
+]
+
+ISO_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<gmd:MD_Metadata xmlns:gmd="http://www.isotc211.org/2005/gmd" xmlns:gco="http://www.isotc211.org/2005/gco" xmlns:gml="http://www.opengis.net/gml">
+<gmd:fileIdentifier><gco:CharacterString>{identifier}</gco:CharacterString></gmd:fileIdentifier>
+<gmd:language><gco:CharacterString>eng</gco:CharacterString></gmd:language>
+<gmd:hierarchyLevel><gmd:MD_ScopeCode codeList="http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#MD_ScopeCode" codeListValue="dataset">dataset</gmd:MD_ScopeCode></gmd:hierarchyLevel>
+<gmd:contact><gmd:CI_ResponsibleParty><gmd:organisationName><gco:CharacterString>{organization}</gco:CharacterString></gmd:organisationName><gmd:role><gmd:CI_RoleCode codeList="http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#CI_RoleCode" codeListValue="pointOfContact">pointOfContact</gmd:CI_RoleCode></gmd:role></gmd:CI_ResponsibleParty></gmd:contact>
+<gmd:dateStamp><gco:Date>{modified}</gco:Date></gmd:dateStamp>
+<gmd:identificationInfo><gmd:MD_DataIdentification>
+<gmd:citation><gmd:CI_Citation><gmd:title><gco:CharacterString>{title}</gco:CharacterString></gmd:title><gmd:date><gmd:CI_Date><gmd:date><gco:Date>{date}</gco:Date></gmd:date><gmd:dateType><gmd:CI_DateTypeCode codeList="http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#CI_DateTypeCode" codeListValue="publication">publication</gmd:CI_DateTypeCode></gmd:dateType></gmd:CI_Date></gmd:date></gmd:CI_Citation></gmd:citation>
+<gmd:abstract><gco:CharacterString>{abstract}</gco:CharacterString></gmd:abstract>
+<gmd:descriptiveKeywords><gmd:MD_Keywords>{iso_keywords}</gmd:MD_Keywords></gmd:descriptiveKeywords>
+<gmd:language><gco:CharacterString>eng</gco:CharacterString></gmd:language>
+<gmd:topicCategory><gmd:MD_TopicCategoryCode>{topic}</gmd:MD_TopicCategoryCode></gmd:topicCategory>
+<gmd:extent><gmd:EX_Extent>
+<gmd:geographicElement><gmd:EX_GeographicBoundingBox><gmd:westBoundLongitude><gco:Decimal>{minx}</gco:Decimal></gmd:westBoundLongitude><gmd:eastBoundLongitude><gco:Decimal>{maxx}</gco:Decimal></gmd:eastBoundLongitude><gmd:southBoundLatitude><gco:Decimal>{miny}</gco:Decimal></gmd:southBoundLatitude><gmd:northBoundLatitude><gco:Decimal>{maxy}</gco:Decimal></gmd:northBoundLatitude></gmd:EX_GeographicBoundingBox></gmd:geographicElement>
+<gmd:temporalElement><gmd:EX_TemporalExtent><gmd:extent><gml:TimePeriod gml:id="T1"><gml:beginPosition>{begin}</gml:beginPosition><gml:endPosition>{end}</gml:endPosition></gml:TimePeriod></gmd:extent></gmd:EX_TemporalExtent></gmd:temporalElement>
+</gmd:EX_Extent></gmd:extent>
+</gmd:MD_DataIdentification></gmd:identificationInfo>
+</gmd:MD_Metadata>
+"""
+
+DC_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<csw:Record xmlns:csw="http://www.opengis.net/cat/csw/2.0.2" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dct="http://purl.org/dc/terms/" xmlns:ows="http://www.opengis.net/ows">
+<dc:identifier>{identifier}</dc:identifier>
+<dc:title>{title}</dc:title>
+<dc:type>http://purl.org/dc/dcmitype/Dataset</dc:type>
+{dc_keywords}
+<dc:date>{date}</dc:date>
+<dct:modified>{modified}</dct:modified>
+<dct:abstract>{abstract}</dct:abstract>
+<dc:publisher>{organization}</dc:publisher>
+<dc:language>en</dc:language>
+<ows:BoundingBox crs="urn:x-ogc:def:crs:EPSG:6.11:4326"><ows:LowerCorner>{miny} {minx}</ows:LowerCorner><ows:UpperCorner>{maxy} {maxx}</ows:UpperCorner></ows:BoundingBox>
+</csw:Record>
+"""
+
+FGDC_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata>
+<idinfo>
+<datasetid>{identifier}</datasetid>
+<citation><citeinfo><origin>{organization}</origin><pubdate>{date}</pubdate><title>{title}</title><geoform>vector digital data</geoform></citeinfo></citation>
+<descript><abstract>{abstract}</abstract><purpose>Benchmarking</purpose></descript>
+<timeperd><timeinfo><rngdates><begdate>{begin}</begdate><enddate>{end}</enddate></rngdates></timeinfo><current>ground condition</current></timeperd>
+<status><progress>Complete</progress><update>None planned</update></status>
+<spdom><bounding><westbc>{minx}</westbc><eastbc>{maxx}</eastbc><northbc>{maxy}</northbc><southbc>{miny}</southbc></bounding></spdom>
+<keywords><theme><themekt>None</themekt>{fgdc_keywords}</theme></keywords>
+<accconst>None</accconst>
+<useconst>None</useconst>
+</idinfo>
+<metainfo><metd>{modified}</metd></metainfo>
+</metadata>
+"""
+
+TEMPLATES = {
+    "iso": ISO_TEMPLATE,
+    "dc": DC_TEMPLATE,
+    "fgdc": FGDC_TEMPLATE,
+}
+
+
+class Generator(object):
+    """Random, reproducible record properties."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        # Zipf weights: the n-th most common keyword is n times rarer
+        self.weights = [1.0 / rank for rank in range(1, len(WORDS) + 1)]
+
+    def keywords(self, count=None):
+        """Return distinct keywords, common ones more often."""
+        if count is None:
+            count = self.random.randint(1, 6)
+        keywords = []
+        while len(keywords) < count:
+            word = self.random.choices(WORDS, weights=self.weights)[0]
+            if word not in keywords:
+                keywords.append(word)
+        return keywords
+
+    def bbox(self):
+        """Return (minx, miny, maxx, maxy), from local to continental."""
+        width = min(self.random.lognormvariate(0, 1.5), 60)
+        height = min(width * self.random.uniform(0.5, 1.5), 60)
+        centre_x = self.random.uniform(-180 + width / 2, 180 - width / 2)
+        centre_y = self.random.uniform(-80 + height / 2, 80 - height / 2)
+        return tuple(round(value, 4) for value in (
+            centre_x - width / 2, centre_y - height / 2,
+            centre_x + width / 2, centre_y + height / 2))
+
+    def date(self, start=FIRST_DATE, end=LAST_DATE):
+        """Return a date between start and end."""
+        return start + timedelta(
+            days=self.random.randint(0, (end - start).days))
+
+    def properties(self, number, prefix="urn:uuid:bench-"):
+        """Return the values of the template fields of a record."""
+        keywords = self.keywords()
+        minx, miny, maxx, maxy = self.bbox()
+        begin = self.date()
+        end = self.date(begin)
+        published = self.date(begin)
+        title = "%s %s of %s" % (
+            keywords[0].capitalize(), self.random.choice(
+                ["map", "survey", "dataset", "observations", "model"]),
+            self.random.choice(["region", "basin", "district", "coast",
+                                "province", "island"]))
+        abstract = "%s. Keywords: %s. %s" % (
+            title, ", ".join(keywords),
+            " ".join(self.random.choice(WORDS) for _ in range(30)))
+        return {
+            "identifier": "%s%08d" % (prefix, number),
+            "title": escape(title),
+            "abstract": escape(abstract),
+            "keywords": keywords,
+            "iso_keywords": "".join(
+                "<gmd:keyword><gco:CharacterString>%s</gco:CharacterString>"
+                "</gmd:keyword>" % keyword for keyword in keywords),
+            "dc_keywords": "\n".join(
+                "<dc:subject>%s</dc:subject>" % keyword
+                for keyword in keywords),
+            "fgdc_keywords": "".join(
+                "<themekey>%s</themekey>" % keyword for keyword in keywords),
+            "topic": self.random.choice(TOPICS),
+            "organization": self.random.choice(ORGANIZATIONS),
+            "minx": minx,
+            "miny": miny,
+            "maxx": maxx,
+            "maxy": maxy,
+            "begin": begin.isoformat(),
+            "end": end.isoformat(),
+            "date": published.isoformat(),
+            "modified": self.date(published).isoformat(),
+        }
+
+
+def get_record(properties, format_):
+    """Return a record as an XML string."""
+    return TEMPLATES[format_].format(**properties)
+
+
+def generate(directory, count, seed=0, formats=FORMATS,
+             prefix="urn:uuid:bench-"):
+    """Write count records to directory, in turn in each of formats.
+
+    Parameters
+    ----------
+    directory: str
+        Directory to write the records to. It is created if needed.
+    count: int
+        Number of records to write.
+    seed: int, optional
+        Seed of the random generator.
+    formats: sequence of str, optional
+        Formats of the records, among ``FORMATS``.
+    prefix: str, optional
+        Prefix of the record identifiers.
+
+    Returns
+    -------
+    list
+        The properties of the records written, as returned by
+        ``Generator.properties``.
+
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    generator = Generator(seed)
+    records = []
+    for number in range(count):
+        format_ = formats[number % len(formats)]
+        properties = generator.properties(number, prefix)
+        properties["format"] = format_
+        path = os.path.join(directory, "%s-%08d.xml" % (format_, number))
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(get_record(properties, format_))
+        records.append(properties)
+    return records
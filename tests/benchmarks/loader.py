@@ -0,0 +1,125 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Load generated records into a fresh benchmark repository."""
+
+import glob
+import logging
+import os
+
+from lxml import etree
+from sqlalchemy import create_engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from pycsw.core import admin, config, metadata, repository
+
+LOGGER = logging.getLogger(__name__)
+
+# tables created by admin.setup_db when PostGIS is not installed
+SFSQL_TABLES = ["geometry_columns", "spatial_ref_sys"]
+
+
+def is_available(database):
+    """Return whether a database server accepts connections."""
+    try:
+        engine = create_engine(database)
+        engine.connect().close()
+        return True
+    except (SQLAlchemyError, ImportError) as err:
+        LOGGER.info("Database %s is not available: %s", database, err)
+        return False
+
+
+def reset(database, table="records"):
+    """Drop the benchmark tables, so that admin.setup_db starts afresh."""
+    if database.startswith("sqlite"):
+        path = database.split("sqlite:///")[-1]
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    engine = create_engine(database)
+    with engine.connect() as connection:
+        tables = [table, "%s_facets" % table]
+        if engine.name == "postgresql":
+            try:
+                connection.execute("select postgis_lib_version()")
+            except SQLAlchemyError:
+                tables.extend(SFSQL_TABLES)
+            cascade = " CASCADE"
+        else:
+            tables.extend(SFSQL_TABLES)
+            cascade = ""
+        for name in tables:
+            connection.execute("DROP TABLE IF EXISTS %s%s" % (name, cascade))
+
+
+def load(database, directory, table="records", home=".", batch_size=500):
+    """Create a repository and load every record of a directory into it.
+
+    Parameters
+    ----------
+    database: str
+        SQLAlchemy URL of the repository.
+    directory: str
+        Directory of XML records, as written by ``generator.generate``.
+    table: str, optional
+        Name of the records table.
+    home: str, optional
+        pycsw home directory.
+    batch_size: int, optional
+        Number of records inserted per transaction.
+
+    Returns
+    -------
+    int
+        The number of records loaded.
+
+    """
+
+    reset(database, table)
+    admin.setup_db(database, table, home)
+
+    context = config.StaticContext()
+    repo = repository.Repository(database, context, table=table)
+
+    loaded = 0
+    batch = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.xml"))):
+        exml = etree.parse(path, context.parser)
+        batch.extend(metadata.parse_record(context, exml, repo))
+        if len(batch) >= batch_size:
+            repo.upsert(inserts=batch)
+            loaded += len(batch)
+            batch = []
+    if batch:
+        repo.upsert(inserts=batch)
+        loaded += len(batch)
+
+    repo.engine.dispose()
+    return loaded
@@ -0,0 +1,222 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Run pycsw's end-to-end benchmarks.
+
+Generates a synthetic catalogue, loads it into a repository and times
+each scenario of ``scenarios.py``, reporting throughput and latency
+percentiles. Results can be saved as JSON and compared with those of
+another run, e.g. of another commit:
+
+    python tests/benchmarks/run.py --records 10000 --output before.json
+    git checkout my-branch
+    python tests/benchmarks/run.py --records 10000 --compare before.json
+
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pycsw
+
+import generator
+import loader
+import scenarios
+
+def percentile(values, rank):
+    """Return a percentile of sorted values, interpolating linearly."""
+    if not values:
+        return None
+    position = (len(values) - 1) * rank / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def summarize(durations, errors, elapsed):
+    """Return the statistics of the timed requests of a scenario."""
+    durations = sorted(durations)
+    stats = {
+        "requests": len(durations),
+        "errors": errors,
+        "throughput": len(durations) / elapsed if elapsed else None,
+    }
+    for name, value in [
+            ("mean", sum(durations) / len(durations) if durations else None),
+            ("min", durations[0] if durations else None),
+            ("p50", percentile(durations, 50)),
+            ("p95", percentile(durations, 95)),
+            ("p99", percentile(durations, 99)),
+            ("max", durations[-1] if durations else None)]:
+        stats["%s_ms" % name] = (round(value * 1000, 3)
+                                 if value is not None else None)
+    return stats
+
+
+def run_scenario(client, scenario, iterations, warmup, counter):
+    """Time iterations requests of a scenario, after warmup untimed ones."""
+    errors = 0
+    durations = []
+    started = time.perf_counter()
+    for number in range(warmup + iterations):
+        query, body = scenario.build(next(counter))
+        start = time.perf_counter()
+        status, contents = client.request(query, body)
+        duration = time.perf_counter() - start
+        if number < warmup:
+            started = time.perf_counter()
+            continue
+        durations.append(duration)
+        if scenarios.is_error(status, contents):
+            errors += 1
+    elapsed = time.perf_counter() - started
+    if scenario.cleanup is not None:
+        client.request(body=scenario.cleanup())
+    return summarize(durations, errors, elapsed)
+
+
+def get_commit():
+    """Return the git commit of the code under test, if known."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=scenarios.ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Return lines comparing the p50 and p95 of two runs."""
+    lines = []
+    for name, stats in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        changes = []
+        for key in ["p50_ms", "p95_ms"]:
+            if before.get(key) and stats.get(key) is not None:
+                changes.append("%s %+.1f%%" % (
+                    key[:3], (stats[key] - before[key]) * 100 / before[key]))
+        lines.append("%-24s %s" % (name, ", ".join(changes)))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--records", type=int, default=1000,
+                        help="number of records generated")
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="untimed requests per scenario, run first")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the record and request generators")
+    parser.add_argument("--database",
+                        help="SQLAlchemy URL of the repository; a SQLite "
+                             "database in the working directory by default. "
+                             "Its tables are dropped and recreated")
+    parser.add_argument("--workdir",
+                        help="directory for the records and repository; "
+                             "a temporary directory by default")
+    parser.add_argument("--scenario", action="append",
+                        help="run only this scenario (may be repeated)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON results to compare with")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pycsw-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    database = args.database or "sqlite:///%s" % os.path.join(
+        os.path.abspath(workdir), "records.db")
+    if not loader.is_available(database):
+        parser.error("database %s is not available" % database)
+
+    print("Generating %d records in %s" % (args.records, workdir))
+    records = generator.generate(os.path.join(workdir, "records"),
+                                 args.records, args.seed)
+    print("Loading records into %s" % database)
+    start = time.perf_counter()
+    loaded = loader.load(database, os.path.join(workdir, "records"),
+                         home=scenarios.ROOT)
+    load_time = time.perf_counter() - start
+    print("Loaded %d records in %.1fs" % (loaded, load_time))
+
+    config_path = scenarios.write_config(workdir, database, scenarios.ROOT)
+    client = scenarios.Client(config_path)
+    counter = iter(range(sys.maxsize))
+    results = {
+        "pycsw": pycsw.__version__,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database.split(":")[0],
+        "records": loaded,
+        "load_seconds": round(load_time, 3),
+        "iterations": args.iterations,
+        "date": datetime.utcnow().isoformat() + "Z",
+        "scenarios": {},
+    }
+
+    print("%-24s %9s %9s %9s %9s %7s" % (
+        "scenario", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"))
+    for scenario in scenarios.get_scenarios(records, workdir, args.seed):
+        if args.scenario and scenario.name not in args.scenario:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = run_scenario(client, scenario, args.iterations,
+                                 args.warmup, counter)
+        results["scenarios"][scenario.name] = stats
+        print("%-24s %9.1f %9.2f %9.2f %9.2f %7d" % (
+            scenario.name, stats["throughput"], stats["p50_ms"],
+            stats["p95_ms"], stats["p99_ms"], stats["errors"]))
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print("Results written to %s" % args.output)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        print("Compared with %s (%s):" % (args.compare,
+                                          baseline.get("commit")))
+        print("\n".join(compare(results, baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Benchmark scenarios, run in-process against ``pycsw.wsgi.application``.
+
+Each scenario builds a different request on every iteration, with
+parameters drawn from the generated records, so that results are not
+distorted by a single, cached query.
+
+"""
+
+import io
+import os
+import random
+import wsgiref.util
+
+from pycsw import wsgi
+
+import generator
+
+# pycsw checkout, the home of the benchmark server
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+CONFIG = """[server]
+home={home}
+url=http://localhost/pycsw/csw.py
+mimetype=application/xml; charset=UTF-8
+encoding=UTF-8
+language=en-US
+maxrecords=10
+pretty_print=false
+profiles=apiso
+
+[manager]
+transactions=true
+allowed_ips=127.0.0.1
+
+[metadata:main]
+identification_title=pycsw benchmark catalogue
+identification_abstract=Synthetic records for benchmarking pycsw
+identification_keywords=catalogue,discovery
+identification_keywords_type=theme
+identification_fees=None
+identification_accessconstraints=None
+provider_name=pycsw
+provider_url=https://pycsw.org/
+contact_name=pycsw
+contact_position=None
+contact_address=None
+contact_city=None
+contact_stateorprovince=None
+contact_postalcode=None
+contact_country=None
+contact_phone=None
+contact_fax=None
+contact_email=None
+contact_url=https://pycsw.org/
+contact_hours=None
+contact_instructions=None
+contact_role=pointOfContact
+
+[repository]
+database={database}
+table=records
+"""
+
+NAMESPACES = (
+    'xmlns:csw="http://www.opengis.net/cat/csw/2.0.2" '
+    'xmlns:ogc="http://www.opengis.net/ogc" '
+    'xmlns:gml="http://www.opengis.net/gml" '
+    'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+    'xmlns:dct="http://purl.org/dc/terms/"'
+)
+
+GETRECORDS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<csw:GetRecords {namespaces} service="CSW" version="2.0.2" '
+    'resultType="results" maxRecords="10">'
+    '<csw:Query typeNames="csw:Record">'
+    '<csw:ElementSetName>summary</csw:ElementSetName>'
+    '<csw:Constraint version="1.1.0"><ogc:Filter>{filter}</ogc:Filter>'
+    '</csw:Constraint>{sortby}</csw:Query></csw:GetRecords>'
+)
+
+SORTBY = (
+    '<ogc:SortBy><ogc:SortProperty><ogc:PropertyName>dc:title'
+    '</ogc:PropertyName><ogc:SortOrder>ASC</ogc:SortOrder>'
+    '</ogc:SortProperty></ogc:SortBy>'
+)
+
+BBOX = (
+    '<ogc:BBOX><ogc:PropertyName>ows:BoundingBox</ogc:PropertyName>'
+    '<gml:Envelope><gml:lowerCorner>{miny} {minx}</gml:lowerCorner>'
+    '<gml:upperCorner>{maxy} {maxx}</gml:upperCorner></gml:Envelope>'
+    '</ogc:BBOX>'
+)
+
+ANYTEXT = (
+    '<ogc:PropertyIsLike wildCard="%" singleChar="_" escapeChar="\\">'
+    '<ogc:PropertyName>csw:AnyText</ogc:PropertyName>'
+    '<ogc:Literal>%{keyword}%</ogc:Literal></ogc:PropertyIsLike>'
+)
+
+DATES = (
+    '<ogc:PropertyIsGreaterThanOrEqualTo>'
+    '<ogc:PropertyName>dc:date</ogc:PropertyName>'
+    '<ogc:Literal>{start}</ogc:Literal></ogc:PropertyIsGreaterThanOrEqualTo>'
+    '<ogc:PropertyIsLessThanOrEqualTo>'
+    '<ogc:PropertyName>dc:date</ogc:PropertyName>'
+    '<ogc:Literal>{end}</ogc:Literal></ogc:PropertyIsLessThanOrEqualTo>'
+)
+
+TRANSACTION = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<csw:Transaction {namespaces} service="CSW" version="2.0.2">'
+    '{action}</csw:Transaction>'
+)
+
+DELETE = (
+    '<csw:Delete><csw:Constraint version="1.1.0"><ogc:Filter>'
+    '<ogc:PropertyIsLike wildCard="%" singleChar="_" escapeChar="\\">'
+    '<ogc:PropertyName>dc:identifier</ogc:PropertyName>'
+    '<ogc:Literal>{prefix}%</ogc:Literal></ogc:PropertyIsLike>'
+    '</ogc:Filter></csw:Constraint></csw:Delete>'
+)
+
+HARVEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<csw:Harvest {namespaces} service="CSW" version="2.0.2">'
+    '<csw:Source>{source}</csw:Source>'
+    '<csw:ResourceType>http://www.isotc211.org/schemas/2005/gmd/'
+    '</csw:ResourceType>'
+    '<csw:ResourceFormat>application/xml</csw:ResourceFormat>'
+    '</csw:Harvest>'
+)
+
+TRANSACTION_PREFIX = "urn:uuid:bench-transaction-"
+HARVEST_PREFIX = "urn:uuid:bench-harvest-"
+
+# distinct documents harvested in turn by the Harvest scenario
+HARVEST_FIXTURES = 50
+
+
+class Scenario(object):
+    """A named kind of request.
+
+    ``build`` returns the query string and body (either may be None) of
+    the request of an iteration; ``cleanup``, if set, returns the body of
+    a request run once, untimed, after the last iteration.
+
+    """
+
+    def __init__(self, name, build, cleanup=None):
+        self.name = name
+        self.build = build
+        self.cleanup = cleanup
+
+
+class Client(object):
+    """Send requests to pycsw's WSGI application in-process."""
+
+    def __init__(self, config_path):
+        self.config_path = config_path
+
+    def request(self, query=None, body=None):
+        """Run a request and return its status and response body."""
+        environ = {
+            "PYCSW_CONFIG": self.config_path,
+            "REMOTE_ADDR": "127.0.0.1",
+            "QUERY_STRING": query or "",
+        }
+        if body is not None:
+            data = body.encode("utf-8")
+            environ["REQUEST_METHOD"] = "POST"
+            environ["CONTENT_TYPE"] = "application/xml"
+            environ["CONTENT_LENGTH"] = str(len(data))
+            environ["wsgi.input"] = io.BytesIO(data)
+        else:
+            environ["REQUEST_METHOD"] = "GET"
+        wsgiref.util.setup_testing_defaults(environ)
+
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+
+        contents = b"".join(wsgi.application(environ, start_response))
+        return response["status"], contents
+
+
+def is_error(status, contents):
+    """Return whether a response reports an error."""
+    return (not status.startswith("200") or b"ExceptionReport" in contents or
+            b"<error code=" in contents)
+
+
+def write_config(directory, database, home):
+    """Write the server configuration of a benchmark run."""
+    path = os.path.join(directory, "benchmark.cfg")
+    with open(path, "w") as fh:
+        fh.write(CONFIG.format(home=home, database=database))
+    return path
+
+
+def get_scenarios(records, directory, seed=0):
+    """Return the scenarios to run against a repository of records.
+
+    Parameters
+    ----------
+    records: list
+        Properties of the records loaded, as returned by
+        ``generator.generate``.
+    directory: str
+        Working directory, for the documents harvested.
+    seed: int, optional
+        Seed of the random choice of request parameters.
+
+    Returns
+    -------
+    list
+        ``Scenario`` instances.
+
+    """
+
+    rand = random.Random(seed)
+    words = generator.Generator(seed)
+
+    def record():
+        return rand.choice(records)
+
+    def bbox():
+        properties = record()
+        return BBOX.format(**properties)
+
+    def anytext():
+        return ANYTEXT.format(keyword=words.keywords(1)[0])
+
+    def dates():
+        start = words.date()
+        return DATES.format(start=start.isoformat(),
+                            end=words.date(start).isoformat())
+
+    def getrecords(filter_, sortby=""):
+        return GETRECORDS.format(namespaces=NAMESPACES, filter=filter_,
+                                 sortby=sortby)
+
+    def paging(number):
+        start = max(1, len(records) - rand.randint(0, 100))
+        return ("service=CSW&version=2.0.2&request=GetRecords"
+                "&typenames=csw:Record&elementsetname=brief"
+                "&resulttype=results&sortby=dc:title:A"
+                "&startposition=%d&maxrecords=10" % start, None)
+
+    def opensearch(number):
+        properties = record()
+        return ("mode=opensearch&service=CSW&version=2.0.2"
+                "&request=GetRecords&elementsetname=full&resulttype=results"
+                "&typenames=csw:Record&q=%s&bbox=%s,%s,%s,%s" % (
+                    rand.choice(properties["keywords"]), properties["minx"],
+                    properties["miny"], properties["maxx"],
+                    properties["maxy"]), None)
+
+    def insert(number):
+        properties = words.properties(number, TRANSACTION_PREFIX)
+        document = generator.get_record(properties, "dc")
+        document = document.split("?>", 1)[1]  # no XML declaration
+        return None, TRANSACTION.format(
+            namespaces=NAMESPACES,
+            action="<csw:Insert>%s</csw:Insert>" % document)
+
+    def delete(prefix):
+        return TRANSACTION.format(namespaces=NAMESPACES,
+                                  action=DELETE.format(prefix=prefix))
+
+    fixtures = os.path.join(directory, "harvest")
+    generator.generate(fixtures, HARVEST_FIXTURES, seed + 1, ("iso",),
+                       HARVEST_PREFIX)
+    sources = sorted(os.listdir(fixtures))
+
+    def harvest(number):
+        source = "file://%s" % os.path.abspath(
+            os.path.join(fixtures, sources[number % len(sources)]))
+        return None, HARVEST.format(namespaces=NAMESPACES, source=source)
+
+    return [
+        Scenario("GetRecords-bbox",
+                 lambda number: (None, getrecords(bbox()))),
+        Scenario("GetRecords-anytext",
+                 lambda number: (None, getrecords(anytext()))),
+        Scenario("GetRecords-temporal",
+                 lambda number: (None, getrecords(
+                     "<ogc:And>%s</ogc:And>" % dates()))),
+        Scenario("GetRecords-combined",
+                 lambda number: (None, getrecords(
+                     "<ogc:And>%s%s%s</ogc:And>" % (bbox(), anytext(),
+                                                    dates()), SORTBY))),
+        Scenario("GetRecords-deep-paging", paging),
+        Scenario("GetRecordById",
+                 lambda number: (
+                     "service=CSW&version=2.0.2&request=GetRecordById"
+                     "&elementsetname=full&id=%s" % record()["identifier"],
+                     None)),
+        Scenario("GetDomain",
+                 lambda number: (
+                     "service=CSW&version=2.0.2&request=GetDomain"
+                     "&propertyname=dc:subject", None)),
+        Scenario("OpenSearch", opensearch),
+        Scenario("OAI-PMH-ListRecords",
+                 lambda number: (
+                     "mode=oaipmh&verb=ListRecords&metadataPrefix=oai_dc",
+                     None)),
+        Scenario("Transaction-insert", insert,
+                 lambda: delete(TRANSACTION_PREFIX)),
+        Scenario("Harvest", harvest, lambda: delete(HARVEST_PREFIX)),
+    ]
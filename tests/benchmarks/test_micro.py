@@ -0,0 +1,248 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Micro-benchmarks of pycsw's parsing, translation and rendering hot paths.
+
+Run with ``py.test tests/benchmarks --benchmarks``; see conftest.py.
+
+"""
+
+import wsgiref.util
+
+import pytest
+
+from pycsw import server
+from pycsw.core import metadata, repository, util
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
+from pycsw.core.formats import fmt_json
+from pycsw.ogc.csw import cql
+from pycsw.ogc.fes import fes1, fes2
+from pycsw.ogc.gml import gml3
+
+import generator
+import loader
+import scenarios
+
+pytestmark = pytest.mark.benchmark
+
+RECORDS = 60
+
+ISO = "http://www.isotc211.org/2005/gmd"
+
+FILTER = (
+    '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc" '
+    'xmlns:fes="http://www.opengis.net/fes/2.0" '
+    'xmlns:gml="http://www.opengis.net/gml">%s</ogc:Filter>'
+)
+
+FES1_FILTERS = {
+    "equal": "<ogc:PropertyIsEqualTo><ogc:PropertyName>dc:title"
+             "</ogc:PropertyName><ogc:Literal>Water map of region"
+             "</ogc:Literal></ogc:PropertyIsEqualTo>",
+    "like": scenarios.ANYTEXT.format(keyword="water"),
+    "bbox": scenarios.BBOX.format(minx=-10, miny=35, maxx=30, maxy=60),
+    "dates": "<ogc:And>%s</ogc:And>" % scenarios.DATES.format(
+        start="2000-01-01", end="2010-12-31"),
+    "combined": "<ogc:And>%s%s<ogc:Not>%s</ogc:Not></ogc:And>" % (
+        scenarios.BBOX.format(minx=-10, miny=35, maxx=30, maxy=60),
+        scenarios.ANYTEXT.format(keyword="water"),
+        "<ogc:PropertyIsEqualTo><ogc:PropertyName>dc:type"
+        "</ogc:PropertyName><ogc:Literal>service</ogc:Literal>"
+        "</ogc:PropertyIsEqualTo>"),
+}
+
+FES2_FILTERS = dict(FES1_FILTERS, **{
+    "during": "<fes:During><fes:ValueReference>apiso:TempExtent_begin"
+              "</fes:ValueReference><gml:TimePeriod>"
+              "<gml:beginPosition>2001</gml:beginPosition>"
+              "<gml:endPosition>2004-06-01</gml:endPosition>"
+              "</gml:TimePeriod></fes:During>",
+})
+
+CQL = {
+    "simple": "csw:AnyText like '%water%'",
+    "and": "dc:title like '%map%' and dc:date > '2000-01-01' and "
+           "dc:type = 'dataset'",
+    "or": "dc:subject = 'water' or dc:subject = 'soil' or "
+          "dc:subject = 'ice'",
+}
+
+GEOMETRIES = {
+    "point": '<gml:Point><gml:pos>45.2 -75.5</gml:pos></gml:Point>',
+    "polygon": '<gml:Polygon><gml:exterior><gml:LinearRing><gml:posList>'
+               '40 -80 40 -70 50 -70 50 -80 40 -80</gml:posList>'
+               '</gml:LinearRing></gml:exterior></gml:Polygon>',
+    "envelope-3857": '<gml:Envelope srsName="urn:ogc:def:crs:EPSG::3857">'
+                     '<gml:lowerCorner>-8400000 5000000</gml:lowerCorner>'
+                     '<gml:upperCorner>-8300000 5100000</gml:upperCorner>'
+                     '</gml:Envelope>',
+}
+
+SPATIAL = {
+    "bbox": ("POLYGON((0 0, 0 10, 10 10, 10 0, 0 0))",
+             "POLYGON((5 5, 5 15, 15 15, 15 5, 5 5))", "bbox", 0),
+    "within": ("POLYGON((2 2, 2 4, 4 4, 4 2, 2 2))",
+               "POLYGON((0 0, 0 10, 10 10, 10 0, 0 0))", "within", 0),
+    "dwithin": ("POINT(1 1)", "POINT(2 2)", "dwithin", 2),
+}
+
+
+@pytest.fixture(scope="session")
+def catalogue(tmp_path_factory):
+    """Generated records, loaded in a SQLite repository."""
+    directory = tmp_path_factory.mktemp("catalogue")
+    records = generator.generate(str(directory / "records"), RECORDS)
+    database = "sqlite:///%s" % (directory / "records.db")
+    loader.load(database, str(directory / "records"), home=str(directory))
+    config = scenarios.write_config(str(directory), database, scenarios.ROOT)
+    return records, config
+
+
+@pytest.fixture(scope="session")
+def csw_server(catalogue):
+    """Return a server which has run a GetRecords request."""
+    servers = {}
+
+    def get(version, esn):
+        if (version, esn) not in servers:
+            env = {
+                "REQUEST_METHOD": "GET",
+                "QUERY_STRING": "service=CSW&version=%s&request=GetRecords"
+                                "&typenames=csw:Record&elementsetname=%s" % (
+                                    version, esn),
+                "REMOTE_ADDR": "127.0.0.1",
+            }
+            wsgiref.util.setup_testing_defaults(env)
+            csw = server.Csw(catalogue[1], env)
+            csw.dispatch_wsgi()
+            servers[(version, esn)] = csw
+        return servers[(version, esn)]
+
+    return get
+
+
+@pytest.fixture(scope="session")
+def documents():
+    """One generated record per format, as bytes."""
+    properties = generator.Generator().properties(0)
+    return dict((format_, generator.get_record(
+        properties, format_).encode("utf-8"))
+        for format_ in generator.FORMATS)
+
+
+@pytest.mark.parametrize("name", sorted(FES1_FILTERS))
+def test_fes1_parse(benchmark, csw_server, name):
+    repo = csw_server("2.0.2", "full").repository
+    element = etree.fromstring(FILTER % FES1_FILTERS[name])
+    namespaces = StaticContext().namespaces
+    benchmark(lambda: fes1.parse(
+        element, repo.queryables["_all"], repo.dbtype, namespaces,
+        fts=repo.fts, facets=repo.facets, shadows=repo.shadows))
+
+
+@pytest.mark.parametrize("name", sorted(FES2_FILTERS))
+def test_fes2_parse(benchmark, csw_server, name):
+    repo = csw_server("3.0.0", "full").repository
+    element = etree.fromstring(FILTER % FES2_FILTERS[name])
+    namespaces = StaticContext().namespaces
+    benchmark(lambda: fes2.parse(
+        element, repo.queryables["_all"], repo.dbtype, namespaces,
+        fts=repo.fts, facets=repo.facets, shadows=repo.shadows))
+
+
+@pytest.mark.parametrize("name", sorted(CQL))
+def test_cql2fes1(benchmark, name):
+    namespaces = StaticContext().namespaces
+    benchmark(lambda: cql.cql2fes1(CQL[name], namespaces))
+
+
+@pytest.mark.parametrize("name", sorted(GEOMETRIES))
+def test_gml3_geometry(benchmark, name):
+    namespaces = StaticContext().namespaces
+    element = etree.fromstring(FILTER % GEOMETRIES[name])
+    benchmark(lambda: gml3.Geometry(element, namespaces))
+
+
+@pytest.mark.parametrize("format_", generator.FORMATS)
+def test_parse_record(benchmark, csw_server, documents, format_):
+    context = StaticContext()
+    repo = csw_server("2.0.2", "full").repository
+    benchmark(lambda: metadata.parse_record(context, documents[format_],
+                                            repo))
+
+
+def test_get_anytext(benchmark, documents):
+    element = etree.fromstring(documents["iso"])
+    benchmark(lambda: util.get_anytext(element))
+
+
+@pytest.mark.parametrize("name", sorted(SPATIAL))
+def test_query_spatial(benchmark, name):
+    benchmark(lambda: repository.query_spatial(*SPATIAL[name]))
+
+
+def test_get_spatial_overlay_rank(benchmark):
+    target, query = SPATIAL["bbox"][:2]
+    benchmark(lambda: repository.get_spatial_overlay_rank(target, query))
+
+
+@pytest.mark.parametrize("esn", ["brief", "summary", "full"])
+def test_csw3_write_record(benchmark, csw_server, esn):
+    csw = csw_server("3.0.0", esn)
+    records = csw.repository.session.query(csw.repository.dataset).all()
+
+    def write():
+        for record in records:
+            csw.iface._write_record(record, csw.iface._get_record_plan())
+
+    benchmark(write)
+
+
+@pytest.mark.parametrize("esn", ["brief", "summary", "full"])
+def test_apiso_write_record(benchmark, csw_server, esn):
+    csw = csw_server("2.0.2", esn)
+    profile = csw.profiles["loaded"][ISO]
+    queryables = csw.repository.queryables["_all"]
+    records = csw.repository.session.query(csw.repository.dataset).filter(
+        csw.repository.dataset.typename == "gmd:MD_Metadata").all()
+
+    def write():
+        for record in records:
+            profile.write_record(record, esn, ISO, queryables)
+
+    benchmark(write)
+
+
+def test_xml2json(benchmark, csw_server):
+    csw = csw_server("3.0.0", "full")
+    response = csw.response
+    if not isinstance(response, bytes):
+        response = etree.tostring(response)
+    namespaces = csw.context.namespaces
+    benchmark(lambda: fmt_json.xml2json(response, namespaces))
@@ -28,6 +28,8 @@
 # =================================================================
 """pytest configuration file"""
 
+import os
+
 import pytest
 
 
@@ -46,6 +48,20 @@ def pytest_configure(config):
         "markers",
         "unit: Run only unit tests"
     )
+    config.addinivalue_line(
+        "markers",
+        "benchmark: Run only micro-benchmarks (needs --benchmarks)"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip micro-benchmarks unless they were asked for."""
+    if config.getoption("benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="micro-benchmarks run with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
 
 
 def pytest_addoption(parser):
@@ -101,6 +117,30 @@ def pytest_addoption(parser):
         help="When running functional tests, save each test's result under "
              "the input directory path."
     )
+    parser.addoption(
+        "--benchmarks",
+        action="store_true",
+        help="Run the micro-benchmarks, which are skipped otherwise."
+    )
+    parser.addoption(
+        "--benchmark-baseline",
+        default=os.path.join(os.path.dirname(__file__), "benchmarks",
+                             "baseline.json"),
+        help="JSON file with the baseline timings of the micro-benchmarks."
+    )
+    parser.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=30.0,
+        help="Fail a micro-benchmark slower than its baseline by more than "
+             "this percentage."
+    )
+    parser.addoption(
+        "--benchmark-save",
+        action="store_true",
+        help="Write the micro-benchmark timings to the baseline file instead "
+             "of comparing them with it."
+    )
 
 
 @pytest.fixture(scope="session")
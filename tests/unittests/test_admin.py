@@ -0,0 +1,76 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.admin"""
+
+import json
+
+import pytest
+
+from pycsw.core import admin
+
+pytestmark = pytest.mark.unit
+
+COLUMNS = ["identifier", "typename", "title", "insert_date", "date_epoch"]
+
+
+@pytest.mark.parametrize("where, equalities, ranges", [
+    ("typename = :pvalue0 and date_epoch > :pvalue1",
+     {"typename"}, {"date_epoch"}),
+    ("title like :pvalue0 or title = 'insert_date = 1'", {"title"}, set()),
+    ("date_epoch between :pvalue0 and :pvalue1", set(), {"date_epoch"}),
+    ("identifier in (select record_id from records_facets "
+     "where facet = 'keywords' and value = :pvalue0)", {"identifier"}, set()),
+    (None, set(), set()),
+])
+def test_get_where_columns(where, equalities, ranges):
+    assert admin.get_where_columns(where, COLUMNS) == (equalities, ranges)
+
+
+def test_advise_db_indexes(tmpdir):
+    database = "sqlite:///%s" % tmpdir.join("records.db")
+    admin.setup_db(database, "records", str(tmpdir))
+    query_log = tmpdir.join("query.log")
+    query_log.write("\n".join(json.dumps(entry) for entry in [
+        {"where": "typename = :pvalue0", "sortby": "insert_date"},
+        {"where": "typename = :pvalue0 and title like :pvalue1",
+         "sortby": "insert_date"},
+        {"where": "identifier in (:pvalue0)", "sortby": None},
+    ]))
+
+    report = admin.advise_db_indexes(database, "records", str(query_log),
+                                     repo_filter="mdsource = 'local'")
+
+    assert "Queries analysed: 3" in report.splitlines()
+    assert "DROP INDEX ix_records_title;  -- (title)" in report
+    assert "DROP INDEX ix_records_typename;" not in report
+    assert "DROP INDEX ix_records_mdsource;" not in report
+    assert ("CREATE INDEX ix_records_typename_insert_date ON records "
+            "(typename, insert_date) WHERE mdsource = 'local';  -- 2 queries"
+            in report)
+    assert "(identifier)" not in report
@@ -0,0 +1,156 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.admission"""
+
+import configparser
+import os
+import threading
+import time
+
+import pytest
+
+from pycsw import server
+from pycsw.core import admission
+
+pytestmark = pytest.mark.unit
+
+SUITE = os.path.join(os.path.dirname(__file__), "..", "functionaltests",
+                     "suites")
+
+SOAP = b"""<?xml version="1.0"?>
+<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope">
+  <soap:Header><Security/></soap:Header>
+  <soap:Body>
+    <csw:Harvest xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"/>
+  </soap:Body>
+</soap:Envelope>"""
+
+
+@pytest.mark.parametrize("kvp, body, expected", [
+    ({"service": "CSW", "REQUEST": "GetRecords"}, None, "GetRecords"),
+    ({"mode": "oaipmh", "verb": "GetRecord"}, None, "GetRecordById"),
+    ({"mode": "oaipmh", "verb": "Identify"}, None, "GetCapabilities"),
+    ({"mode": "sru", "operation": "searchRetrieve"}, None, "GetRecords"),
+    ({}, b'<csw:Transaction xmlns:csw="http://www.opengis.net/cat/csw/3.0"/>',
+     "Transaction"),
+    ({}, SOAP, "Harvest"),
+    ({}, b"<not xml", "unknown"),
+])
+def test_get_operation(kvp, body, expected):
+    assert admission.get_operation(kvp, body) == expected
+
+
+def test_limits_and_priority():
+    limiter = admission.Limiter()
+    limiter.configure(admission.get_limits("*=1, Harvest=1"),
+                      admission.get_limits("*=5,GetRecords=0", float))
+
+    first = limiter.acquire("GetRecords")
+    assert limiter.acquire("GetRecords") is None
+
+    admitted = []
+
+    def request(operation):
+        ticket = limiter.acquire(operation)
+        admitted.append(operation)
+        limiter.release(ticket)
+
+    threads = [threading.Thread(target=request, args=(operation,))
+               for operation in ["Harvest", "GetRecordById"]]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)  # in order of arrival
+    limiter.release(first)
+    for thread in threads:
+        thread.join()
+
+    assert admitted == ["GetRecordById", "Harvest"]
+
+    with pytest.raises(RuntimeError):
+        admission.get_limits("GetRecords:4")
+
+
+@pytest.mark.skipif(admission.fcntl is None, reason="needs fcntl")
+def test_lock_directory(tmpdir):
+    workers = [admission.Limiter(), admission.Limiter()]
+    for limiter in workers:
+        limiter.configure({"Harvest": 1}, {"Harvest": 0.05}, str(tmpdir))
+
+    ticket = workers[0].acquire("Harvest")
+    assert ticket is not None
+    assert workers[1].acquire("Harvest") is None
+    assert workers[1]._active["Harvest"] == 0
+
+    workers[0].release(ticket)
+    workers[1].release(workers[1].acquire("Harvest"))
+
+
+def test_rejected_requests():
+    config = configparser.ConfigParser()
+    config.read(os.path.join(SUITE, "default", "default.cfg"))
+    config.set("repository", "database", "sqlite:///%s" % os.path.abspath(
+        os.path.join(SUITE, "cite", "data", "cite.db")))
+    config.set("server", "admission_limits", "GetCapabilities=1")
+    config.set("server", "admission_retry_after", "3")
+    env = {
+        "REQUEST_METHOD": "GET",
+        "QUERY_STRING": "service=CSW&version=2.0.2&request=GetCapabilities",
+        "REMOTE_ADDR": "127.0.0.1",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "wsgi.url_scheme": "http",
+    }
+
+    try:
+        csw = server.Csw(config, env)
+        ticket = admission.LIMITER.acquire("GetCapabilities")
+        status, contents = csw.dispatch_wsgi()
+        admission.LIMITER.release(ticket)
+
+        assert status == "503 Service Unavailable"
+        assert b"Too many concurrent GetCapabilities requests" in contents
+        assert b"http://www.opengis.net/ows" in contents  # CSW 2.0.2
+        assert csw.get_response_headers() == {"Retry-After": "3"}
+        assert csw.admission_rejected == "GetCapabilities"
+
+        status, contents = server.Csw(config, env).dispatch_wsgi()
+        assert status == "200 OK"
+
+        # client supplied operations are not metrics label values
+        config.set("server", "admission_limits", "*=1")
+        env["QUERY_STRING"] = "service=CSW&version=2.0.2&request=Bogus123"
+        csw = server.Csw(config, env)
+        ticket = admission.LIMITER.acquire("GetCapabilities")
+        status, contents = csw.dispatch_wsgi()
+        admission.LIMITER.release(ticket)
+
+        assert status == "503 Service Unavailable"
+        assert csw.admission_rejected == "invalid"
+    finally:
+        admission.LIMITER.configure({})
@@ -0,0 +1,137 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.ogc.fes.fes2"""
+
+import pytest
+
+from pycsw.core import util
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
+from pycsw.ogc.fes import fes2
+
+pytestmark = pytest.mark.unit
+
+QUERYABLES = {
+    "csw:AnyText": {"dbcol": "anytext"},
+    "dc:date": {"dbcol": "date"},
+    "apiso:TempExtent_begin": {"dbcol": "time_begin"},
+    "apiso:Denominator": {"dbcol": "denominator"},
+    "pycsw:TempExtent_begin": "time_begin",
+    "pycsw:TempExtent_end": "time_end",
+    "pycsw:BoundingBox": "wkt_geometry",
+}
+
+SHADOWS = {
+    "date": ("date_epoch", util.get_time_epoch),
+    "time_begin": ("time_begin_epoch", util.get_time_epoch),
+    "time_end": ("time_end_epoch", util.get_time_epoch),
+    "denominator": ("denominator_number", util.get_number),
+}
+
+
+def _parse(predicate, shadows=None, dbtype="sqlite"):
+    context = StaticContext()
+    element = etree.fromstring(
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc" '
+        'xmlns:fes="http://www.opengis.net/fes/2.0" '
+        'xmlns:gml="http://www.opengis.net/gml">%s</ogc:Filter>' % predicate)
+    return fes2.parse(element, QUERYABLES, dbtype, context.namespaces,
+                      shadows=shadows)
+
+
+def test_during_temporal_extent():
+    where, values = _parse(
+        "<fes:During><fes:ValueReference>apiso:TempExtent_begin"
+        "</fes:ValueReference><gml:TimePeriod>"
+        "<gml:beginPosition>2001</gml:beginPosition>"
+        "<gml:endPosition>2004-06-01</gml:endPosition>"
+        "</gml:TimePeriod></fes:During>", SHADOWS)
+    assert where == ("(time_begin_epoch > :pvalue0 and "
+                     "time_end_epoch < :pvalue1)")
+    assert values == [978307200, 1086048000]
+
+
+def test_any_interacts_open_period_without_shadows():
+    where, values = _parse(
+        "<fes:AnyInteracts><fes:ValueReference>dc:date</fes:ValueReference>"
+        "<gml:TimePeriod><gml:beginPosition>2001</gml:beginPosition>"
+        "<gml:endPosition indeterminatePosition=\"unknown\"/>"
+        "</gml:TimePeriod></fes:AnyInteracts>")
+    assert where == "(date >= :pvalue0)"
+    assert values == ["2001"]
+
+
+def test_after_invalid_time():
+    with pytest.raises(RuntimeError):
+        _parse("<fes:After><fes:ValueReference>dc:date</fes:ValueReference>"
+               "<gml:TimeInstant><gml:timePosition>yesterday"
+               "</gml:timePosition></gml:TimeInstant></fes:After>", SHADOWS)
+
+
+@pytest.mark.parametrize("literal, expected_where, expected_values", [
+    ("2004-05", "date_epoch < :pvalue0", [1083369600]),
+    ("unknown", "date < :pvalue0", ["unknown"]),
+])
+def test_comparison_shadow_column(literal, expected_where, expected_values):
+    where, values = _parse(
+        "<ogc:PropertyIsLessThan><ogc:PropertyName>dc:date</ogc:PropertyName>"
+        "<ogc:Literal>%s</ogc:Literal></ogc:PropertyIsLessThan>" % literal,
+        SHADOWS)
+    assert where == expected_where
+    assert values == expected_values
+
+
+def test_between_numeric_shadow_column():
+    where, values = _parse(
+        "<ogc:PropertyIsBetween>"
+        "<ogc:PropertyName>apiso:Denominator</ogc:PropertyName>"
+        "<ogc:LowerBoundary><ogc:Literal>5000</ogc:Literal></ogc:LowerBoundary>"
+        "<ogc:UpperBoundary><ogc:Literal>25000</ogc:Literal></ogc:UpperBoundary>"
+        "</ogc:PropertyIsBetween>", SHADOWS)
+    assert where == "denominator_number between :pvalue0 and :pvalue1"
+    assert values == [5000.0, 25000.0]
+
+
+@pytest.mark.parametrize("operator, function", [
+    ("BBOX", "mbrintersects"),
+    ("Within", "st_within"),
+])
+def test_spatial_mysql_native(operator, function):
+    where, values = _parse(
+        "<ogc:%s><ogc:PropertyName>ows:BoundingBox</ogc:PropertyName>"
+        "<gml:Envelope srsName=\"urn:ogc:def:crs:EPSG::4326\">"
+        "<gml:lowerCorner>10 -20</gml:lowerCorner>"
+        "<gml:upperCorner>40 30</gml:upperCorner>"
+        "</gml:Envelope></ogc:%s>" % (operator, operator),
+        dbtype="mysql+native")
+    assert where == (
+        "%s(wkb_geometry, st_geomfromtext('POLYGON((-20.00 10.00, "
+        "-20.00 40.00, 30.00 40.00, 30.00 10.00, -20.00 10.00))', 4326, "
+        "'axis-order=long-lat')) = true" % function)
+    assert values == []
@@ -0,0 +1,122 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.httpclient"""
+
+import mock
+import pytest
+
+from pycsw.core import httpclient
+
+pytestmark = pytest.mark.unit
+
+
+def _response(status_code=200, content=b"", headers=None):
+    response = mock.MagicMock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture
+def client(tmpdir):
+    client = httpclient.HttpClient(cachedir=str(tmpdir))
+    client.session = mock.MagicMock()
+    return client
+
+
+def test_request_counts_per_host(client):
+    client.session.request.return_value = _response(content=b"12345")
+    assert client.request("GET", "http://host/a") == b"12345"
+    client.request("GET", "http://host/b")
+    client.request("GET", "http://other/c")
+    assert client.get_stats() == {
+        "host": {"requests": 2, "bytes": 10, "cache_hits": 0},
+        "other": {"requests": 1, "bytes": 5, "cache_hits": 0},
+    }
+
+
+def test_request_revalidates_with_validators(client):
+    client.session.request.return_value = _response(
+        content=b"<xml/>",
+        headers={"ETag": '"abc"',
+                 "Last-Modified": "Mon, 01 Jan 2018 00:00:00 GMT"})
+    assert client.request("GET", "http://host/a.xml") == b"<xml/>"
+
+    client.session.request.return_value = _response(status_code=304)
+    assert client.request("GET", "http://host/a.xml") == b"<xml/>"
+    headers = client.session.request.call_args[1]["headers"]
+    assert headers["If-None-Match"] == '"abc"'
+    assert headers["If-Modified-Since"] == "Mon, 01 Jan 2018 00:00:00 GMT"
+    assert client.get_stats()["host"]["cache_hits"] == 1
+
+
+def test_request_serves_fresh_responses_from_cache(client):
+    client.session.request.return_value = _response(
+        content=b"<xml/>", headers={"Cache-Control": "max-age=3600"})
+    client.request("GET", "http://host/a.xml")
+    assert client.request("GET", "http://host/a.xml") == b"<xml/>"
+    assert client.session.request.call_count == 1
+
+
+@pytest.mark.parametrize("headers", [
+    {"Cache-Control": "no-store", "ETag": '"abc"'},
+    {},
+])
+def test_request_does_not_cache(client, headers):
+    client.session.request.return_value = _response(
+        content=b"<xml/>", headers=headers)
+    client.request("GET", "http://host/a.xml")
+    client.request("GET", "http://host/a.xml")
+    assert "If-None-Match" not in client.session.request.call_args[1][
+        "headers"]
+    assert client.session.request.call_count == 2
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"Cache-Control": "max-age=60"}, 60),
+    ({"Cache-Control": "no-cache, max-age=60"}, 0),
+    ({"Date": "Mon, 01 Jan 2018 00:00:00 GMT",
+      "Expires": "Mon, 01 Jan 2018 00:10:00 GMT"}, 600),
+    ({"Last-Modified": "Mon, 01 Jan 2018 00:00:00 GMT"}, 0),
+])
+def test_freshness_lifetime(headers, expected):
+    cache_control = httpclient._parse_cache_control(
+        headers.get("Cache-Control"))
+    assert httpclient._freshness_lifetime(headers, cache_control) == expected
+
+
+def test_retries_server_responses_only():
+    client = httpclient.HttpClient(retries=3)
+    retry = client.session.get_adapter("http://example.org").max_retries
+
+    assert retry.total == 3
+    assert retry.connect == 0
+    assert retry.read == 0
+    assert 503 in retry.status_forcelist
@@ -0,0 +1,150 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.memory"""
+
+import configparser
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+from pycsw import server
+from pycsw.core import memory, tracing
+from pycsw.plugins.outputschemas import atom
+
+pytestmark = pytest.mark.unit
+
+SUITE = os.path.join(os.path.dirname(__file__), "..", "functionaltests",
+                     "suites")
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"),
+                    reason="RSS is read from /proc")
+def test_rss():
+    usage = memory.Usage("rss")
+    usage.stop()
+
+    assert usage.rss > 0
+    assert usage.rss_delta is not None
+    assert usage.peak is None
+
+    with pytest.raises(RuntimeError):
+        memory.Usage("heap")
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="needs reset_peak")
+def test_tracemalloc_peak():
+    tracing = tracemalloc.is_tracing()
+    try:
+        usage = memory.Usage("tracemalloc")
+        data = bytearray(10 * 1024 * 1024)
+        del data
+        usage.stop()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    assert usage.peak >= 10 * 1024 * 1024
+    assert set(usage.to_dict()) == {"rss_bytes", "rss_delta_bytes",
+                                    "peak_bytes"}
+
+
+def _request(query, **options):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(SUITE, "default", "default.cfg"))
+    config.set("repository", "database", "sqlite:///%s" % os.path.abspath(
+        os.path.join(SUITE, "cite", "data", "cite.db")))
+    for key, value in options.items():
+        config.set("server", key, value)
+    env = {
+        "REQUEST_METHOD": "GET",
+        "QUERY_STRING": query,
+        "REMOTE_ADDR": "127.0.0.1",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "wsgi.url_scheme": "http",
+    }
+    csw = server.Csw(config, env)
+    status, contents = csw.dispatch_wsgi()
+    csw.finish_trace()
+    return csw, contents
+
+
+def test_record_budget():
+    query = ("service=CSW&version=2.0.2&request=GetRecords"
+             "&typenames=csw:Record&elementsetname=brief&resulttype=results"
+             "&maxrecords=8")
+
+    csw, contents = _request(query, max_response_records="3",
+                             memory_tracking="rss")
+
+    assert b'numberOfRecordsReturned="3"' in contents
+    assert b'nextRecord="4"' in contents
+    assert csw.budget_exceeded == "records"
+    assert csw.records_returned == 3
+    assert csw.trace.attributes["memory.rss_bytes"] == csw.memory.rss
+    assert tracing.get_trace() is None
+
+    csw, contents = _request("service=CSW&version=2.0.2&request=GetRecordById"
+                             "&id=a,b,c,d", max_response_records="3")
+
+    assert b"Too many ids" in contents
+    assert csw.trace is None  # no consumer configured
+
+
+def test_byte_budget(monkeypatch):
+    query = ("service=CSW&version=2.0.2&request=GetRecords"
+             "&typenames=csw:Record&elementsetname=full&resulttype=results")
+
+    csw, contents = _request(query, max_response_bytes="2000")
+
+    assert csw.exception
+    assert csw.budget_exceeded == "bytes"
+    assert b"exceeds the limit of 2000 bytes" in contents
+    assert b"SearchResults" not in contents
+    # records after the budget is exceeded are not rendered
+    assert 0 < csw.records_returned < 10
+    assert csw.response_bytes > 2000
+
+    rendered = []
+    write_record = atom.write_record
+
+    def counting_write_record(*args):
+        rendered.append(args[0])
+        return write_record(*args)
+
+    monkeypatch.setattr(atom, "write_record", counting_write_record)
+    csw, contents = _request(
+        query + "&outputschema=http://www.w3.org/2005/Atom",
+        max_response_bytes="2000")
+
+    assert csw.budget_exceeded == "bytes"
+    assert b"exceeds the limit of 2000 bytes" in contents
+    assert 0 < len(rendered) < 10
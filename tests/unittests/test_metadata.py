@@ -28,9 +28,13 @@
 # =================================================================
 """Unit tests for pycsw.core.metadata"""
 
+import os
+
 import pytest
 
-from pycsw.core import metadata
+from pycsw.core import admin, metadata, repository
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
 
 pytestmark = pytest.mark.unit
 
@@ -53,3 +57,70 @@ def test_bbox_from_polygons_invalid():
     bboxes = "stuff"
     with pytest.raises(RuntimeError):
         metadata.bbox_from_polygons(bboxes)
+
+
+def test_harvest_checkpoint(tmpdir):
+    source = "http://example.org/csw"
+    checkpoint = metadata.HarvestCheckpoint(str(tmpdir), source)
+    assert checkpoint.position == 1
+    assert not checkpoint.resumed
+    checkpoint.save(21)
+
+    resumed = metadata.HarvestCheckpoint(str(tmpdir), source)
+    assert resumed.position == 21
+    assert resumed.resumed
+    assert metadata.HarvestCheckpoint(str(tmpdir), source + "2").position == 1
+
+    resumed.clear()
+    assert metadata.HarvestCheckpoint(str(tmpdir), source).position == 1
+
+
+def test_waf_harvest_state(tmpdir):
+    source = "http://example.org/waf"
+    state = metadata.WafHarvestState(str(tmpdir), source)
+    state.listed.update(["a.xml", "b.xml", "c.xml"])
+    state.update("a.xml", {"ETag": '"1"'}, "hash-a", "id-a")
+    state.update("b.xml", {}, "hash-b", "id-b")
+    state.update("c.xml", {}, "hash-c", "id-c")
+    assert state.removed() == []
+    state.save()
+
+    state = metadata.WafHarvestState(str(tmpdir), source)
+    assert state.files["a.xml"] == {
+        "etag": '"1"', "hash": "hash-a", "identifier": "id-a"}
+    # c.xml is gone, b.xml now describes another record, and d.xml
+    # took over the record of c.xml
+    state.listed.update(["a.xml", "b.xml", "d.xml"])
+    state.update("a.xml", {"Last-Modified": "Mon, 01 Jan 2018 00:00:00 GMT"})
+    state.update("b.xml", {}, "hash-b2", "id-b2")
+    state.update("d.xml", {}, "hash-d", "id-c")
+    assert state.files["a.xml"]["identifier"] == "id-a"
+    assert state.removed() == ["id-b"]
+    state.save()
+
+    state = metadata.WafHarvestState(str(tmpdir), source)
+    assert sorted(state.files) == ["a.xml", "b.xml", "d.xml"]
+
+
+@pytest.mark.parametrize("filename", [
+    "3e9a8c05.xml",
+    "T_ortho_RAS_1998_284404.xml",
+    "pacioos-NS06agg.xml",
+])
+def test_parse_iso_xpath_matches_owslib(tmpdir, filename):
+    database = "sqlite:///%s" % tmpdir.join("records.db")
+    admin.setup_db(database, "records", str(tmpdir))
+    context = StaticContext()
+    repo = repository.Repository(database, context, table="records")
+    path = os.path.join(os.path.dirname(__file__), os.pardir,
+                        "functionaltests", "suites", "apiso", "data", filename)
+    exml = etree.parse(path, context.parser).getroot()
+
+    columns = {}
+    for parser in ("owslib", "xpath"):
+        context.iso_parser = parser
+        record = metadata._parse_iso(context, repo, exml)
+        columns[parser] = dict(
+            (key, value) for key, value in record.__dict__.items()
+            if key not in ("_sa_instance_state", "insert_date"))
+    assert columns["xpath"] == columns["owslib"]
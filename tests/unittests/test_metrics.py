@@ -0,0 +1,85 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.metrics"""
+
+import json
+import os
+
+import pytest
+
+from pycsw.core import metrics
+
+pytestmark = pytest.mark.unit
+
+
+def test_render():
+    registry = metrics.Registry()
+    labels = {"operation": "GetRecords", "version": "3.0.0", "mode": "csw"}
+    registry.inc("pycsw_requests_total", labels)
+    registry.inc("pycsw_requests_total", labels)
+    registry.observe("pycsw_request_duration_seconds", labels, 0.3)
+    registry.set("pycsw_http_client_requests_total",
+                 {"host": 'a"b'}, 5)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE pycsw_requests_total counter" in lines
+    assert ('pycsw_requests_total{mode="csw",operation="GetRecords",'
+            'version="3.0.0"} 2.0') in lines
+    buckets = [line for line in lines
+               if line.startswith("pycsw_request_duration_seconds_bucket")]
+    assert len(buckets) == len(metrics.LATENCY_BUCKETS) + 1
+    assert buckets[0].endswith('le="0.005"} 0.0')
+    assert buckets[6].endswith('le="0.5"} 1.0')
+    assert buckets[-1].endswith('le="+Inf"} 1.0')
+    assert ('pycsw_request_duration_seconds_sum{mode="csw",'
+            'operation="GetRecords",version="3.0.0"} 0.3') in lines
+    assert 'pycsw_http_client_requests_total{host="a\\"b"} 5.0' in lines
+    assert not any("pycsw_harvest" in line for line in lines)
+
+
+def test_collect_across_processes(tmpdir):
+    registry = metrics.Registry(str(tmpdir))
+    registry.inc("pycsw_records_returned_total", {"operation": "GetRecords"}, 3)
+    registry.set("pycsw_db_pool_connections", {"state": "checked_out"}, 1)
+    registry.flush()
+    assert tmpdir.join("pycsw_%d.json" % os.getpid()).check()
+
+    # a worker that has exited
+    tmpdir.join("pycsw_999999999.json").write(json.dumps([
+        ["pycsw_records_returned_total", [["operation", "GetRecords"]], 4],
+        ["pycsw_db_pool_connections", [["state", "checked_out"]], 2],
+    ]))
+
+    values = registry.collect()
+
+    assert values[("pycsw_records_returned_total",
+                   (("operation", "GetRecords"),))] == 7
+    assert values[("pycsw_db_pool_connections",
+                   (("state", "checked_out"),))] == 1
@@ -0,0 +1,113 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.profiling"""
+
+import configparser
+import os
+import pstats
+import time
+
+import pytest
+
+from pycsw import server
+from pycsw.core import profiling
+
+pytestmark = pytest.mark.unit
+
+SUITE = os.path.join(os.path.dirname(__file__), "..", "functionaltests",
+                     "suites")
+
+
+def _work():
+    time.sleep(0.02)
+    return sum(range(1000))
+
+
+def test_pstats(tmpdir):
+    profile = profiling.Profile("pstats")
+
+    assert profile.run(_work) == 499500
+    path = profile.save(str(tmpdir.join("profiles")), "GetRecords", "abc")
+
+    assert os.path.basename(path).endswith("-GetRecords-abc.pstats")
+    stats = pstats.Stats(path)
+    assert any(name == "_work" for _, _, name in stats.stats)
+
+
+def test_speedscope(tmpdir):
+    profile = profiling.Profile("speedscope")
+
+    assert profile.run(_work) == 499500
+    document = profile.get_speedscope("GetRecords abc")
+
+    frames = document["shared"]["frames"]
+    sampled = document["profiles"][0]
+    assert sampled["type"] == "sampled"
+    assert len(sampled["samples"]) == len(sampled["weights"]) > 0
+    # stacks start at the profiled function
+    assert all(frames[sample[0]]["name"] == "_work"
+               for sample in sampled["samples"])
+    assert profile.save(str(tmpdir), "OAI-PMH:Identify", "abc").endswith(
+        "-OAI-PMH_Identify-abc.speedscope.json")
+
+    with pytest.raises(RuntimeError):
+        profiling.Profile("callgrind")
+
+
+@pytest.mark.parametrize("remote_addr, header, query, profiled", [
+    ("127.0.0.1", "true", "", True),
+    ("127.0.0.1", None, "&pycsw_profile=true", True),
+    ("127.0.0.1", None, "", False),
+    ("192.168.0.1", "true", "", False),
+])
+def test_requested_profiles(tmpdir, remote_addr, header, query, profiled):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(SUITE, "default", "default.cfg"))
+    config.set("repository", "database", "sqlite:///%s" % os.path.abspath(
+        os.path.join(SUITE, "cite", "data", "cite.db")))
+    config.set("server", "profile_dir", str(tmpdir))
+    env = {
+        "REQUEST_METHOD": "GET",
+        "QUERY_STRING": "service=CSW&request=GetCapabilities" + query,
+        "REMOTE_ADDR": remote_addr,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "wsgi.url_scheme": "http",
+    }
+    if header is not None:
+        env["HTTP_X_PYCSW_PROFILE"] = header
+
+    csw = server.Csw(config, env)
+    status, contents = csw.dispatch_wsgi()
+    csw.finish_trace()
+
+    assert b"Capabilities" in contents
+    assert [os.path.basename(path).endswith(
+        "-GetCapabilities-%s.pstats" % csw.trace.trace_id)
+        for path in tmpdir.listdir()] == ([True] if profiled else [])
@@ -0,0 +1,75 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.recordcache"""
+
+import pytest
+
+from pycsw.core import recordcache
+
+pytestmark = pytest.mark.unit
+
+
+def test_disabled_by_default():
+    cache = recordcache.RecordCache()
+    assert not cache.enabled
+    cache.set(("id1", "2018"), {"xml": "<a/>"})
+    assert cache.get(("id1", "2018")) is None
+
+
+def test_lru_eviction():
+    cache = recordcache.RecordCache(maxsize=2)
+    cache.set(("id1", "full"), {"xml": "<a/>"})
+    cache.set(("id2", "full"), {"xml": "<b/>"})
+    assert cache.get(("id1", "full")) == {"xml": "<a/>"}
+    cache.set(("id3", "full"), {"xml": "<c/>"})
+    assert cache.get(("id2", "full")) is None
+    assert cache.get(("id1", "full")) == {"xml": "<a/>"}
+    assert cache.get(("id3", "full")) == {"xml": "<c/>"}
+
+
+def test_invalidate_all_renderings():
+    cache = recordcache.RecordCache(maxsize=10)
+    cache.set(("id1", "brief"), {"xml": "<a/>"})
+    cache.set(("id1", "full"), {"xml": "<a></a>"})
+    cache.set(("id2", "full"), {"xml": "<b/>"})
+    cache.invalidate(["id1"])
+    assert cache.get(("id1", "brief")) is None
+    assert cache.get(("id1", "full")) is None
+    assert cache.get(("id2", "full")) == {"xml": "<b/>"}
+
+
+def test_directory_shared_between_processes(tmpdir):
+    cache = recordcache.RecordCache(maxsize=10, cachedir=str(tmpdir))
+    other = recordcache.RecordCache(maxsize=10, cachedir=str(tmpdir))
+    cache.set(("id1", "full"), {"xml": "<a/>", "prefixes": ["gmd"]})
+    assert other.get(("id1", "full")) == {"xml": "<a/>", "prefixes": ["gmd"]}
+
+    # invalidation in one process applies to the in-memory entries of all
+    other.invalidate(["id1"])
+    assert cache.get(("id1", "full")) is None
@@ -0,0 +1,67 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.renderpool"""
+
+import pickle
+
+import pytest
+
+from pycsw.core import renderpool
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
+
+pytestmark = pytest.mark.unit
+
+
+def _write_record(record, esn, context):
+    node = etree.Element("Record", nsmap=context.namespaces)
+    etree.SubElement(node, "identifier").text = record.identifier
+    etree.SubElement(node, "abstract").text = record.abstract or ""
+    etree.SubElement(node, "esn").text = esn
+    return node
+
+
+def test_render_in_order():
+    context = StaticContext()
+    records = [renderpool.Record({"identifier": "id%d" % num,
+                                  "abstract": None if num % 2 else "text"})
+               for num in range(10)]
+    expected = [etree.tostring(_write_record(record, "full", context))
+                for record in records]
+
+    nodes = renderpool.render(records, _write_record, ("full", context), 2)
+    assert [etree.tostring(node) for node in nodes] == expected
+    assert b"<abstract></abstract>" in expected[1]
+
+
+def test_static_context_pickle():
+    context = StaticContext()
+    restored = pickle.loads(pickle.dumps(context))
+    assert restored.parser is context.parser
+    assert restored.namespaces == context.namespaces
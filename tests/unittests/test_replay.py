@@ -0,0 +1,118 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.replay"""
+
+import pytest
+
+from pycsw.core import replay
+
+pytestmark = pytest.mark.unit
+
+
+class Target(object):
+    """Answer GetRecordById with an exception report, fail on DescribeRecord"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, request):
+        self.sent.append(request)
+        if request.type == "DescribeRecord":
+            raise IOError("connection reset")
+        if request.type == "GetRecordById":
+            return 200, b"<ows:ExceptionReport/>"
+        return 200, b"<csw:GetRecordsResponse/>"
+
+
+@pytest.mark.parametrize("query, body, expected", [
+    ("service=CSW&Request=GetRecords", None, "GetRecords"),
+    ("mode=oaipmh&verb=ListRecords", None, "OAI-PMH:ListRecords"),
+    ("mode=opensearch&request=GetRecords", None, "OpenSearch:GetRecords"),
+    ("", b'<csw:Harvest xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"/>',
+     "Harvest"),
+    ("", b'<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope">'
+         b'<soap:Body><csw:GetCapabilities '
+         b'xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"/></soap:Body>'
+         b'</soap:Envelope>', "GetCapabilities"),
+    ("", b"not xml", "unknown"),
+])
+def test_get_request_type(query, body, expected):
+    assert replay.get_request_type(query, body) == expected
+
+
+def test_load_suites(tmpdir):
+    suite = tmpdir.mkdir("suite")
+    suite.mkdir("get").join("requests.txt").write(
+        "caps,PYCSW_SERVER?config=tests/suite/default.cfg&request="
+        "GetCapabilities\nrecord,service=CSW&request=GetRecordById&id=1\n")
+    suite.mkdir("post").join("insert.xml").write(
+        '<csw:Transaction xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"/>')
+
+    corpus = replay.load(str(tmpdir))
+
+    assert [(r.name, r.query, r.type) for r in corpus] == [
+        ("suite/get/caps", "request=GetCapabilities", "GetCapabilities"),
+        ("suite/get/record", "service=CSW&request=GetRecordById&id=1",
+         "GetRecordById"),
+        ("suite/post/insert", "", "Transaction"),
+    ]
+
+
+def test_load_access_log(tmpdir):
+    log = tmpdir.join("access.log")
+    log.write(
+        '127.0.0.1 - - [10/Oct/2020:13:55:36 +0000] "GET /csw?service=CSW&'
+        'request=GetRecords HTTP/1.1" 200 2326\n'
+        '127.0.0.1 - - [10/Oct/2020:13:55:37 +0000] "POST /csw HTTP/1.1" '
+        '200 512\n')
+
+    corpus = replay.load(str(log))
+
+    assert [(r.query, r.type) for r in corpus] == [
+        ("service=CSW&request=GetRecords", "GetRecords")]
+
+
+def test_replay():
+    corpus = [replay.ReplayRequest("records", "request=GetRecords"),
+              replay.ReplayRequest("record", "request=GetRecordById"),
+              replay.ReplayRequest("describe", "request=DescribeRecord"),
+              replay.ReplayRequest("harvest", "request=Harvest")]
+    target = Target()
+
+    results = replay.replay(corpus, target, concurrency=3, count=60,
+                            mix=replay.get_mix("GetRecords=2,"), seed=1)
+    stats = results.to_dict()
+
+    assert len(target.sent) == 60
+    assert "Harvest" not in stats  # writes are only replayed when asked
+    assert stats["all"]["requests"] == 60
+    assert stats["GetRecords"]["requests"] > stats["GetRecordById"]["requests"]
+    assert stats["GetRecordById"]["exception_rate"] == 1
+    assert stats["DescribeRecord"]["error_rate"] == 1
+    assert stats["GetRecords"]["error_rate"] == 0
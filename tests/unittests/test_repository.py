@@ -28,9 +28,13 @@
 # =================================================================
 """Unit tests for pycsw.core.repository"""
 
+import json
+
 import pytest
+from sqlalchemy.sql.expression import Delete
 
-from pycsw.core import repository
+from pycsw.core import admin, recordcache, repository
+from pycsw.core.config import StaticContext
 
 pytestmark = pytest.mark.unit
 
@@ -64,3 +68,242 @@ def test_query_spatial(data, input_, predicate, distance, expected):
         distance=distance
     )
     assert result == expected
+
+
+@pytest.fixture
+def repo(tmpdir):
+    database = "sqlite:///%s" % tmpdir.join("records.db")
+    admin.setup_db(database, "records", str(tmpdir))
+    return repository.Repository(database, StaticContext(), table="records")
+
+
+def _add_record(repo, identifier, parentidentifier=None, type_="dataset"):
+    repo.session.begin()
+    repo.session.add(repo.dataset(
+        identifier=identifier, parentidentifier=parentidentifier,
+        typename="csw:Record", schema="http://www.opengis.net/cat/csw/2.0.2",
+        mdsource="local", insert_date="2019-01-01T00:00:00Z", xml="<xml/>",
+        anytext="", type=type_))
+    repo.session.commit()
+
+
+def test_delete_cascades_to_descendants(repo):
+    _add_record(repo, "series", type_="series")
+    _add_record(repo, "child", "series")
+    _add_record(repo, "grandchild", "child")
+    _add_record(repo, "cycle1", "cycle2", type_="cycle")
+    _add_record(repo, "cycle2", "cycle1")
+    _add_record(repo, "unrelated")
+
+    constraint = {"where": "identifier = :pvalue0", "values": ["series"]}
+    assert repo.delete(constraint) == 3
+    constraint = {"where": "type = :pvalue0", "values": ["cycle"]}
+    assert repo.delete(constraint) == 2
+    assert [r.identifier for r in repo.session.query(repo.dataset)] == [
+        "unrelated"]
+
+
+def test_delete_is_one_transaction(repo, monkeypatch):
+    _add_record(repo, "series", type_="series")
+    _add_record(repo, "child", "series")
+    execute = repo.session.execute
+
+    def failing_execute(statement, *args, **kwargs):
+        if isinstance(statement, Delete) and statement.table.name == "records":
+            raise RuntimeError("database error")
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(repo.session, "execute", failing_execute)
+    constraint = {"where": "identifier = :pvalue0", "values": ["series"]}
+    with pytest.raises(RuntimeError):
+        repo.delete(constraint)
+    monkeypatch.undo()
+
+    assert sorted(r.identifier for r in repo.session.query(repo.dataset)) == [
+        "child", "series"]
+
+
+def test_delete_in_chunks(repo, monkeypatch):
+    _add_record(repo, "series", type_="series")
+    for identifier in ["child1", "child2", "child3"]:
+        _add_record(repo, identifier, "series")
+    _add_record(repo, "unrelated")
+
+    constraint = {"where": "identifier = :pvalue0", "values": ["series"]}
+    execute = repo.session.execute
+    deletes = []
+
+    def failing_execute(statement, *args, **kwargs):
+        if isinstance(statement, Delete) and statement.table.name == "records":
+            deletes.append(statement)
+            if len(deletes) == 2:
+                raise RuntimeError("database error")
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(repo.session, "execute", failing_execute)
+    with pytest.raises(RuntimeError, match="2 of 4 records deleted"):
+        repo.delete(constraint, chunksize=2)
+    monkeypatch.undo()
+
+    assert repo.delete({"where": "parentidentifier = :pvalue0",
+                        "values": ["series"]}, chunksize=2) == 2
+    assert [r.identifier for r in repo.session.query(repo.dataset)] == [
+        "unrelated"]
+
+
+def test_delete_invalidates_rendered_records(repo, monkeypatch):
+    cache = recordcache.RecordCache(maxsize=10)
+    monkeypatch.setattr(recordcache, "CACHE", cache)
+    _add_record(repo, "series", type_="series")
+    _add_record(repo, "child", "series")
+    _add_record(repo, "unrelated")
+    for identifier in ["series", "child", "unrelated"]:
+        cache.set((identifier, "full"), {"xml": "<a/>"})
+
+    constraint = {"where": "identifier = :pvalue0", "values": ["series"]}
+    repo.delete(constraint)
+    assert cache.get(("series", "full")) is None
+    assert cache.get(("child", "full")) is None
+    assert cache.get(("unrelated", "full")) == {"xml": "<a/>"}
+
+
+def _new_record(repo, identifier, **columns):
+    values = dict(
+        identifier=identifier, typename="csw:Record",
+        schema="http://www.opengis.net/cat/csw/2.0.2", mdsource="local",
+        insert_date="2019-01-01T00:00:00Z", xml="<xml/>", anytext="")
+    values.update(columns)
+    return repo.dataset(**values)
+
+
+def _record_xml(title, subject):
+    return (
+        '<csw:Record xmlns:csw="http://www.opengis.net/cat/csw/2.0.2" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        '<dc:title>%s</dc:title><dc:subject>%s</dc:subject>'
+        '</csw:Record>' % (title, subject))
+
+
+def test_facets_follow_record_changes(repo):
+    repo.insert(_new_record(repo, "a", keywords="ocean,wind, ocean",
+                            format="text/csv"), "local", "2019")
+    repo.insert(_new_record(repo, "b", keywords="wind"), "local", "2019")
+    assert repo.query_domain("keywords", "csw:Record", count=True) == [
+        ("ocean", 1), ("wind", 2)]
+    assert repo.query_domain("format", "csw:Record") == [("text/csv",)]
+
+    repo.update(_new_record(repo, "b", keywords="waves"))
+    assert repo.query_domain("keywords", "csw:Record", count=True) == [
+        ("ocean", 1), ("waves", 1), ("wind", 1)]
+
+    repo.delete({"where": "identifier = :pvalue0", "values": ["a"]})
+    assert repo.query_domain("keywords", "csw:Record", count=True) == [
+        ("waves", 1)]
+    assert repo.query_domain("format", "csw:Record") == []
+
+
+def test_facet_equality_filter(repo):
+    repo.insert(_new_record(repo, "a", keywords="ocean,wind"), "local", "2019")
+    repo.insert(_new_record(repo, "b", keywords="wind"), "local", "2019")
+    repo.insert(_new_record(repo, "c"), "local", "2019")
+
+    where = repo.facets["keywords"] % ":pvalue0"
+    total, records = repo.query({"where": where, "values": ["ocean"]})
+    assert [r.identifier for r in records] == ["a"]
+    total, records = repo.query({"where": "not %s" % where,
+                                 "values": ["ocean"]})
+    assert sorted(r.identifier for r in records) == ["b", "c"]
+
+
+def test_shadow_columns_follow_records(repo):
+    repo.insert(_new_record(repo, "a", date="2004-05-06",
+                            time_begin="2004", time_end="2005-06",
+                            denominator="25000"),
+                "local", "2019")
+    record = repo.query_ids(["a"])[0]
+    assert record.date_epoch == 1083801600
+    assert record.denominator_number == 25000
+    assert record.time_begin_epoch == 1072915200
+    assert record.insert_date_epoch == 1546300800
+
+    repo.update(_new_record(repo, "a", date="not a date"))
+    assert repo.query_ids(["a"])[0].date_epoch is None
+
+
+def test_facet_table_looked_up_once(repo, monkeypatch):
+    def has_table(*args, **kwargs):
+        raise AssertionError("facets table looked up again")
+
+    monkeypatch.setattr(repo.engine, "has_table", has_table)
+    other = repository.Repository(str(repo.engine.url), StaticContext(),
+                                  table="records")
+    assert other.facet_table is repo.facet_table is not None
+
+
+def test_update_record_properties(repo):
+    for identifier in ["a", "b", "c"]:
+        repo.insert(_new_record(repo, identifier, title="T", keywords="x",
+                                xml=_record_xml("T", "x")),
+                    "local", "2019")
+
+    recprops = [
+        {"rp": {"name": "dc:title", "dbcol": "title", "xpath": "dc:title"},
+         "value": "New"},
+        {"rp": {"name": "dc:subject", "dbcol": "keywords",
+                "xpath": "dc:subject"},
+         "value": "kw"},
+    ]
+    # the constraint matches on a column that the update changes
+    rows = repo.update(recprops=recprops, constraint={
+        "where": "title = :pvalue0 and identifier != :pvalue1",
+        "values": ["T", "c"]})
+
+    assert rows == 2  # records, not records x properties
+    records = dict((r.identifier, r) for r in repo.query_ids(["a", "b", "c"]))
+    for identifier in ["a", "b"]:
+        record = records[identifier]
+        assert (record.title, record.keywords) == ("New", "kw")
+        xml = record.xml.decode("utf-8") if isinstance(
+            record.xml, bytes) else record.xml
+        assert xml == _record_xml("New", "kw")
+        assert record.anytext == "New kw"
+    assert (records["c"].title, records["c"].xml) == ("T", _record_xml("T", "x"))
+
+
+def test_versions_change_with_records(repo):
+    repo.insert(_new_record(repo, "a", title="A", xml=_record_xml("A", "x")),
+                "local", "2019")
+    repo.insert(_new_record(repo, "b", title="B", xml=_record_xml("B", "x")),
+                "local", "2019")
+
+    versions = repo.query_versions(["a", "b", "c"])
+    assert sorted(versions) == ["a", "b"]
+    assert versions["a"][0] == "2019-01-01T00:00:00Z"
+
+    recprops = [{"rp": {"dbcol": "title", "xpath": "dc:title"},
+                 "value": "New A"}]
+    repo.update(recprops=recprops, constraint={
+        "where": "identifier = :pvalue0", "values": ["a"]})
+    updated = repo.query_versions(["a", "b"])
+    assert updated["a"][0] > "2019-01-01T00:00:00Z"
+    assert updated["b"] == versions["b"]
+    assert repo.query_ids(["a"])[0].insert_date_epoch > 1546300800
+
+    # another change within the same second
+    recprops[0]["value"] = "Newer A"
+    repo.update(recprops=recprops, constraint={
+        "where": "identifier = :pvalue0", "values": ["a"]})
+    assert repo.query_versions(["a"])["a"][1] != updated["a"][1]
+
+
+def test_query_log(repo, tmpdir):
+    repo.query_log = str(tmpdir.join("query.log"))
+    repo.query({"where": "title = :pvalue0", "values": ["secret"]},
+               sortby={"propertyname": "insert_date", "order": "ASC"})
+    repo.query({})
+    with open(repo.query_log) as fileobj:
+        entries = [json.loads(line) for line in fileobj]
+    assert entries == [
+        {"where": "title = :pvalue0", "sortby": "insert_date"},
+        {"where": None, "sortby": None},
+    ]
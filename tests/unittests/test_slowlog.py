@@ -0,0 +1,84 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.slowlog"""
+
+import json
+
+import pytest
+from sqlalchemy import create_engine
+
+from pycsw.core import slowlog, tracing
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    engine.execute("create table records (identifier text, xml text)")
+    return engine
+
+
+def _read(path):
+    with open(path) as fileobj:
+        return [json.loads(line) for line in fileobj]
+
+
+def test_slow_statements_are_logged_with_plan(engine, tmpdir):
+    log = slowlog.SlowQueryLog()
+    log.configure(str(tmpdir.join("slow.jsonl")), threshold=0,
+                  explain_rate=1)
+    log.attach(engine)
+    log.attach(engine)  # once only
+
+    trace = tracing.Trace()
+    tracing.activate(trace)
+    try:
+        engine.execute("insert into records values (?, ?)", "a", "x" * 1000)
+        engine.execute("select * from records where identifier = ?", "a")
+    finally:
+        tracing.deactivate(trace)
+
+    insert, select = _read(log.path)
+    assert insert["rows"] == 1
+    assert insert["plan"] is None
+    assert insert["parameters"][1].endswith("... (1000)")
+    assert select["statement"] == "select * from records where identifier = ?"
+    assert select["parameters"] == ["a"]
+    assert select["request_id"] == trace.trace_id
+    assert select["duration_ms"] >= 0
+    assert "SCAN" in json.dumps(select["plan"])
+
+
+def test_fast_statements_are_not_logged(engine, tmpdir):
+    log = slowlog.SlowQueryLog()
+    log.configure(str(tmpdir.join("slow.jsonl")), threshold=60)
+    log.attach(engine)
+    engine.execute("select * from records")
+    assert tmpdir.join("slow.jsonl").read() == ""
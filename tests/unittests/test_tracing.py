@@ -0,0 +1,113 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.core.tracing"""
+
+import pytest
+from sqlalchemy import create_engine
+
+from pycsw.core import tracing
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def trace():
+    trace = tracing.Trace()
+    tracing.activate(trace)
+    yield trace
+    tracing.deactivate(trace)
+
+
+def test_spans_count_queries(trace):
+    engine = create_engine("sqlite://")
+    tracing.attach(engine)
+    tracing.attach(engine)
+    with tracing.span("operation"):
+        with tracing.span("query"):
+            engine.execute("select 1")
+        engine.execute("select 2")
+    engine.execute("select 3")
+    create_engine("sqlite://").execute("select 4")  # not attached
+    trace.finish()
+
+    assert trace.totals["query"][1] == 1
+    assert trace.totals["operation"][1] == 2
+    assert trace.root.queries == 3
+    assert [span.name for span in trace.spans] == ["query", "operation"]
+    assert trace.spans[0].parent is trace.spans[1]
+
+
+def test_stop_closes_inner_spans_and_nested_spans_count_once(trace):
+    tracing.start("operation")
+    tracing.start("render")
+    tracing.traced("render")(lambda: None)()
+    tracing.stop("operation")
+    trace.finish()
+
+    assert len(trace.spans) == 3
+    assert all(span.duration is not None for span in trace.spans)
+    assert trace.totals["render"][0] == trace.spans[1].duration
+
+
+def test_header_and_otlp(trace):
+    with tracing.span("write"):
+        pass
+    trace.finish()
+
+    header = trace.get_header()
+    assert header.startswith("write;dur=")
+    assert ', total;dur=' in header
+    assert header.endswith(';desc="0 queries"')
+
+    spans = tracing.get_otlp([trace])[
+        "resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["request", "write"]
+    assert spans[1]["traceId"] == trace.trace_id
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert int(spans[1]["startTimeUnixNano"]) >= int(
+        spans[0]["startTimeUnixNano"])
+
+
+def test_no_trace():
+    tracing.activate(None)
+    with tracing.span("query"):
+        tracing.start("render")
+        tracing.stop("render")
+
+
+def test_activated():
+    trace = tracing.Trace()
+    with tracing.activated(None):
+        assert tracing.get_trace() is None
+    with tracing.activated(trace):
+        assert tracing.get_trace() is trace
+        with tracing.activated(trace):
+            pass
+        assert tracing.get_trace() is trace
+    assert tracing.get_trace() is None
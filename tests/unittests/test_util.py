@@ -64,6 +64,39 @@ def test_datetime2iso8601(value, expected):
     assert result == expected
 
 
+@pytest.mark.parametrize("value, expected", [
+    ("2004", 1072915200),
+    ("2004-05", 1083369600),
+    ("2004-05-06", 1083801600),
+    ("2004-05-06T10:00:00Z", 1083837600),
+    ("2004-05-06 10:00", 1083837600),
+    ("2004-05-06T12:00:00.5+02:00", 1083837600),
+    ("1850-01-01", -3786825600),
+    ("2004-13-01", None),
+    ("May 2004", None),
+    ("", None),
+    (None, None),
+])
+def test_get_time_epoch(value, expected):
+    result = util.get_time_epoch(value)
+    assert result == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("25000", 25000.0),
+    (" 0.5 ", 0.5),
+    ("1:25000", 25000.0),
+    ("1e3", 1000.0),
+    ("nan", None),
+    ("25 000", None),
+    ("", None),
+    (None, None),
+])
+def test_get_number(value, expected):
+    result = util.get_number(value)
+    assert result == expected
+
+
 @pytest.mark.parametrize("version, expected", [
     ("2", -1),
     ("1.2", -1),
@@ -113,6 +146,12 @@ def test_nspath_eval_invalid_element():
             }
         )
 
+def test_nspath_eval_namespaces_per_call():
+    xpath = "ns1:tag1/tag2"
+    assert util.nspath_eval(xpath, {"ns1": "one"}) == "{one}tag1/tag2"
+    assert util.nspath_eval(xpath, {"ns1": "two"}) == "{two}tag1/tag2"
+
+
 @pytest.mark.parametrize("envelope, expected", [
     ("ENVELOPE (-180,180,90,-90)", "-180,-90,180,90"),
     (" ENVELOPE(-180,180,90,-90)", "-180,-90,180,90"),
@@ -159,9 +198,10 @@ def test_transform_mappings():
     typename = {"q2": "q1"}
     duplicate_queryables = queryables.copy()
     duplicate_typename = typename.copy()
-    util.transform_mappings(duplicate_queryables, duplicate_typename)
-    assert duplicate_queryables["q1"]["xpath"] == queryables["q2"]["xpath"]
-    assert duplicate_queryables["q1"]["dbcol"] == queryables["q2"]["dbcol"]
+    result = util.transform_mappings(duplicate_queryables, duplicate_typename)
+    assert result["q1"]["xpath"] == queryables["q2"]["xpath"]
+    assert result["q1"]["dbcol"] == queryables["q2"]["dbcol"]
+    assert duplicate_queryables == queryables
 
 
 @pytest.mark.parametrize("name, value, expected", [
@@ -196,21 +236,22 @@ def test_getqattr_invalid():
 
 
 def test_http_request_post():
-    # here we replace owslib.util.http_post with a mock object
-    # because we are not interested in testing owslib
+    # here we replace the shared HTTP client with a mock object
+    # because we are not interested in performing actual requests
     method = "POST"
     url = "some_phony_url"
     request = "some_phony_request"
     timeout = 40
-    with mock.patch("pycsw.core.util.http_post",
-                    autospec=True) as mock_http_post:
+    with mock.patch.object(util, "CLIENT", autospec=True) as mock_client:
         util.http_request(
             method=method,
             url=url,
             request=request,
             timeout=timeout
         )
-        mock_http_post.assert_called_with(url, request, timeout=timeout)
+        mock_client.request.assert_called_with(
+            method, url, data=request,
+            headers={"Content-Type": "text/xml"}, timeout=timeout)
 
 
 @pytest.mark.parametrize("url, expected", [
@@ -28,6 +28,8 @@
 # =================================================================
 """Unit tests for pycsw.wsgi"""
 
+import configparser
+import os
 from wsgiref.util import setup_testing_defaults
 
 import mock
@@ -145,9 +147,61 @@ def test_application_gzip():
         mock_pycsw = mock_csw_class.return_value
         mock_pycsw.config = mock.MagicMock()
         mock_pycsw.config.get.return_value = fake_compression_level
+        mock_pycsw.trace = None
         mock_pycsw.dispatch_wsgi.return_value = (fake_status, fake_response)
         mock_pycsw.contenttype = fake_content_type
         wsgi.application(request_env, mock_start_response)
         mock_pycsw.config.get.assert_called_with("server",
                                                  "gzip_compresslevel")
         mock_compress.assert_called_with(fake_response, fake_compression_level)
+
+
+def test_application_conditional_get(tmpdir, monkeypatch):
+    suites = os.path.join(os.path.dirname(__file__), "..", "functionaltests",
+                          "suites")
+    config = configparser.ConfigParser()
+    config.read(os.path.join(suites, "default", "default.cfg"))
+    config.set("repository", "database", "sqlite:///%s" % os.path.abspath(
+        os.path.join(suites, "cite", "data", "cite.db")))
+    config.set("server", "cache_control", "public, max-age=60")
+    config.set("server", "surrogate_key_header", "Surrogate-Key")
+    config_path = str(tmpdir.join("pycsw.cfg"))
+    with open(config_path, "w") as fileobj:
+        config.write(fileobj)
+    monkeypatch.setenv("PYCSW_CONFIG", config_path)
+    identifier = "urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f"
+
+    def request(query, **headers):
+        request_env = {"QUERY_STRING": query}
+        request_env.update(headers)
+        setup_testing_defaults(request_env)
+        start_response = mock.MagicMock()
+        contents = wsgi.application(request_env, start_response)
+        status, headers = start_response.call_args[0]
+        return status, dict(headers), contents
+
+    query = ("service=CSW&version=2.0.2&request=GetRecordById&id=%s" %
+             identifier)
+    status, headers, contents = request(query)
+    assert status == "200 OK"
+    assert headers["ETag"].startswith('W/"')
+    assert headers["Last-Modified"] == "Fri, 26 Jun 2015 14:59:45 GMT"
+    assert headers["Cache-Control"] == "public, max-age=60"
+    assert headers["Surrogate-Key"] == identifier
+
+    for validator in [{"HTTP_IF_NONE_MATCH": headers["ETag"]},
+                      {"HTTP_IF_MODIFIED_SINCE": headers["Last-Modified"]}]:
+        status, not_modified, contents = request(query, **validator)
+        assert status == "304 Not Modified"
+        assert contents == [b""]
+        assert "Content-Length" not in not_modified
+        assert not_modified["ETag"] == headers["ETag"]
+
+    # another representation of the record
+    status, other, contents = request(
+        query + "&elementsetname=full", HTTP_IF_NONE_MATCH=headers["ETag"])
+    assert status == "200 OK"
+    assert other["ETag"] != headers["ETag"]
+
+    status, headers, contents = request(query.replace(identifier, "nope"))
+    assert "ETag" not in headers